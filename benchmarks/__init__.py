@@ -0,0 +1,40 @@
+"""
+Headless benchmarks of SendCode, run from the package folder with
+
+    python -m benchmarks --help
+"""
+import json
+import os
+import re
+import sys
+import types
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE = "SendCode"
+
+
+def default_settings():
+    path = os.path.join(ROOT, "SendCode (Linux).sublime-settings")
+    with open(path) as f:
+        content = f.read()
+    content = re.sub(r"^\s*//.*$", "", content, flags=re.MULTILINE)
+    content = re.sub(r",(\s*[}\]])", r"\1", content)
+    return json.loads(content)
+
+
+def install():
+    """
+    Install the stand-in `sublime` and `sublime_plugin` modules and return the
+    SendCode package.
+    """
+    from . import sublime, sublime_plugin
+    sys.modules.setdefault("sublime", sublime)
+    sys.modules.setdefault("sublime_plugin", sublime_plugin)
+    if PACKAGE not in sys.modules:
+        package = types.ModuleType(PACKAGE)
+        package.__path__ = [ROOT]
+        sys.modules[PACKAGE] = package
+        settings = sublime.load_settings("SendCode.sublime-settings")
+        settings.settings.update(default_settings())
+    return sys.modules[PACKAGE]
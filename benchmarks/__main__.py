@@ -0,0 +1,126 @@
+import argparse
+import contextlib
+import importlib
+import io
+import json
+import random
+import time
+
+from . import install, corpora
+
+
+OPERATIONS = {
+    "r": ["expand_line", "get_text"],
+    "python": ["expand_line", "expand_cell", "get_text"],
+    "julia": ["expand_line", "expand_cell", "get_text"],
+    "md": ["expand_line", "get_text"],
+    "rmd": ["expand_line", "expand_cell", "get_text"],
+}
+
+
+def percentile(samples, q):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(round(q / 100.0 * (len(samples) - 1))))]
+
+
+def run_operation(getter_class, view, op, pt):
+    # every operation includes building the getter, as SendCodeCommand does
+    if op == "expand_line":
+        getter = getter_class.initialize(view, False, False)
+        return getter.expand_line(getter.buffer.line(pt))
+    elif op == "expand_cell":
+        getter = getter_class.initialize(view, False, True)
+        return getter.expand_cell(getter.buffer.line(pt))
+    elif op == "get_text":
+        return getter_class.initialize(view, False, False).get_text()
+    raise ValueError(op)
+
+
+def bench(syntax, lines, calls, edit=False, seed=0):
+    package = install()
+    sublime = importlib.import_module("sublime")
+    CodeGetter = importlib.import_module(package.__name__ + ".code_getter").CodeGetter
+    index = importlib.import_module(package.__name__ + ".code_getter.index")
+    from .view import View
+
+    text = corpora.generate(syntax, lines, seed=seed)
+    view = View(text, syntax, file_name="benchmark" + corpora.EXTENSIONS[syntax])
+    view.listener = lambda view, changes: \
+        index.patch_buffer(view.buffer_id(), changes, view.change_count())
+
+    rng = random.Random(seed)
+    results = []
+    for op in OPERATIONS[syntax]:
+        times = []
+        ipc = []
+        for _ in range(calls):
+            if edit:
+                view.insert(rng.randint(0, view.size()), " ")
+            pt = rng.randint(0, view.size())
+            view.set_cursors([pt])
+            sublime.calls.clear()
+            with contextlib.redirect_stdout(io.StringIO()):
+                start = time.perf_counter()
+                run_operation(CodeGetter, view, op, pt)
+                times.append((time.perf_counter() - start) * 1000)
+            ipc.append(sum(sublime.calls.values()))
+        results.append({
+            "syntax": syntax,
+            "lines": text.count("\n"),
+            "operation": op,
+            "calls": calls,
+            "first_ms": times[0],
+            "p50_ms": percentile(times, 50),
+            "p90_ms": percentile(times, 90),
+            "p99_ms": percentile(times, 99),
+            "max_ms": max(times),
+            "ipc_mean": sum(ipc) / float(len(ipc)),
+            "ipc_max": max(ipc),
+        })
+        index.discard_buffer(view.buffer_id())
+    return results
+
+
+COLUMNS = [
+    ("syntax", "<", 7, ""), ("lines", ">", 7, ""), ("operation", "<", 12, ""),
+    ("first_ms", ">", 9, ".2f"), ("p50_ms", ">", 8, ".2f"), ("p90_ms", ">", 8, ".2f"),
+    ("p99_ms", ">", 8, ".2f"), ("max_ms", ">", 8, ".2f"),
+    ("ipc_mean", ">", 9, ".1f"), ("ipc_max", ">", 8, ""),
+]
+
+
+def print_table(results):
+    print(" ".join(
+        format(name, align + str(width)) for name, align, width, _ in COLUMNS))
+    for r in results:
+        print(" ".join(
+            format(r[name], align + str(width) + fmt) for name, align, width, fmt in COLUMNS))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks",
+        description="Latency and plugin host call counts of the SendCode code getters.")
+    parser.add_argument("--syntaxes", default="r,python,julia,md,rmd")
+    parser.add_argument("--sizes", default="1000,10000,50000,200000",
+                        help="comma separated numbers of lines")
+    parser.add_argument("--calls", type=int, default=50, help="calls per operation")
+    parser.add_argument("--edit", action="store_true", help="edit the buffer before each call")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="print one JSON record per line")
+    args = parser.parse_args()
+
+    results = []
+    for syntax in args.syntaxes.split(","):
+        for lines in args.sizes.split(","):
+            records = bench(syntax, int(lines), args.calls, edit=args.edit, seed=args.seed)
+            if args.json:
+                for r in records:
+                    print(json.dumps(r))
+            results.extend(records)
+    if not args.json:
+        print_table(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+"""
+Synthetic R, Python, Julia, Markdown and R Markdown sources of a given number
+of lines. The blocks mimic what the getters have to deal with: pipe and ggplot
+chains, roxygen blocks, long bracketed literals, nested blocks and `# %%` cells.
+"""
+import random
+
+
+R_BLOCKS = [
+    """\
+#' Summarise {name}
+#'
+#' @param df a data frame
+#' @examples
+#' summarise_{name}(mtcars)
+summarise_{name} <- function(df, by = "cyl") {{
+    df %>%
+        group_by(.data[[by]]) %>%
+        # keep the complete rows only %>%
+        filter(!is.na(mpg)) %>%
+        summarise(
+            mean = mean(mpg),
+            sd = sd(mpg),
+            n = n()
+        )
+}}
+""",
+    """\
+p_{name} <- ggplot(mtcars, aes(x = wt, y = mpg)) +
+    geom_point(aes(colour = factor(cyl))) +
+    geom_smooth(method = "lm", formula = y ~ x) +
+    labs(title = "weight vs mpg (# {name})")
+""",
+    """\
+x_{name} <- c({numbers})
+y_{name} <- x_{name} %in% c(1, 2, 3)
+if (any(y_{name})) {{
+    message("found")
+}} else {{
+    message("none")
+}}
+""",
+    """\
+d_{name} <- data.frame(
+    a = c({numbers}),
+    b = letters[seq_len({count})],
+    stringsAsFactors = FALSE
+)
+""",
+]
+
+PYTHON_BLOCKS = [
+    """\
+# %% cell {name}
+import math
+
+
+@decorator(name="{name}")
+def compute_{name}(values, scale=1.0):
+    total = 0
+    for v in values:
+        if v > 0:
+            total += math.sqrt(v) * scale
+        elif v == 0:
+            continue
+        else:
+            total -= v
+    return total
+""",
+    """\
+class Model{name}:
+    \"\"\"A model (not a real one).\"\"\"
+
+    def __init__(self, a, b):
+        self.a = a
+        self.b = b
+
+    def predict(self, x):
+        return (self.a * x +
+                self.b)
+
+    def fit(self, xs, ys):
+        try:
+            self.a = sum(ys) / len(xs)
+        except ZeroDivisionError:
+            self.a = 0
+        finally:
+            self.b = 0
+""",
+    """\
+config_{name} = {{
+    "name": "{name}",
+    "values": [{numbers}],
+    "nested": {{"a": (1, 2), "b": [3, 4]}},
+}}
+result_{name} = compute_{name}(config_{name}["values"]) \\
+    + 1
+""",
+]
+
+JULIA_BLOCKS = [
+    """\
+# %% cell {name}
+using LinearAlgebra,
+    Statistics
+
+function compute_{name}(values; scale=1.0)
+    total = 0.0
+    for v in values
+        if v > 0
+            total += sqrt(v) * scale
+        elseif v == 0
+            continue
+        else
+            total -= v
+        end
+    end
+    return total
+end
+""",
+    """\
+struct Model{name}
+    a::Float64
+    b::Float64
+end
+
+predict(m::Model{name}, x) = m.a * x +
+    m.b
+""",
+    """\
+x_{name} = [{numbers}]
+y_{name} = begin
+    s = sum(x_{name})
+    s / length(x_{name}[1:end])
+end
+map(x_{name}) do v
+    v * 2
+end
+""",
+]
+
+MARKDOWN_BLOCKS = [
+    """\
+## Section {name}
+
+Some text about `compute_{name}` with a [link](https://example.com).
+
+```python
+values = [{numbers}]
+total = sum(values)
+```
+
+More prose.
+""",
+]
+
+RMARKDOWN_BLOCKS = [
+    """\
+## Section {name}
+
+Text about the analysis {name}.
+
+```{{r chunk-{name}, fig.width=6, fig.height=4}}
+df_{name} <- mtcars %>%
+    filter(cyl == 4) %>%
+    mutate(ratio = mpg / wt)
+plot(df_{name}$wt, df_{name}$mpg)
+```
+
+```{{r table-{name}}}
+#noplot
+knitr::kable(head(df_{name}))
+```
+""",
+]
+
+RMARKDOWN_HEADER = """\
+---
+title: "benchmark"
+output: html_document
+---
+
+```{r setup, include=FALSE}
+library(dplyr)
+knitr::opts_chunk$set(echo = TRUE)
+```
+
+"""
+
+BLOCKS = {
+    "r": R_BLOCKS,
+    "python": PYTHON_BLOCKS,
+    "julia": JULIA_BLOCKS,
+    "md": MARKDOWN_BLOCKS,
+    "rmd": RMARKDOWN_BLOCKS,
+}
+
+EXTENSIONS = {"r": ".R", "python": ".py", "julia": ".jl", "md": ".md", "rmd": ".Rmd"}
+
+
+def generate(syntax, lines, seed=0):
+    """
+    Generate about `lines` lines of `syntax` source.
+    """
+    rng = random.Random(seed)
+    blocks = BLOCKS[syntax]
+    chunks = [RMARKDOWN_HEADER] if syntax == "rmd" else []
+    count = sum(c.count("\n") for c in chunks)
+    i = 0
+    while count < lines:
+        n = rng.randint(3, 40)
+        numbers = ", ".join(str(rng.randint(0, 999)) for _ in range(n))
+        block = rng.choice(blocks).format(name=i, numbers=numbers, count=n) + "\n"
+        chunks.append(block)
+        count += block.count("\n")
+        i += 1
+    return "".join(chunks)
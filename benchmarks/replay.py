@@ -0,0 +1,118 @@
+"""
+Replay the slow expansions recorded by SendCode, see "slow_expansion_ms",
+headless. Run from the package folder with
+
+    python -m benchmarks.replay <fixture.json or directory>... [--profile]
+
+Scopes come from the stand-in lexer of `view.py`, so a region may differ from
+the one recorded in Sublime Text; such fixtures are reported as mismatches.
+"""
+import argparse
+import cProfile
+import contextlib
+import glob
+import importlib
+import io
+import json
+import os
+import pstats
+import time
+
+from . import install
+from .view import View, BASE_SCOPES
+
+
+def fixtures(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for f in sorted(glob.glob(os.path.join(path, "*.json"))):
+                yield f
+        else:
+            yield path
+
+
+def replay(path, repeat=20, profile=False):
+    package = install()
+    sublime = importlib.import_module("sublime")
+    CodeGetter = importlib.import_module(package.__name__ + ".code_getter").CodeGetter
+    index = importlib.import_module(package.__name__ + ".code_getter.index")
+    settings = importlib.import_module(package.__name__ + ".settings")
+
+    with open(path, encoding="utf-8") as f:
+        fixture = json.load(f)
+    # replay with the recorded settings, without recording again
+    s = sublime.load_settings("SendCode.sublime-settings")
+    s.settings.clear()
+    s.settings.update(fixture["settings"])
+    s.settings["slow_expansion_ms"] = None
+    settings._invalidate()
+
+    view = View(fixture["text"], fixture["syntax"], file_name=fixture["file_name"])
+    view.sel().regions = [sublime.Region(a, b) for a, b in fixture["cursors"]]
+    cursor = sublime.Region(*fixture["cursor"])
+
+    def expand():
+        getter = CodeGetter.initialize(view, False, fixture["cell"], setup=fixture["setup"])
+        return getter.expand_cursor(cursor)
+
+    times = []
+    stats = None
+    for i in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            if i == 0:
+                # the first run is cold: it builds the buffer indexes
+                index.discard_buffer(view.buffer_id())
+            start = time.perf_counter()
+            if i == 0 and profile:
+                profiler = cProfile.Profile()
+                region = profiler.runcall(expand)
+                stats = pstats.Stats(profiler, stream=io.StringIO())
+            else:
+                region = expand()
+            times.append((time.perf_counter() - start) * 1000)
+    index.discard_buffer(view.buffer_id())
+
+    times_sorted = sorted(times[1:] or times)
+    return {
+        "fixture": os.path.basename(path),
+        "syntax": fixture["syntax"],
+        "lines": fixture["text"].count("\n") + 1,
+        "recorded_ms": fixture["elapsed_ms"],
+        "first_ms": times[0],
+        "p50_ms": times_sorted[len(times_sorted) // 2],
+        "max_ms": max(times),
+        "match": [region.a, region.b] == fixture["region"],
+    }, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.replay",
+        description="Replay the slow expansion fixtures recorded by SendCode.")
+    parser.add_argument("paths", nargs="+", help="fixture files or directories")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--profile", action="store_true",
+                        help="print the profile of the first, cold, run")
+    parser.add_argument("--json", action="store_true", help="print one JSON record per line")
+    args = parser.parse_args()
+
+    for path in fixtures(args.paths):
+        with open(path, encoding="utf-8") as f:
+            syntax = json.load(f)["syntax"]
+        if syntax not in BASE_SCOPES:
+            print("{}: syntax {} is not supported".format(path, syntax))
+            continue
+        result, stats = replay(path, repeat=args.repeat, profile=args.profile)
+        if args.json:
+            print(json.dumps(result))
+        else:
+            print("{fixture}  {syntax}, {lines} lines, recorded {recorded_ms:.1f}ms, "
+                  "first {first_ms:.2f}ms, p50 {p50_ms:.2f}ms, max {max_ms:.2f}ms{mismatch}".format(
+                      mismatch="" if result["match"] else ", region mismatch", **result))
+        if stats:
+            stats.sort_stats("cumulative").print_stats(20)
+            print(stats.stream.getvalue())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Plugin load time of SendCode: import the top level plugin modules, as Sublime
+Text does at startup, in fresh interpreters. Run from the package folder with
+
+    python -m benchmarks.startup [--runs 10] [--platform linux,osx,windows]
+
+Backends of other platforms must not be imported; they are reported if they
+are.
+"""
+import argparse
+import glob
+import json
+import os
+import subprocess
+import sys
+
+from . import ROOT, PACKAGE
+
+
+SCRIPT = """
+import importlib, json, sys, time
+sys.path.insert(0, {root!r})
+import benchmarks
+benchmarks.install()
+import sublime
+sublime.platform = lambda: {platform!r}
+before = set(sys.modules)
+start = time.perf_counter()
+for name in {plugins!r}:
+    importlib.import_module({package!r} + "." + name)
+elapsed = (time.perf_counter() - start) * 1000
+print(json.dumps({{"ms": elapsed, "modules": sorted(set(sys.modules) - before)}}))
+"""
+
+
+def plugins():
+    # Sublime Text loads the .py files at the root of a package
+    return sorted(
+        os.path.splitext(os.path.basename(f))[0] for f in glob.glob(os.path.join(ROOT, "*.py")))
+
+
+def measure(platform, runs):
+    script = SCRIPT.format(root=ROOT, platform=platform, plugins=plugins(), package=PACKAGE)
+    results = []
+    for _ in range(runs):
+        out = subprocess.check_output([sys.executable, "-c", script], cwd=ROOT)
+        results.append(json.loads(out.decode("utf-8").strip().splitlines()[-1]))
+    return results
+
+
+def foreign_backends(platform, modules):
+    # modules of the backends not available on platform
+    sys.path.insert(0, ROOT)
+    try:
+        import benchmarks
+        benchmarks.install()
+        from SendCode.code_sender.backends import BACKENDS
+    finally:
+        sys.path.pop(0)
+    foreign = {
+        PACKAGE + ".code_sender" + module
+        for module, _, platforms in BACKENDS.values()
+        if platforms and platform not in platforms}
+    return sorted(foreign & set(modules))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.startup",
+        description="Plugin load time of SendCode.")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--platform", default="linux,osx,windows")
+    parser.add_argument("--json", action="store_true", help="print one JSON record per line")
+    args = parser.parse_args()
+
+    failed = False
+    for platform in args.platform.split(","):
+        results = measure(platform, args.runs)
+        times = sorted(r["ms"] for r in results)
+        modules = [m for m in results[0]["modules"] if m.startswith(PACKAGE + ".")]
+        foreign = foreign_backends(platform, modules)
+        failed = failed or bool(foreign)
+        record = {
+            "platform": platform,
+            "runs": args.runs,
+            "min_ms": times[0],
+            "p50_ms": times[len(times) // 2],
+            "max_ms": times[-1],
+            "package_modules": len(modules),
+            "all_modules": len(results[0]["modules"]),
+            "foreign_backends": foreign,
+        }
+        if args.json:
+            print(json.dumps(record))
+        else:
+            print("{platform:<8} min {min_ms:7.2f}ms  p50 {p50_ms:7.2f}ms  max {max_ms:7.2f}ms  "
+                  "{package_modules} SendCode modules, {all_modules} modules in total".format(**record))
+            if foreign:
+                print("         imports backends of other platforms: " + ", ".join(foreign))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+"""
+A stand-in for the `sublime` module so that SendCode runs headless. Every
+call into the (fake) plugin host is counted in `calls`.
+"""
+import collections
+import os
+
+
+calls = collections.Counter()
+
+
+def _ipc(func):
+    name = func.__name__
+
+    def wrapper(*args, **kwargs):
+        calls[name] += 1
+        return func(*args, **kwargs)
+
+    wrapper.__name__ = name
+    wrapper.__doc__ = func.__doc__
+    return wrapper
+
+
+class Region:
+    __slots__ = ("a", "b", "xpos")
+
+    def __init__(self, a, b=None, xpos=-1):
+        if b is None:
+            b = a
+        self.a = a
+        self.b = b
+        self.xpos = xpos
+
+    def __repr__(self):
+        return "Region({}, {})".format(self.a, self.b)
+
+    def __len__(self):
+        return self.size()
+
+    def __eq__(self, other):
+        return isinstance(other, Region) and self.a == other.a and self.b == other.b
+
+    def __hash__(self):
+        return hash((self.a, self.b))
+
+    def __contains__(self, x):
+        if isinstance(x, Region):
+            return self.contains(x)
+        return self.begin() <= x <= self.end()
+
+    def begin(self):
+        return min(self.a, self.b)
+
+    def end(self):
+        return max(self.a, self.b)
+
+    def size(self):
+        return abs(self.a - self.b)
+
+    def empty(self):
+        return self.a == self.b
+
+    def contains(self, x):
+        if isinstance(x, Region):
+            return self.begin() <= x.begin() and x.end() <= self.end()
+        return self.begin() <= x <= self.end()
+
+    def cover(self, region):
+        return Region(min(self.begin(), region.begin()), max(self.end(), region.end()))
+
+    def intersects(self, region):
+        return self.begin() < region.end() and region.begin() < self.end()
+
+
+class Settings:
+    def __init__(self, settings=None):
+        self.settings = dict(settings or {})
+        self.callbacks = {}
+
+    def get(self, key, default=None):
+        return self.settings.get(key, default)
+
+    def has(self, key):
+        return key in self.settings
+
+    def set(self, key, value):
+        self.settings[key] = value
+        for callback in list(self.callbacks.values()):
+            callback()
+
+    def erase(self, key):
+        self.settings.pop(key, None)
+        for callback in list(self.callbacks.values()):
+            callback()
+
+    def to_dict(self):
+        return dict(self.settings)
+
+    def add_on_change(self, tag, callback):
+        self.callbacks[tag] = callback
+
+    def clear_on_change(self, tag):
+        self.callbacks.pop(tag, None)
+
+
+_settings = {}
+_clipboard = ""
+
+
+@_ipc
+def load_settings(name):
+    if name not in _settings:
+        _settings[name] = Settings()
+    return _settings[name]
+
+
+@_ipc
+def save_settings(name):
+    pass
+
+
+def _score(scope_name, selector):
+    """
+    A simplified scoring: the selector (or any of its comma separated
+    alternatives) scores when each of its space separated parts is a dotted
+    prefix of one of the scope names. Deeper and longer matches score higher.
+    """
+    scopes = scope_name.split()
+    best = 0
+    for alternative in selector.split(","):
+        parts = alternative.split()
+        if not parts:
+            continue
+        score = 0
+        for part in parts:
+            for depth, scope in enumerate(scopes):
+                if scope == part or scope.startswith(part + "."):
+                    score = max(score, (depth + 1) * 8 + part.count(".") + 1)
+                    break
+            else:
+                score = 0
+                break
+        best = max(best, score)
+    return best
+
+
+@_ipc
+def score_selector(scope_name, selector):
+    return _score(scope_name, selector)
+
+
+@_ipc
+def platform():
+    return {"posix": "linux", "nt": "windows"}.get(os.name, "linux")
+
+
+@_ipc
+def packages_path():
+    return os.path.join(os.path.expanduser("~"), ".config", "sublime-text", "Packages")
+
+
+@_ipc
+def cache_path():
+    return os.path.join(os.path.expanduser("~"), ".cache", "sublime-text", "Cache")
+
+
+@_ipc
+def status_message(msg):
+    pass
+
+
+@_ipc
+def error_message(msg):
+    pass
+
+
+@_ipc
+def message_dialog(msg):
+    pass
+
+
+@_ipc
+def ok_cancel_dialog(msg, ok_title=""):
+    return True
+
+
+@_ipc
+def set_timeout(callback, delay=0):
+    callback()
+
+
+@_ipc
+def set_timeout_async(callback, delay=0):
+    callback()
+
+
+@_ipc
+def get_clipboard(size_limit=16777216):
+    return _clipboard
+
+
+@_ipc
+def set_clipboard(text):
+    global _clipboard
+    _clipboard = text
+
+
+@_ipc
+def active_window():
+    return None
+
+
+@_ipc
+def windows():
+    return []
+
+
+@_ipc
+def expand_variables(value, variables):
+    for key, var in variables.items():
+        value = value.replace("${" + key + "}", var).replace("$" + key, var)
+    return value
@@ -0,0 +1,39 @@
+"""
+A stand-in for the `sublime_plugin` module.
+"""
+
+
+class Command:
+    def is_enabled(self, *args):
+        return True
+
+
+class ApplicationCommand(Command):
+    pass
+
+
+class WindowCommand(Command):
+    def __init__(self, window):
+        self.window = window
+
+
+class TextCommand(Command):
+    def __init__(self, view):
+        self.view = view
+
+
+class EventListener:
+    pass
+
+
+class ViewEventListener:
+    def __init__(self, view):
+        self.view = view
+
+
+class TextChangeListener:
+    def attach(self, buffer):
+        self.buffer = buffer
+
+    def detach(self):
+        self.buffer = None
@@ -0,0 +1,358 @@
+"""
+A headless stand-in for `sublime.View`. Scopes come from a small regex lexer
+which knows about strings, comments and operators of R, Python and Julia and
+about fenced code in Markdown and R Markdown, good enough to drive the getters.
+"""
+import array
+import bisect
+import itertools
+import re
+
+from . import sublime
+from .sublime import Region, _ipc, _score
+
+
+BASE_SCOPES = {
+    "r": "source.r",
+    "python": "source.python",
+    "julia": "source.julia",
+    "md": "text.html.markdown",
+    "rmd": "text.html.markdown.rmarkdown",
+}
+
+CODE, STRING, COMMENT, OPERATOR = range(4)
+TOKEN_SCOPES = {
+    STRING: "string.quoted.double",
+    COMMENT: "comment.line.number-sign",
+    OPERATOR: "keyword.operator",
+}
+
+TOKENS = {
+    "r": re.compile(r"""
+        (?P<string>"(?:\\.|[^"\\\n])*"?|'(?:\\.|[^'\\\n])*'?)
+        |(?P<comment>\#[^\n]*)
+        |(?P<operator>%[^%\n\s]*%|<-|->|[-+*/^<>=!&|~$:]+)
+    """, re.VERBOSE),
+    "python": re.compile(r"""
+        (?P<string>[rbuf]?(?:\"\"\"[\s\S]*?(?:\"\"\"|\Z)|'''[\s\S]*?(?:'''|\Z)
+            |"(?:\\.|[^"\\\n])*"?|'(?:\\.|[^'\\\n])*'?))
+        |(?P<comment>\#[^\n]*)
+        |(?P<operator>[-+*/%@<>=!&|^~]+)
+    """, re.VERBOSE),
+    "julia": re.compile(r"""
+        (?P<string>\"\"\"[\s\S]*?(?:\"\"\"|\Z)|"(?:\\.|[^"\\\n])*"?)
+        |(?P<comment>\#[^\n]*)
+        |(?P<operator>[-+*/\\^%<>=!&|~:$]+)
+    """, re.VERBOSE),
+}
+
+FENCE = re.compile(r"^```\s*(?:\{\s*(\w+)[^}\n]*\}|(\w+))?[^\n]*\n([\s\S]*?)^```", re.MULTILINE)
+FENCE_LANGUAGES = {"r": "r", "python": "python", "py": "python", "julia": "julia"}
+RUNS = re.compile(b"\x00+|\x01+|\x02+|\x03+")
+
+
+class Selection:
+    def __init__(self, view):
+        self.view = view
+        self.regions = [Region(0, 0)]
+
+    def __iter__(self):
+        return iter(list(self.regions))
+
+    def __len__(self):
+        return len(self.regions)
+
+    def __getitem__(self, i):
+        return self.regions[i]
+
+    def __repr__(self):
+        return "Selection({})".format(self.regions)
+
+    def _normalize(self):
+        regions = sorted(self.regions, key=lambda r: (r.begin(), r.end()))
+        merged = []
+        for r in regions:
+            if merged and (r.begin() < merged[-1].end() or r == merged[-1] or
+                           (r.empty() and r.begin() == merged[-1].end() and not merged[-1].empty())):
+                merged[-1] = merged[-1].cover(r)
+            else:
+                merged.append(r)
+        self.regions = merged
+
+    @_ipc
+    def clear(self):
+        self.regions = []
+
+    @_ipc
+    def add(self, region):
+        self.regions.append(region)
+        self._normalize()
+
+    @_ipc
+    def add_all(self, regions):
+        self.regions.extend(regions)
+        self._normalize()
+
+    @_ipc
+    def subtract(self, region):
+        self.regions = [r for r in self.regions if r != region]
+
+
+class Settings(sublime.Settings):
+    pass
+
+
+class View:
+    """
+    Supports the parts of the View API used by SendCode. `change_count` is
+    bumped and scopes are recomputed on `replace`, which also reports the
+    change to `listener`, mimicking SendCodeTextChangeListener.
+    """
+
+    _ids = itertools.count(1)
+
+    def __init__(self, text, syntax, file_name=None):
+        self._id = next(self._ids)
+        self._syntax = syntax
+        self._file_name = file_name
+        self._change_count = 0
+        self._sel = Selection(self)
+        self._settings = Settings({"tab_size": 4})
+        self.listener = None
+        self._set_text(text)
+
+    def _set_text(self, text):
+        self._text = text
+        starts = array.array("l", [0])
+        starts.extend(m.end() for m in re.finditer("\n", text))
+        self._starts = starts
+        self._lex()
+
+    def _lex(self):
+        text = self._text
+        # (begin, end, language) of the code blocks
+        if self._syntax in ("md", "rmd"):
+            blocks = []
+            for m in FENCE.finditer(text):
+                lang = FENCE_LANGUAGES.get((m.group(1) or m.group(2) or "").lower())
+                blocks.append((m.start(3), m.end(3), lang))
+        else:
+            blocks = [(0, len(text), self._syntax)]
+        self._blocks = blocks
+        self._block_begins = [b[0] for b in blocks]
+        kinds = array.array("b", bytes(len(text)))
+        for begin, end, lang in blocks:
+            regex = TOKENS.get(lang)
+            if not regex:
+                continue
+            for m in regex.finditer(text, begin, end):
+                kind = STRING if m.lastgroup == "string" else \
+                    COMMENT if m.lastgroup == "comment" else OPERATOR
+                kinds[m.start():m.end()] = array.array("b", [kind]) * (m.end() - m.start())
+        self._kinds = kinds
+
+    def _block_at(self, pt):
+        i = bisect.bisect_right(self._block_begins, pt) - 1
+        if i >= 0:
+            begin, end, lang = self._blocks[i]
+            if pt < end or (pt == end and begin == end):
+                return lang
+        return None
+
+    def _row(self, pt):
+        return bisect.bisect_right(self._starts, pt) - 1
+
+    def _row_end(self, row):
+        if row + 1 < len(self._starts):
+            return self._starts[row + 1] - 1
+        return len(self._text)
+
+    def _clamp(self, pt):
+        return min(max(pt, 0), len(self._text))
+
+    def _scope_name(self, pt):
+        pt = self._clamp(pt)
+        scopes = [BASE_SCOPES.get(self._syntax, "text.plain")]
+        if self._syntax in ("md", "rmd"):
+            lang = self._block_at(pt)
+            if lang:
+                scopes.append("markup.raw.code-fence.markdown")
+                scopes.append(BASE_SCOPES[lang])
+        kind = self._kinds[pt] if pt < len(self._text) else CODE
+        if kind != CODE:
+            scopes.append(TOKEN_SCOPES[kind])
+        return " ".join(scopes) + " "
+
+    # editing
+
+    def replace(self, region, text):
+        a, b = region.begin(), region.end()
+        self._set_text(self._text[:a] + text + self._text[b:])
+        self._change_count += 1
+        if self.listener:
+            self.listener(self, [TextChange(a, b, text)])
+
+    def insert(self, pt, text):
+        self.replace(Region(pt, pt), text)
+
+    # the View API
+
+    @_ipc
+    def id(self):
+        return self._id
+
+    @_ipc
+    def buffer_id(self):
+        return self._id
+
+    @_ipc
+    def change_count(self):
+        return self._change_count
+
+    @_ipc
+    def file_name(self):
+        return self._file_name
+
+    @_ipc
+    def window(self):
+        return None
+
+    @_ipc
+    def settings(self):
+        return self._settings
+
+    @_ipc
+    def size(self):
+        return len(self._text)
+
+    @_ipc
+    def sel(self):
+        return self._sel
+
+    @_ipc
+    def show(self, x, show_surrounds=True):
+        pass
+
+    @_ipc
+    def substr(self, x):
+        if isinstance(x, int):
+            return self._text[x:x + 1]
+        return self._text[x.begin():x.end()]
+
+    @_ipc
+    def rowcol(self, pt):
+        pt = self._clamp(pt)
+        row = self._row(pt)
+        return row, pt - self._starts[row]
+
+    @_ipc
+    def text_point(self, row, col):
+        if row < 0:
+            return 0
+        if row >= len(self._starts):
+            return len(self._text)
+        return min(self._starts[row] + col, self._row_end(row))
+
+    @_ipc
+    def line(self, x):
+        if isinstance(x, int):
+            x = Region(x, x)
+        begin = self._starts[self._row(self._clamp(x.begin()))]
+        end = self._row_end(self._row(self._clamp(x.end())))
+        return Region(begin, end)
+
+    @_ipc
+    def full_line(self, x):
+        if isinstance(x, int):
+            x = Region(x, x)
+        begin = self._starts[self._row(self._clamp(x.begin()))]
+        end = self._row_end(self._row(self._clamp(x.end())))
+        return Region(begin, min(end + 1, len(self._text)))
+
+    @_ipc
+    def lines(self, x):
+        first = self._row(self._clamp(x.begin()))
+        last = self._row(self._clamp(x.end()))
+        return [Region(self._starts[row], self._row_end(row)) for row in range(first, last + 1)]
+
+    @_ipc
+    def word(self, x):
+        pt = x if isinstance(x, int) else x.begin()
+        begin = pt
+        while begin > 0 and re.match(r"\w", self._text[begin - 1]):
+            begin -= 1
+        end = pt
+        while end < len(self._text) and re.match(r"\w", self._text[end]):
+            end += 1
+        return Region(begin, end)
+
+    @_ipc
+    def find(self, pattern, start_pt, flags=0):
+        regex = re.compile(pattern, re.MULTILINE | (re.IGNORECASE if flags & 2 else 0))
+        m = regex.search(self._text, max(start_pt, 0))
+        if m is None:
+            return Region(-1, -1)
+        return Region(m.start(), m.end())
+
+    @_ipc
+    def find_all(self, pattern, flags=0):
+        regex = re.compile(pattern, re.MULTILINE | (re.IGNORECASE if flags & 2 else 0))
+        return [Region(m.start(), m.end()) for m in regex.finditer(self._text)]
+
+    @_ipc
+    def scope_name(self, pt):
+        return self._scope_name(pt)
+
+    @_ipc
+    def score_selector(self, pt, selector):
+        return _score(self._scope_name(pt), selector)
+
+    @_ipc
+    def match_selector(self, pt, selector):
+        return _score(self._scope_name(pt), selector) > 0
+
+    @_ipc
+    def find_by_selector(self, selector):
+        # test the scope once per run of characters sharing a scope
+        bounds = {0, len(self._text)}
+        for begin, end, lang in self._blocks:
+            bounds.update((begin, end))
+        bounds = sorted(bounds)
+        kinds = self._kinds.tobytes()
+        regions = []
+        for begin, end in zip(bounds, bounds[1:]):
+            for m in RUNS.finditer(kinds, begin, end):
+                if _score(self._scope_name(m.start()), selector) > 0:
+                    if regions and regions[-1].end() == m.start():
+                        regions[-1] = Region(regions[-1].begin(), m.end())
+                    else:
+                        regions.append(Region(m.start(), m.end()))
+        return regions
+
+    @_ipc
+    def expand_to_scope(self, pt, selector):
+        if _score(self._scope_name(pt), selector) == 0:
+            return None
+        begin = pt
+        while begin > 0 and _score(self._scope_name(begin - 1), selector) > 0:
+            begin -= 1
+        end = pt
+        while end < len(self._text) and _score(self._scope_name(end), selector) > 0:
+            end += 1
+        return Region(begin, end)
+
+    def set_cursors(self, points):
+        self._sel.regions = [Region(pt, pt) for pt in points]
+
+
+class TextChange:
+    """The change reported to a TextChangeListener."""
+
+    class Position:
+        def __init__(self, pt):
+            self.pt = pt
+
+    def __init__(self, a, b, text):
+        self.a = self.Position(a)
+        self.b = self.Position(b)
+        self.str = text
@@ -1,5 +1,6 @@
 import sublime
 import sublime_plugin
+from .code_getter import definitions, stale
 from .settings import Settings
 
 
@@ -39,6 +40,11 @@ class SendCodeChooseProgCommand(sublime_plugin.TextCommand):
         else:
             sublime.error_message("Platform not supported!")
 
+        if syntax in ["r", "rmd", "python", "julia"]:
+            app_list += ["Jupyter"]
+            if plat != "windows":
+                app_list += ["Bridge"]
+
         app_list += ["Terminus", "TerminalView", "SublimeREPL"]
 
         def on_done(action):
@@ -47,6 +53,9 @@ class SendCodeChooseProgCommand(sublime_plugin.TextCommand):
             else:
                 result = app_list[action]
                 settings.set("prog", self.normalize(result))
+                # the new program has not run any cell or sourced any file
+                stale.reset()
+                definitions.reset()
 
         prog = settings.get("prog")
         try:
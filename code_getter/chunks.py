@@ -0,0 +1,106 @@
+import bisect
+import collections
+import re
+
+from .index import BufferIndex, BufferSnapshot
+
+
+def maybe_match(regex, string, default):
+    match = re.search(regex, string)
+    if match is not None:
+        return match.group(1)
+    else:
+        return default
+
+
+def parse_chunk_header(cmd):
+    return (
+        maybe_match(r'```{r (\S+)[,}]', cmd, 'tmp'),
+        maybe_match(r'fig\.width *= *([^,}]+)', cmd, 4.5),
+        maybe_match(r'fig\.height *= *([^,}]+)', cmd, 3),
+    )
+
+
+# header: begin of the header line, begin and end: the code between the
+# header and the closing fence
+Chunk = collections.namedtuple(
+    "Chunk", "header begin end label fig_width fig_height noplot")
+
+
+def fig_call(chunk, cmd):
+    # the fig(...) call saving the plots of cmd, a part of chunk, "" if none
+    should_plot = '#noplot' not in cmd and (
+        (re.search(r'```{r,.*fig\.width', cmd) is not None) or
+        (('plot' in cmd) and (re.search(r'^\s*fig\(', cmd, re.MULTILINE) is None))
+    )
+    if not should_plot:
+        return ""
+    return 'fig("{}", {}, {})'.format(chunk.label, chunk.fig_width, chunk.fig_height)
+
+
+class ChunkIndex(BufferIndex):
+    """
+    The R chunks of an R Markdown buffer with the label, the figure size and
+    the #noplot flag of each.
+    """
+
+    HEADER = re.compile(r"^```\{r(?:[ ,][^\n]*)?\}[ \t]*$", re.MULTILINE)
+    FENCE = re.compile(r"^```", re.MULTILINE)
+
+    def build(self, view):
+        text = BufferSnapshot.of(view).text
+        self.text = text
+        self.chunks = []
+        pos = 0
+        while True:
+            m = self.HEADER.search(text, pos)
+            if m is None:
+                break
+            begin = min(m.end() + 1, len(text))
+            fence = self.FENCE.search(text, begin)
+            end = fence.start() - 1 if fence else len(text)
+            end = max(end, begin)
+            header = m.group()
+            code = text[begin:end]
+            label, width, height = parse_chunk_header(header + "\n")
+            self.chunks.append(Chunk(
+                m.start(), begin, end, label, width, height, '#noplot' in code))
+            pos = fence.end() if fence else len(text)
+        self.headers = [c.header for c in self.chunks]
+        # chunk -> code sent by run_chunks
+        self.codes = {}
+
+    def chunk_at(self, pt):
+        i = bisect.bisect_right(self.headers, pt) - 1
+        if i >= 0 and pt <= self.chunks[i].end:
+            return self.chunks[i]
+        return None
+
+    def setup_chunk(self):
+        for chunk in self.chunks:
+            if chunk.label == "setup":
+                return chunk
+        return None
+
+    def select(self, which, pt, label=None):
+        # the chunks above or below pt, excluding the one at pt, all of them
+        # or those labelled label
+        chunk = self.chunk_at(pt)
+        if which == "above":
+            limit = chunk.header if chunk else pt
+            return [c for c in self.chunks if c.end < limit]
+        elif which == "below":
+            limit = chunk.end if chunk else pt
+            return [c for c in self.chunks if c.header > limit]
+        elif which == "label":
+            return [c for c in self.chunks if c.label == label]
+        return list(self.chunks)
+
+    def code(self, chunk):
+        # the code of chunk and its fig(...) call
+        if chunk not in self.codes:
+            cmd = self.text[chunk.begin:chunk.end].rstrip("\n") + "\n"
+            header = self.text[chunk.header:chunk.begin]
+            fig = "" if chunk.noplot else fig_call(chunk, header + cmd)
+            self.codes[chunk] = cmd + (fig + "\n" if fig else "")
+        return self.codes[chunk]
@@ -0,0 +1,83 @@
+import sublime
+
+from .getter import CodeGetter
+from .index import PythonStatementIndex, RStatementIndex
+from .stale import digest
+
+STATEMENTS = {"r": RStatementIndex, "python": PythonStatementIndex}
+
+# file name or buffer id -> hashes of the top level statements last sourced
+_sourced = {}
+
+
+def session_key(view):
+    return view.file_name() or view.buffer_id()
+
+
+def top_level(view):
+    # the regions of the top level statements of an R, Python or Julia buffer
+    # and the getter of the buffer
+    getter = CodeGetter.initialize(view, advance=False, cell=False)
+    buffer = getter.buffer
+    index = STATEMENTS.get(getter.settings.syntax())
+    statements = index.of(view) if index else None
+    regions = []
+    row = 0
+    while row <= buffer.lastrow:
+        line = buffer.line(buffer.text_point(row, 0))
+        text = buffer.substr(line)
+        content = text.strip()
+        if content.startswith("#="):
+            # a Julia block comment
+            end = buffer.find("=#", line.begin())
+            row = buffer.row(end.end()) + 1 if end.begin() != -1 else buffer.lastrow + 1
+            continue
+        if not content or content.startswith("#"):
+            row += 1
+            continue
+        if statements is not None:
+            rows = statements.statement_rows(row) or (row, row)
+            s = sublime.Region(buffer.text_point(rows[0], 0), buffer.row_end(rows[1]))
+        elif content.startswith('"""'):
+            # a Julia docstring, sent with the statement it documents
+            end = buffer.find('"""', line.begin() + len(text) - len(text.lstrip()) + 3)
+            s = line if end.begin() == -1 else line.cover(end)
+            nextrow = buffer.row(s.end()) + 1
+            while nextrow <= buffer.lastrow and not buffer.substr(buffer.line(
+                    buffer.text_point(nextrow, 0))).strip():
+                nextrow += 1
+            if nextrow <= buffer.lastrow:
+                s = s.cover(getter.expand_line(buffer.line(buffer.text_point(nextrow, 0))))
+        else:
+            s = getter.expand_line(line)
+        if regions and s.begin() < regions[-1].end():
+            s = regions.pop().cover(s)
+        regions.append(s)
+        row = max(buffer.row(s.end()), row) + 1
+    return regions, getter
+
+
+def record_sourced(view):
+    # the whole buffer was sourced
+    regions, getter = top_level(view)
+    _sourced[session_key(view)] = {digest(getter.substr(s)) for s in regions}
+
+
+def was_sourced(view):
+    return session_key(view) in _sourced
+
+
+def source_changes(view):
+    # the payloads running the top level statements added or changed since
+    # the buffer was last sourced, and the number of those statements
+    regions, getter = top_level(view)
+    sourced = _sourced.get(session_key(view), set())
+    texts = [getter.substr(s) for s in regions]
+    hashes = [digest(text) for text in texts]
+    changed = [text.strip() for text, h in zip(texts, hashes) if h not in sourced]
+    _sourced[session_key(view)] = set(hashes)
+    return getter.join_cells(changed), len(changed)
+
+
+def reset():
+    _sourced.clear()
@@ -1,22 +1,16 @@
 import sublime
 import re
 from ..settings import Settings
+from .index import BufferSnapshot, CellIndex, BracketIndex, RStatementIndex, \
+    PythonStatementIndex, JuliaBlockIndex
+from .chunks import ChunkIndex
+from .recorder import timed_expand
+from .stale import CELL, only_comments
 
 COMMENTED_OPERATOR = r'^\s*#.*(%>% *|\+ *)$'
 
 def find_surround(view, sel, pattern):
-    regions = view.find_all(pattern)
-    start = 0
-    for i in range(len(regions)):
-        end = regions[i].begin()
-        if start <= sel.begin() and end >= sel.end():
-            break
-        start = regions[i].begin()
-    else:  # no pattern occurrence after sel, go to end of file
-        end = view.size()
-    # if start > 0:
-    #     start = view.find('\n+', start).end()
-    return sublime.Region(start, end)
+    return CellIndex.of(view, pattern).surround(sel)
 
 class CodeGetter:
 
@@ -25,6 +19,7 @@ class CodeGetter:
         self.auto_advance = advance
         self.cell = cell
         self.setup = setup
+        self.buffer = BufferSnapshot.of(view)
         self.settings = Settings(view)
         self.auto_expand_line = self.settings.get("auto_expand_line", True)
         self.auto_advance_non_empty = self.settings.get("auto_advance_non_empty", False)
@@ -47,7 +42,7 @@ class CodeGetter:
             return CodeGetter(view, *args, **kwargs)
 
     def expand_cursor(self, s):
-        s = self.view.line(s)
+        s = self.buffer.line(s)
         if self.cell:
             return self.expand_cell(s)
         if self.auto_expand_line:
@@ -56,134 +51,137 @@ class CodeGetter:
 
     def expand_cell(self, s):
         if self.setup:
-            return find_surround(self.view, sublime.Region(0, 0), '# %%')
+            return find_surround(self.view, sublime.Region(0, 0), CELL)
         else:
-            return find_surround(self.view, s, '# %%')
+            return find_surround(self.view, s, CELL)
 
     def expand_line(self, s):
         return s
 
     def substr(self, s):
-        return self.view.substr(s)
+        return self.buffer.substr(s)
 
     def advance(self, s):
-        view = self.view
-        pt = view.text_point(view.rowcol(s.end())[0] + 1, 0)
+        # the point to move a cursor to after sending s
+        buffer = self.buffer
+        pt = buffer.text_point(buffer.rowcol(s.end())[0] + 1, 0)
         if self.auto_advance_non_empty:
-            nextpt = view.find(r"\S", pt)
+            nextpt = buffer.find(r"\S", pt)
             if nextpt.begin() != -1:
-                pt = view.text_point(view.rowcol(nextpt.begin())[0], 0)
-        view.sel().add(sublime.Region(pt, pt))
+                pt = buffer.text_point(buffer.rowcol(nextpt.begin())[0], 0)
+        return pt
 
     def get_text(self):
         view = self.view
-        cmd = ''
-        moved = False
-        sels = [s for s in view.sel()]
+        sels = sorted(view.sel(), key=lambda s: (s.begin(), s.end()))
+        # expand the cursors in a single sweep, a cursor inside the region of
+        # the previous one is not expanded again
+        regions = []
+        expanded = None
         for s in sels:
             if s.empty():
-                original_s = s
-                s = self.expand_cursor(s)
-                if self.auto_advance:
-                    view.sel().subtract(original_s)
-                    self.advance(s)
-                    moved = True
-
-            cmd += self.substr(s) + '\n'
-
-        if moved:
+                if not (expanded is not None and expanded.contains(s)):
+                    expanded = timed_expand(self, s)
+                regions.append((expanded, True))
+            else:
+                regions.append((s, False))
+
+        # merge duplicate and overlapping regions, cursors move after the
+        # merged regions of their expansions
+        self.regions = []
+        advance = []
+        for s, cursor in sorted(regions, key=lambda r: (r[0].begin(), r[0].end())):
+            if self.regions and (s.begin() < self.regions[-1].end() or s == self.regions[-1]):
+                self.regions[-1] = self.regions[-1].cover(s)
+                advance[-1] = advance[-1] or cursor
+            else:
+                self.regions.append(s)
+                advance.append(cursor)
+        cmd = "".join(self.substr(s) + "\n" for s in self.regions)
+
+        if self.auto_advance and any(advance):
+            cursors = [s for s in sels if not s.empty()]
+            for s, cursor in zip(self.regions, advance):
+                if cursor:
+                    pt = self.advance(s)
+                    cursors.append(sublime.Region(pt, pt))
+            view.sel().clear()
+            view.sel().add_all(cursors)
             view.show(view.sel())
 
-        if self.cell and isinstance(self, JuliaCodeGetter):
-            cmd = cmd.strip()
-            suffix = ';' if cmd.endswith(';') else ''
-            cmd = 'begin\n' + cmd + '\nend' + suffix
-
-        if isinstance(self, JuliaCodeGetter):
-            cmd = cmd.strip()
-
-        if self.cell and isinstance(self, PythonCodeGetter):
-            try:
-                i = cmd.index('%%R')
-                cmd = cmd[i:]
-            except ValueError:
-                pass
+        return self.wrap(cmd)
 
+    def wrap(self, cmd):
+        # the language specific wrapping of the text of get_text
         return cmd
 
-    def find_inline(self, pattern, pt):
-        while True:
-            result = self.view.find(pattern, pt)
-            if result.begin() == -1 or \
-                    self.view.rowcol(result.begin())[0] != self.view.rowcol(pt)[0]:
-                return sublime.Region(-1, -1)
-            else:
-                if not self.view.score_selector(result.begin(), "string, comment"):
-                    return result
-                else:
-                    pt = result.end()
+    def get_cells(self, which):
+        # the payloads running the `# %%` cells "above" or "below" the cursor,
+        # or "all" of them
+        cells = CellIndex.of(self.view, CELL)
+        return self.cell_payloads(cells.select(which, self.view.sel()[0]))
+
+    def cell_payloads(self, regions):
+        # the payloads running the cells of regions, each cell wrapped as if it
+        # was sent alone
+        self.regions = []
+        texts = []
+        for region in regions:
+            text = self.substr(region)
+            if only_comments(text):
+                continue
+            self.regions.append(region)
+            texts.append(self.wrap(text + "\n").strip())
+        return self.join_cells(texts)
+
+    def join_cells(self, texts):
+        return ["\n\n".join(texts)] if texts else []
+
+    def origin(self, cmd):
+        # the file name and the row where cmd starts, the row is only known if
+        # the text of get_text comes from a single region
+        row = None
+        if len(self.regions) == 1:
+            region = self.regions[0]
+            text = self.substr(region)
+            for i, line in enumerate(cmd.split("\n")[:3]):
+                if not line.strip():
+                    continue
+                m = re.search(r"^[ \t]*" + re.escape(line.strip()), text, re.MULTILINE)
+                if m and self.buffer.rowcol(region.begin() + m.start())[0] >= i:
+                    row = self.buffer.rowcol(region.begin() + m.start())[0] - i
+                    break
+        return self.view.file_name(), row
 
     def forward_expand(self, s, pattern=r"\S(?=\s*$)", scope="keyword.operator", paren=True):
-        level = 0
-        row = self.view.rowcol(s.begin())[0]
-        lastrow = self.view.rowcol(self.view.size())[0]
+        buffer = self.buffer
+        brackets = BracketIndex.of(self.view)
+        row = buffer.row(s.begin())
+        lastrow = buffer.lastrow
+        level = brackets.depth[row]
         while row <= lastrow:
-            line = self.view.line(self.view.text_point(row, 0))
-            pt = line.begin()
-            while paren:
-                res = self.find_inline(r"[{}\[\]()]", pt)
-                if res.begin() == -1:
+            if paren:
+                row = brackets.close_row(row, level)
+                if row is None:
                     break
-                if self.view.substr(res) in ["{", "[", "("]:
-                    level += 1
-                elif self.view.substr(res) in ["}", "]", ")"]:
-                    level -= 1
-                pt = res.end()
+            line = buffer.line(buffer.text_point(row, 0))
+            pt = brackets.after_last_bracket(row) if paren else line.begin()
 
-            if level > 0:
-                row = row + 1
+            if not pattern:
+                s = sublime.Region(s.begin(), line.end())
+                break
             else:
-                if not pattern:
+                if re.match(COMMENTED_OPERATOR, buffer.substr(line)):
+                    row = row + 1
+                    continue
+
+                res = brackets.find_inline(pattern, pt)
+                if res.begin() != -1 and \
+                        self.view.score_selector(res.begin(), scope):
+                    row = row + 1
+                else:
                     s = sublime.Region(s.begin(), line.end())
                     break
-                else:
-                    if re.match(COMMENTED_OPERATOR, self.view.substr(line)):
-                        row = row + 1
-                        continue
-
-                    res = self.find_inline(pattern, pt)
-                    if res.begin() != -1 and \
-                            self.view.score_selector(res.begin(), scope):
-                        row = row + 1
-                    else:
-                        s = sublime.Region(s.begin(), line.end())
-                        break
-        if row == lastrow:
-            s = sublime.Region(s.begin(), line.end())
-
-        return s
-
-    def backward_expand(self, s, pattern=r"[+\-*/](?=\s*$)", scope="keyword.operator", indent=0):
-        # backward_expand previous lines ending with operators
-
-        view = self.view
-        row = view.rowcol(s.begin())[0]
-        while row > 0:
-            row = row - 1
-            line = view.line(view.text_point(row, 0))
-            this_indent = len(view.substr(line)) - len(view.substr(line).lstrip(' '))
-            if indent > 0 and this_indent > 0:
-                s = line
-                continue
-            if re.search(pattern, view.substr(line)):
-                if re.match(COMMENTED_OPERATOR, view.substr(line)):
-                    s = line
-                    continue
-                endpt = self.find_inline(r"\S(?=(\s*$)|(\s*#.*$))", line.begin()).begin()
-                if endpt != -1 and self.view.score_selector(endpt, scope):
-                    s = line
-                    continue
-            break
 
         return s
 
@@ -196,26 +194,22 @@ class RCodeGetter(CodeGetter):
 
     def expand_line(self, s):
 
-        view = self.view
-        # if view.score_selector(s.begin(), "rcall.julia"):
+        buffer = self.buffer
+        # if self.view.score_selector(s.begin(), "rcall.julia"):
         #     return self.expand_cell(s)
 
-        if view.score_selector(s.begin(), "string"):
+        if self.view.score_selector(s.begin(), "string"):
             return s
 
-        thiscmd = view.substr(s)
-        indent = len(thiscmd) - len(thiscmd.lstrip(' '))
-
-        s = self.backward_expand(s, r"(^\s*#.*$)|([+\-*\/]|%[+<>$:a-zA-Z]+%)(?=(\s*$)|(\s*#.*$))", indent=indent)        
-
-        row = view.rowcol(s.begin())[0]
-        lastrow = view.rowcol(view.size())[0]
+        thiscmd = buffer.substr(s)
+        row = buffer.rowcol(s.begin())[0]
+        lastrow = buffer.rowcol(buffer.size())[0]
         if re.match(r"#\+", thiscmd):
-            prevline = view.line(s.begin())
+            prevline = buffer.line(s.begin())
             while row < lastrow:
                 row = row + 1
-                line = view.line(view.text_point(row, 0))
-                line_content = view.substr(line)
+                line = buffer.line(buffer.text_point(row, 0))
+                line_content = buffer.substr(line)
                 m = re.match(r"#'|#\+", line_content)
                 if m:
                     s = sublime.Region(s.begin(), prevline.end())
@@ -227,105 +221,110 @@ class RCodeGetter(CodeGetter):
                 s = sublime.Region(s.begin(), prevline.end())
 
         else:
-            s = self.forward_expand(s, pattern=r"(^\s*#.*$)|([+\-*/]|%[+<>$:a-zA-Z]+%)(?=(\s*$)|(\s*#.*$))")
+            first, last = RStatementIndex.of(self.view).statement_rows(row)
+            s = sublime.Region(buffer.text_point(first, 0), buffer.row_end(last))
 
         return s
 
     def substr(self, s):
-        view = self.view
-        row, col = view.rowcol(s.begin())
+        buffer = self.buffer
+        row, col = buffer.rowcol(s.begin())
 
-        if col == 0 and view.substr(s).startswith("#' "):
+        if col == 0 and buffer.substr(s).startswith("#' "):
             while row >= 0:
                 row = row - 1
-                line = view.line(view.text_point(row, 0))
-                line_content = view.substr(line)
+                line = buffer.line(buffer.text_point(row, 0))
+                line_content = buffer.substr(line)
                 if not line_content.startswith("#'") and not line_content.strip():
                     break
                 if line_content.startswith("#' @example"):
                     cmd = ""
-                    for line in view.lines(s):
-                        line_content = view.substr(line)
+                    for line in buffer.lines(s):
+                        line_content = buffer.substr(line)
                         cmd += line_content[3:] if line_content.startswith("#' ") else line_content
                         cmd += "\n"
 
                     cmd = cmd[:-1]  # remove last newline
                     return cmd
 
-        return view.substr(s)
+        return buffer.substr(s)
 
 
 class PythonCodeGetter(CodeGetter):
 
     def expand_line(self, s):
-        view = self.view
-        if view.score_selector(s.begin(), "string"):
+        buffer = self.buffer
+        if self.view.score_selector(s.begin(), "string"):
             return s
-        thiscmd = view.substr(s)
-        row = view.rowcol(s.begin())[0]
-        prevline = view.line(s.begin())
-        lastrow = view.rowcol(view.size())[0]
+        thiscmd = buffer.substr(s)
+        row = buffer.rowcol(s.begin())[0]
+        prevline = buffer.line(s.begin())
+        lastrow = buffer.rowcol(buffer.size())[0]
         if re.match(r"^(#\s%%|#%%|# In\[)", thiscmd):
             while row < lastrow:
                 row = row + 1
-                line = view.line(view.text_point(row, 0))
-                m = re.match(r"^(#\s%%|#%%|# In\[)", view.substr(line))
+                line = buffer.line(buffer.text_point(row, 0))
+                m = re.match(r"^(#\s%%|#%%|# In\[)", buffer.substr(line))
                 if m:
                     s = sublime.Region(s.begin(), prevline.end())
                     break
-                elif len(view.substr(line).strip()) > 0:
+                elif len(buffer.substr(line).strip()) > 0:
                     prevline = line
 
             if row == lastrow:
                 s = sublime.Region(s.begin(), prevline.end())
 
-        elif re.match(r"[ \t]*\S", thiscmd):
-            indentation = re.match(r"[ \t]*", thiscmd).group(0)
-            while row < lastrow:
-                res = self.forward_expand(view.line(view.text_point(row, 0)), pattern=None)
-                newrow = view.rowcol(res.end())[0]
-                if newrow > row:
-                    row = newrow
-                    prevline = view.line(view.text_point(row, 0))
-                row = row + 1
-                line = view.line(view.text_point(row, 0))
-                m = re.match(r"([ \t]*)([^\n\s]+)", view.substr(line))
-                if m and len(m.group(1)) <= len(indentation) and \
-                        (len(m.group(1)) < len(indentation) or
-                            not re.match(r"else|elif|except|finally", m.group(2))):
-                    s = sublime.Region(s.begin(), prevline.end())
-                    break
-                elif re.match(r"[ \t]*\S", view.substr(line)):
-                    prevline = line
-
-            if row == lastrow:
-                s = sublime.Region(s.begin(), prevline.end())
+        else:
+            rows = PythonStatementIndex.of(self.view).statement_rows(row)
+            if rows is not None:
+                s = sublime.Region(buffer.text_point(rows[0], 0), buffer.row_end(rows[1]))
 
         return s
 
+    def wrap(self, cmd):
+        if self.cell:
+            try:
+                i = cmd.index('%%R')
+                cmd = cmd[i:]
+            except ValueError:
+                pass
+        return cmd
+
+    def join_cells(self, texts):
+        # a %%R cell magic takes the whole input, so such cells go alone
+        payloads = []
+        joined = []
+        for text in texts:
+            if text.startswith('%%R'):
+                if joined:
+                    payloads.append("\n\n".join(joined))
+                    joined = []
+                payloads.append(text)
+            else:
+                joined.append(text)
+        if joined:
+            payloads.append("\n\n".join(joined))
+        return payloads
+
 
 class JuliaCodeGetter(CodeGetter):
 
     def expand_line(self, s):
-        view = self.view
-        if view.score_selector(s.begin(), "string"):
+        buffer = self.buffer
+        if self.view.score_selector(s.begin(), "string"):
             return s
-        thiscmd = view.substr(s)
-        print("thiscmd", thiscmd)
-        row = view.rowcol(s.begin())[0]
-        prevline = view.line(s.begin())
-        lastrow = view.rowcol(view.size())[0]
-
-        keywords = [
-            "function", "macro", "if", "for", "while", "try", "module",
-            "abstruct", "type", "struct", "immutable", "mutable",
-        ]
+        thiscmd = buffer.substr(s)
+        row = buffer.rowcol(s.begin())[0]
+        prevline = buffer.line(s.begin())
+        lastrow = buffer.rowcol(buffer.size())[0]
+        blocks = JuliaBlockIndex.of(self.view)
+        endrow = blocks.block_end(row)
 
         if re.match(r"^(#\s%%|#%%)", thiscmd):
             while row < lastrow:
                 row = row + 1
-                line = view.line(view.text_point(row, 0))
-                m = re.match(r"^(#\s%%|#%%)", view.substr(line))
+                line = buffer.line(buffer.text_point(row, 0))
+                m = re.match(r"^(#\s%%|#%%)", buffer.substr(line))
                 if m:
                     s = sublime.Region(s.begin(), prevline.end())
                     break
@@ -334,66 +333,61 @@ class JuliaCodeGetter(CodeGetter):
 
             if row == lastrow:
                 s = sublime.Region(s.begin(), prevline.end())
-        elif (re.match(r"(@\w+)?\s*\b(?:{})\b".format("|".join(keywords)), thiscmd) and
-                not re.match(r".*\bend\b\s*$", thiscmd)) or \
-                (re.match(r".*\b(?:begin|do|let|quote)\b\s*", thiscmd)):
-            indentation = re.match(r"^(\s*)", thiscmd).group(1)
-            endline = view.find(r"^" + indentation + r"\bend\b", s.begin())
-            s = sublime.Region(s.begin(), view.line(endline.end()).end())
+        elif endrow is not None and endrow > row:
+            s = sublime.Region(s.begin(), buffer.row_end(endrow))
 
         elif re.match(r"\s*\b(using|import|export)\b", thiscmd):
-            row = view.rowcol(s.begin())[0]
-            lastrow = view.rowcol(view.size())[0]
+            row = buffer.rowcol(s.begin())[0]
+            lastrow = buffer.rowcol(buffer.size())[0]
             while row <= lastrow:
-                line = view.line(view.text_point(row, 0))
-                if re.match(r".*[:,]\s*$", view.substr(line)):
+                line = buffer.line(buffer.text_point(row, 0))
+                if re.match(r".*[:,]\s*$", buffer.substr(line)):
                     row = row + 1
                 else:
                     s = sublime.Region(s.begin(), line.end())
                     break
 
         elif re.match(r"\s*\bend\b", thiscmd):
-            # find the beginning of this block
-            indent = len(re.match(r"^(\s*)", thiscmd).group(1))
-            row = view.rowcol(s.begin())[0]
-            while row > 0:
-                row = row - 1
-                line = view.line(view.text_point(row, 0))
-                this_indent = len(view.substr(line)) - len(view.substr(line).lstrip(' '))
-
-                linestr = view.substr(line)
-                print('-> |{linestr}| ({this_indent})'.format_map(locals()))
-
-                start = line
-                if this_indent <= indent and not re.match(r"\s*(elseif|else)", linestr):
-                    break
-            s = sublime.Region(start.begin(), s.end())
+            # find the beginning of the blocks closed here
+            beginrow = blocks.block_begin(row)
+            if beginrow is not None:
+                s = sublime.Region(buffer.text_point(beginrow, 0), s.end())
 
         else:
             s = self.forward_expand(s, pattern=r"[+\-*/](?=\s*$)")
         return s
 
+    def wrap(self, cmd):
+        if self.cell:
+            cmd = cmd.strip()
+            suffix = ';' if cmd.endswith(';') else ''
+            cmd = 'begin\n' + cmd + '\nend' + suffix
+        return cmd.strip()
+
+    def join_cells(self, texts):
+        return ["\n".join(texts)] if texts else []
+
 
 class MarkDownCodeGetter(CodeGetter):
 
     def advance(self, s):
-        view = self.view
-        nextline = view.substr(view.line(s.end() + 1))
+        buffer = self.buffer
+        nextline = buffer.substr(buffer.line(s.end() + 1))
         if re.match(r"^```", nextline):
-            pt = view.text_point(view.rowcol(s.end())[0] + 2, 0)
+            pt = buffer.text_point(buffer.rowcol(s.end())[0] + 2, 0)
             if self.auto_advance_non_empty:
-                nextpt = view.find(r"\S", pt)
+                nextpt = buffer.find(r"\S", pt)
                 if nextpt.begin() != -1:
-                    pt = view.text_point(view.rowcol(nextpt.begin())[0], 0)
-            view.sel().add(sublime.Region(pt, pt))
+                    pt = buffer.text_point(buffer.rowcol(nextpt.begin())[0], 0)
+            return pt
         else:
-            super().advance(s)
+            return super().advance(s)
 
     def expand_line(self, s):
-        view = self.view
-        thisline = view.substr(s)
+        buffer = self.buffer
+        thisline = buffer.substr(s)
         if re.match(r"^```", thisline):
-            end = view.find("^```$", s.end())
+            end = buffer.find("^```$", s.end())
             s = sublime.Region(s.end() + 1, end.begin() - 1)
         return s
 
@@ -401,9 +395,9 @@ class MarkDownCodeGetter(CodeGetter):
 class RMarkDownCodeGetter(RCodeGetter):
     def expand_cell(self, s):
         if self.setup:
-            start = self.view.find(r'```{r setup.*}\n', 0).b
-            end = self.view.find(r'\n```', start).a
-            return sublime.Region(start, end)
+            chunk = ChunkIndex.of(self.view).setup_chunk()
+            if chunk is not None:
+                return sublime.Region(chunk.begin, chunk.end)
 
         s = find_surround(self.view, s, '^```')
         # start = self.view.find('\n', s.begin()).begin()+1
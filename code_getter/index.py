@@ -0,0 +1,848 @@
+import sublime
+import array
+import bisect
+import io
+import re
+import tokenize
+
+
+# buffer_id -> {key: index}
+_indexes = {}
+
+
+def _map_point(pt, a, b, n, end=False):
+    # map a point of the buffer before replacing [a, b) with n characters
+    if pt < a:
+        return pt
+    if pt >= b and (pt > a or b > a):
+        return pt + n - (b - a)
+    return a + n if end else a
+
+
+class BufferIndex:
+    """
+    Base class of the per-buffer indexes kept in sync by
+    SendCodeTextChangeListener. Subclasses implement `build` and may implement
+    `patch`/`refresh` to update themselves incrementally.
+    """
+
+    change_count = None
+
+    @classmethod
+    def of(cls, view, *args):
+        indexes = _indexes.setdefault(view.buffer_id(), {})
+        key = (cls,) + args
+        index = indexes.get(key)
+        change_count = view.change_count()
+        if index is None or index.change_count != change_count:
+            index = cls(*args)
+            index.build(view)
+            index.change_count = change_count
+            indexes[key] = index
+        else:
+            index.refresh(view)
+        return index
+
+    def build(self, view):
+        raise NotImplementedError
+
+    def patch(self, a, b, text):
+        # invalidate the index, it will be rebuilt on next use
+        self.change_count = None
+
+    def refresh(self, view):
+        pass
+
+
+def patch_buffer(buffer_id, changes, change_count):
+    indexes = _indexes.get(buffer_id)
+    if not indexes:
+        return
+    for index in indexes.values():
+        if index.change_count is None:
+            continue
+        for change in changes:
+            index.patch(change.a.pt, change.b.pt, change.str)
+        if index.change_count is not None:
+            index.change_count = change_count
+
+
+def has_indexes(buffer_id):
+    return bool(_indexes.get(buffer_id))
+
+
+def discard_buffer(buffer_id):
+    _indexes.pop(buffer_id, None)
+
+
+class BufferSnapshot(BufferIndex):
+    """
+    The text of a buffer and the offsets of its line starts, read with a single
+    `view.substr` per change count. It mirrors the line related methods of
+    `sublime.View` so that getters run their line logic in Python.
+    """
+
+    def build(self, view):
+        self.text = text = view.substr(sublime.Region(0, view.size()))
+        starts = array.array("l", [0])
+        starts.extend(m.end() for m in re.finditer("\n", text))
+        self.starts = starts
+
+    def size(self):
+        return len(self.text)
+
+    @property
+    def lastrow(self):
+        return len(self.starts) - 1
+
+    def row(self, pt):
+        return bisect.bisect_right(self.starts, pt) - 1
+
+    def rowcol(self, pt):
+        row = self.row(pt)
+        return row, pt - self.starts[row]
+
+    def text_point(self, row, col):
+        if row < 0:
+            return 0
+        if row > self.lastrow:
+            return len(self.text)
+        return min(self.starts[row] + col, self.row_end(row))
+
+    def row_end(self, row):
+        if row < self.lastrow:
+            return self.starts[row + 1] - 1
+        return len(self.text)
+
+    def line(self, x):
+        if isinstance(x, int):
+            x = sublime.Region(x, x)
+        begin = min(max(x.begin(), 0), len(self.text))
+        end = min(max(x.end(), 0), len(self.text))
+        return sublime.Region(self.starts[self.row(begin)], self.row_end(self.row(end)))
+
+    def lines(self, x):
+        line = self.line(x)
+        return [
+            sublime.Region(self.starts[row], self.row_end(row))
+            for row in range(self.row(line.begin()), self.row(line.end()) + 1)]
+
+    def substr(self, x):
+        if isinstance(x, int):
+            return self.text[x:x + 1]
+        return self.text[x.begin():x.end()]
+
+    def find(self, pattern, pt):
+        m = re.compile(pattern, re.MULTILINE).search(self.text, max(pt, 0))
+        if m is None:
+            return sublime.Region(-1, -1)
+        return sublime.Region(m.start(), m.end())
+
+
+class CellIndex(BufferIndex):
+    """
+    Sorted begin points of all matches of a cell boundary pattern, e.g. `# %%`.
+    Patterns must not span multiple lines.
+    """
+
+    def __init__(self, pattern):
+        self.regex = re.compile(pattern, re.MULTILINE)
+
+    def build(self, view):
+        text = BufferSnapshot.of(view).text
+        self.points = [m.start() for m in self.regex.finditer(text)]
+        self.size = len(text)
+        self.dirty = []
+
+    def patch(self, a, b, text):
+        n = len(text)
+        points = self.points
+        lo = bisect.bisect_left(points, a)
+        hi = bisect.bisect_left(points, b)
+        if b == a:
+            lo = hi
+        delta = n - (b - a)
+        points[lo:] = [p + delta for p in points[hi:]]
+        self.size += delta
+        self.dirty = [
+            (_map_point(x, a, b, n), _map_point(y, a, b, n, end=True))
+            for x, y in self.dirty]
+        self.dirty.append((a, a + n))
+
+    def refresh(self, view):
+        # rescan the lines touched by the changes since last use
+        if not self.dirty:
+            return
+        points = self.points
+        buffer = BufferSnapshot.of(view)
+        for x, y in self.dirty:
+            region = buffer.line(sublime.Region(x, y))
+            text = buffer.substr(region)
+            lo = bisect.bisect_left(points, region.begin())
+            hi = bisect.bisect_right(points, region.end())
+            points[lo:hi] = [region.begin() + m.start() for m in self.regex.finditer(text)]
+        self.dirty = []
+
+    def next_point(self, pt):
+        # the first boundary after pt
+        i = bisect.bisect_right(self.points, pt)
+        return self.points[i] if i < len(self.points) else None
+
+    def surround(self, sel):
+        # the region between the boundaries enclosing sel
+        points = self.points
+        j = bisect.bisect_left(points, sel.end())
+        start = points[j - 1] if j > 0 else 0
+        if start > sel.begin():
+            # a boundary inside sel, go to end of file
+            return sublime.Region(points[-1], self.size)
+        end = points[j] if j < len(points) else self.size
+        return sublime.Region(start, end)
+
+    def cells(self):
+        # the regions between consecutive boundaries, including the one before
+        # the first boundary if not empty
+        bounds = [0] + self.points + [self.size]
+        return [sublime.Region(a, b) for a, b in zip(bounds, bounds[1:]) if b > a]
+
+    def select(self, which, sel):
+        # the cells "above" or "below" the one enclosing sel, or "all" of them
+        cells = self.cells()
+        if which == "above":
+            begin = self.surround(sel).begin()
+            return [c for c in cells if c.end() <= begin]
+        elif which == "below":
+            end = self.surround(sel).end()
+            return [c for c in cells if c.begin() >= end]
+        return cells
+
+
+class BracketIndex(BufferIndex):
+    """
+    Cumulative depth of the brackets outside strings and comments at every
+    line start. Edits of words and blanks on a single row, away from quotes
+    and comment marks, cannot change the scopes of the other characters: the
+    strings and comments are shifted and that row is rescanned. Otherwise they
+    are read again and the rows from the first edited one are rescanned.
+    """
+
+    BRACKETS = re.compile(r"[{}\[\]()]")
+    OPENING = "{[("
+    # text which may be edited without reading the scopes again
+    WORDS = re.compile(r"[\w \t]*\Z")
+    WORD_BEFORE = re.compile(r"\w*\Z")
+    WORD_AFTER = re.compile(r"\w*")
+    # characters around such edits which may start or end a string or comment
+    DELIMITERS = "\"'`#\\-"
+    # rows per minimum depth of the blocks used by close_row
+    BLOCK = 64
+
+    def build(self, view):
+        self.buffer = None
+        self.depth = array.array("l", [0])
+        # the brackets open at every line start, innermost last
+        self.opened = [""]
+        # column after the last bracket of each row
+        self.tail = array.array("l")
+        self.minima = array.array("l")
+        # the edited points [lo, hi) and the change of size since last use
+        self.dirty = (0, 0, 0)
+        self.refresh(view)
+
+    def patch(self, a, b, text):
+        n = len(text)
+        if self.dirty is None:
+            self.dirty = (a, a + n, n - (b - a))
+        else:
+            lo, hi, delta = self.dirty
+            hi = max(_map_point(hi, a, b, n, end=True), a + n)
+            self.dirty = (min(lo, a), hi, delta + n - (b - a))
+
+    def refresh(self, view):
+        if self.dirty is None:
+            return
+        lo, hi, delta = self.dirty
+        old = self.buffer
+        self.buffer = buffer = BufferSnapshot.of(view)
+        self.dirty = None
+        row = buffer.row(lo)
+        if old is not None and self.words_only(old, lo, hi, delta):
+            self.shift_mask(view, lo, hi, delta)
+            if self.scan(row, row + 1):
+                return
+        self.read_mask(view)
+        self.scan(row, buffer.lastrow + 1)
+        self.update_minima(row)
+
+    def words_only(self, old, lo, hi, delta):
+        # whether only words and blanks of a row away from the delimiters of
+        # strings and comments were edited
+        text = self.buffer.text
+        if not self.WORDS.match(old.text, lo, hi - delta) or not self.WORDS.match(text, lo, hi):
+            return False
+        line = self.buffer.line(lo)
+        if "`" in text[line.begin():line.end()]:
+            # a code fence
+            return False
+        before = self.WORD_BEFORE.search(text, line.begin(), lo).start()
+        after = self.WORD_AFTER.match(text, hi).end()
+        return (text[before - 1:before] or " ") not in self.DELIMITERS and \
+            (text[after:after + 1] or " ") not in self.DELIMITERS
+
+    def read_mask(self, view):
+        mask = []
+        for r in view.find_by_selector("string, comment"):
+            if mask and r.begin() <= mask[-1][1]:
+                mask[-1][1] = max(mask[-1][1], r.end())
+            else:
+                mask.append([r.begin(), r.end()])
+        self.mask_begins = [r[0] for r in mask]
+        self.mask_ends = [r[1] for r in mask]
+
+    def shift_mask(self, view, lo, hi, delta):
+        # the inserted words take the scope of the text they are typed in
+        begins, ends = self.mask_begins, self.mask_ends
+        i = bisect.bisect_right(ends, lo)
+        j = bisect.bisect_left(begins, hi - delta)
+        mask = [[b, min(e, lo)] for b, e in zip(begins[i:j], ends[i:j]) if b < lo]
+        if hi > lo and view.match_selector(lo, "string, comment"):
+            mask.append([lo, hi])
+        mask.extend([max(b, hi - delta) + delta, e + delta]
+                    for b, e in zip(begins[i:j], ends[i:j]) if e > hi - delta)
+        merged = []
+        for r in mask:
+            if merged and r[0] <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], r[1])
+            else:
+                merged.append(r)
+        begins[i:j] = [r[0] for r in merged]
+        ends[i:j] = [r[1] for r in merged]
+        begins[i + len(merged):] = [b + delta for b in begins[i + len(merged):]]
+        ends[i + len(merged):] = [e + delta for e in ends[i + len(merged):]]
+
+    def scan(self, row, stop):
+        # rescan the rows from row to stop, return whether the brackets open
+        # after them are unchanged
+        buffer = self.buffer
+        text = buffer.text
+        starts = buffer.starts
+        nrows = len(starts)
+        depth = self.depth
+        level = depth[row]
+        stack = list(self.opened[row])
+        tails = array.array("l")
+        depths = array.array("l")
+        opened = []
+        for r in range(row, stop):
+            begin = starts[r]
+            end = starts[r + 1] - 1 if r + 1 < nrows else len(text)
+            tail = 0
+            for m in self.BRACKETS.finditer(text, begin, end):
+                if self.masked(m.start()):
+                    continue
+                if m.group() in self.OPENING:
+                    level += 1
+                    stack.append(m.group())
+                else:
+                    level -= 1
+                    if stack:
+                        stack.pop()
+                tail = m.end() - begin
+            depths.append(level)
+            tails.append(tail)
+            opened.append("".join(stack))
+        if stop < nrows:
+            if (depth[stop], self.opened[stop]) != (depths[-1], opened[-1]):
+                return False
+            depth[row + 1:stop + 1] = depths
+            self.tail[row:stop] = tails
+            self.opened[row + 1:stop + 1] = opened
+        else:
+            depth[row + 1:] = depths
+            self.tail[row:] = tails
+            self.opened[row + 1:] = opened
+        return True
+
+    def update_minima(self, row):
+        # minima[k] is the least depth of the line starts of block k
+        depth = self.depth
+        k = row // self.BLOCK
+        del self.minima[k:]
+        self.minima.extend(
+            min(depth[p:p + self.BLOCK]) for p in range(k * self.BLOCK, len(depth), self.BLOCK))
+
+    def masked(self, pt):
+        i = bisect.bisect_right(self.mask_begins, pt) - 1
+        return i >= 0 and pt < self.mask_ends[i]
+
+    def close_row(self, row, level):
+        # the first row, from `row` on, at whose end the bracket depth is not
+        # greater than level, or None if there is no such row
+        depth = self.depth
+        minima = self.minima
+        block = self.BLOCK
+        p = row + 1
+        while p < len(depth):
+            if p % block == 0 and minima[p // block] > level:
+                p += block
+            elif depth[p] <= level:
+                return p - 1
+            else:
+                p += 1
+        return None
+
+    def after_last_bracket(self, row):
+        return self.buffer.starts[row] + self.tail[row]
+
+    def find_inline(self, pattern, pt):
+        # the first match of pattern in the row of pt outside strings and comments
+        end = self.buffer.line(pt).end()
+        for m in re.compile(pattern, re.MULTILINE).finditer(self.buffer.text, pt, end):
+            if not self.masked(m.start()):
+                return sublime.Region(m.start(), m.end())
+        return sublime.Region(-1, -1)
+
+
+
+class RStatementIndex(BufferIndex):
+    """
+    The first row of the R statement at every row and, on demand, its last
+    row. Rows are joined when they start inside parentheses, brackets or a
+    string, or follow a row ending with an operator, e.g. `%>%` or `+`,
+    also in commented out lines. Blank and comment lines between them are
+    skipped, roxygen lines are statements of their own. Rows are updated
+    from the first changed row.
+    """
+
+    OPERATOR = re.compile(r"([+\-*/]|%[+<>$:a-zA-Z]+%)(?=[ \t]*(#[^\n]*)?$)", re.MULTILINE)
+    COMMENTED_OPERATOR = re.compile(r"^[ \t]*#.*(%>% *|\+ *)$", re.MULTILINE)
+    BLANK_OR_COMMENT = re.compile(r"^[ \t]*(#(?!')[^\n]*)?$", re.MULTILINE)
+    # flags of the rows
+    SKIPPED, CONTINUED, JOINED = 1, 2, 4
+
+    def build(self, view):
+        self.flags = bytearray()
+        self.start = array.array("l")
+        # first row -> last row of the statements asked for and the last row
+        # read to find it
+        self.ends = {}
+        self.dirty_row = 0
+        self.refresh(view)
+
+    def patch(self, a, b, text):
+        row = self.buffer.row(a)
+        if self.dirty_row is None or row < self.dirty_row:
+            self.dirty_row = row
+
+    def refresh(self, view):
+        if self.dirty_row is None:
+            return
+        self.buffer = buffer = BufferSnapshot.of(view)
+        self.brackets = brackets = BracketIndex.of(view)
+        text = buffer.text
+        row = min(self.dirty_row, len(self.start))
+        begin = buffer.starts[row] if row <= buffer.lastrow else len(text)
+        flags = self.flags
+        del flags[row:]
+        del self.start[row:]
+        flags.extend(bytearray(buffer.lastrow + 1 - row))
+
+        for m in self.BLANK_OR_COMMENT.finditer(text, begin):
+            flags[buffer.row(m.start())] |= self.SKIPPED
+        # in R Markdown only the operators of the R chunks continue a row, not
+        # the ones ending a line of text, e.g. `---` or a list item
+        if view.match_selector(0, "text.html.markdown"):
+            chunks = view.find_by_selector("source.r")
+            chunk_begins = [r.begin() for r in chunks]
+            chunk_ends = [r.end() for r in chunks]
+
+            def in_chunk(pt):
+                i = bisect.bisect_right(chunk_begins, pt) - 1
+                return i >= 0 and pt < chunk_ends[i]
+        else:
+            def in_chunk(pt):
+                return True
+        for m in self.OPERATOR.finditer(text, begin):
+            if not brackets.masked(m.start()) and in_chunk(m.start()):
+                flags[buffer.row(m.start())] |= self.CONTINUED
+        for m in self.COMMENTED_OPERATOR.finditer(text, begin):
+            if in_chunk(m.start()):
+                flags[buffer.row(m.start())] |= self.CONTINUED
+        for r in range(row, buffer.lastrow + 1):
+            pt = buffer.starts[r]
+            if brackets.opened[r][-1:] in ("(", "["):
+                flags[r] |= self.JOINED
+            elif brackets.masked(pt) and \
+                    not text[pt:buffer.row_end(r)].lstrip().startswith("#"):
+                # the row starts inside a string
+                flags[r] = flags[r] & ~self.SKIPPED | self.JOINED
+
+        # whether the last row not skipped before row is continued
+        r = row - 1
+        while r >= 0 and flags[r] & self.SKIPPED:
+            r -= 1
+        continued = r >= 0 and bool(flags[r] & self.CONTINUED)
+        start = self.start
+        for r in range(row, buffer.lastrow + 1):
+            f = flags[r]
+            start.append(start[r - 1] if r > 0 and (continued or f & self.JOINED) else r)
+            if not f & self.SKIPPED:
+                continued = bool(f & self.CONTINUED)
+
+        self.ends = {a: e for a, e in self.ends.items() if e[1] < row}
+        self.dirty_row = None
+
+    def end(self, first):
+        # the last row of the statement starting at row first
+        if first in self.ends:
+            return self.ends[first][0]
+        flags = self.flags
+        brackets = self.brackets
+        lastrow = self.buffer.lastrow
+        level = brackets.depth[first]
+        row = reached = first
+        if not flags[row] & self.SKIPPED:
+            row = brackets.close_row(first, level)
+            while row is not None and row < lastrow:
+                nextrow = row + 1
+                if flags[row] & self.CONTINUED:
+                    while nextrow <= lastrow and flags[nextrow] & self.SKIPPED:
+                        nextrow += 1
+                elif not flags[nextrow] & self.JOINED:
+                    reached = nextrow
+                    break
+                reached = min(nextrow, lastrow)
+                if nextrow > lastrow or brackets.depth[nextrow] != level:
+                    break
+                nextrow = brackets.close_row(nextrow, level)
+                if nextrow is None:
+                    reached = lastrow
+                    break
+                row = nextrow
+            if row is None:
+                # unclosed brackets, the rows up to the end were read
+                row = first
+                reached = lastrow
+            reached = max(reached, row)
+        self.ends[first] = (row, reached)
+        return row
+
+    def statement_rows(self, row):
+        first = self.start[row]
+        return first, max(self.end(first), row)
+
+
+class PythonStatementIndex(BufferIndex):
+    """
+    The logical lines of a Python buffer, from `tokenize`, and the last row of
+    the statement each one starts, including the blocks of compound
+    statements, their else/elif/except/finally clauses and the definitions
+    following decorators. Lines after a tokenize error are split by
+    indentation.
+
+    The buffer is tokenized lazily, up to the top level statement after the
+    queried row, and changes are re-tokenized from the top level statement
+    before the first changed row.
+    """
+
+    COMPOUND = {
+        "if", "while", "for", "try", "with", "def", "class", "async",
+        "elif", "else", "except", "finally"}
+    CLAUSES = {"elif", "else", "except", "finally"}
+    BRACKETS = {"(": 1, "[": 1, "{": 1, ")": -1, "]": -1, "}": -1}
+    SIMPLE, COMPOUND_STATEMENT, CLAUSE, DECORATOR = range(4)
+
+    def build(self, view):
+        # logical line -> first row, last row, indentation and kind
+        self.first = array.array("l")
+        self.last = array.array("l")
+        self.level = array.array("l")
+        self.kind = array.array("b")
+        # last row of the statement of each logical line, for the lines
+        # before the last top level statement seen so far
+        self.end = array.array("l")
+        self.fallback_row = None
+        self.dirty_row = 0
+        self.refresh(view)
+
+    def patch(self, a, b, text):
+        row = self.buffer.row(a)
+        if self.dirty_row is None or row < self.dirty_row:
+            self.dirty_row = row
+
+    def refresh(self, view):
+        if self.dirty_row is None:
+            return
+        self.buffer = BufferSnapshot.of(view)
+        row = self.dirty_row
+        if self.fallback_row is not None:
+            row = min(row, self.fallback_row)
+        # restart at the last top level statement starting before row, the
+        # kinds of the lines from row on may have changed, e.g. into a clause
+        # continuing the statement before
+        i = bisect.bisect_left(self.first, row) - 1
+        while i >= 0 and not self.top_level(i):
+            i -= 1
+        if i < 0:
+            i, row = 0, 0
+        else:
+            row = self.first[i]
+        for a in (self.first, self.last, self.level, self.kind, self.end):
+            del a[i:]
+        self.fallback_row = None
+        self.lines = self.logical_lines(row)
+        self.dirty_row = None
+
+    def top_level(self, i):
+        # whether the statements before logical line i end before it
+        return self.level[i] == 0 and self.kind[i] != self.CLAUSE and \
+            (i == 0 or self.kind[i - 1] != self.DECORATOR)
+
+    def logical_lines(self, row):
+        # (first row, last row, indentation, first token) of the logical lines
+        # from row on
+        text = self.buffer.text[self.buffer.starts[row]:]
+        readline = io.StringIO(text).readline
+        first = None
+        depth = 0
+        try:
+            for tok in tokenize.generate_tokens(readline):
+                if tok[0] in (tokenize.NL, tokenize.COMMENT, tokenize.INDENT,
+                              tokenize.DEDENT, tokenize.ENDMARKER):
+                    continue
+                if tok[0] == tokenize.NEWLINE:
+                    if first is not None:
+                        yield first[0], row + tok[2][0] - 1, first[1], first[2]
+                    first = None
+                    continue
+                if first is None:
+                    first = (row + tok[2][0] - 1, tok[2][1], tok[1])
+                if tok[0] == tokenize.ERRORTOKEN:
+                    break
+                if tok[0] == tokenize.OP and tok[1] in self.BRACKETS:
+                    depth += self.BRACKETS[tok[1]]
+                    if depth < 0:
+                        break
+            else:
+                if first is None:
+                    return
+        except (tokenize.TokenError, SyntaxError):
+            pass
+        # tokenize recovers from some errors, e.g. unbalanced brackets, with
+        # a state depending on where it started, split the rest by lines
+        self.fallback_row = first[0] if first is not None else \
+            (self.last[-1] + 1 if self.last else row)
+        yield from self.split_lines(self.fallback_row)
+
+    def split_lines(self, row):
+        # one logical line per non blank row, joined by trailing backslashes
+        buffer = self.buffer
+        lastrow = buffer.lastrow
+        while row <= lastrow:
+            line = buffer.text[buffer.starts[row]:buffer.row_end(row)]
+            stripped = line.lstrip()
+            if not stripped or stripped.startswith("#"):
+                row += 1
+                continue
+            first = row
+            indent = len(line) - len(stripped)
+            while line.endswith("\\") and row < lastrow:
+                row += 1
+                line = buffer.text[buffer.starts[row]:buffer.row_end(row)]
+            word = "@" if stripped.startswith("@") else re.match(r"\w*", stripped).group()
+            yield first, row, indent, word
+            row += 1
+
+    def add(self, first, last, level, word):
+        if word == "@":
+            kind = self.DECORATOR
+        elif word in self.CLAUSES:
+            kind = self.CLAUSE
+        elif word in self.COMPOUND:
+            kind = self.COMPOUND_STATEMENT
+        else:
+            kind = self.SIMPLE
+        self.first.append(first)
+        self.last.append(last)
+        self.level.append(level)
+        self.kind.append(kind)
+
+    def parse(self, row):
+        # read logical lines until the statements containing row are complete
+        lines = self.lines
+        while lines is not None and (not self.first or self.first[-1] <= row or
+                                     not self.top_level(len(self.first) - 1)):
+            try:
+                self.add(*next(lines))
+            except StopIteration:
+                self.lines = lines = None
+        n = len(self.first)
+        self.find_ends(len(self.end), n if lines is None else n - 1)
+
+    def find_ends(self, lo, hi):
+        # the statement ends of the logical lines lo to hi - 1, the line hi,
+        # if any, is top level
+        first, last, level, kind = self.first, self.last, self.level, self.kind
+        n = len(first)
+        end = array.array("l", last[lo:hi])
+        stack = [hi] if hi < n else []
+        for i in range(hi - 1, lo - 1, -1):
+            # the next logical line not indented deeper than i
+            while stack and level[stack[-1]] > level[i]:
+                stack.pop()
+            j = stack[-1] if stack else n
+            if j > i + 1:
+                end[i - lo] = last[j - 1]
+            if kind[i] == self.DECORATOR and i + 1 < hi and level[i + 1] == level[i]:
+                end[i - lo] = end[i + 1 - lo]
+            elif kind[i] in (self.COMPOUND_STATEMENT, self.CLAUSE) and j < hi and \
+                    level[j] == level[i] and kind[j] == self.CLAUSE:
+                end[i - lo] = end[j - lo]
+            stack.append(i)
+        self.end.extend(end)
+
+    def statement_rows(self, row):
+        # the first and last rows of the statement at row, None for blank and
+        # comment rows
+        self.parse(row)
+        i = bisect.bisect_right(self.first, row) - 1
+        if i < 0 or self.last[i] < row:
+            return None
+        return self.first[i], self.end[i]
+
+
+class JuliaBlockIndex(BufferIndex):
+    """
+    The blocks of a Julia buffer, `function`, `struct`, `begin`, `do`, ...
+    paired with their `end`. Strings, comments, symbols and the `end` of
+    indexing are skipped, as are the `for` and `if` of comprehensions.
+    The buffer is scanned lazily and again from the last row outside of any
+    block before a change.
+    """
+
+    TOKENS = re.compile(r"""
+        (?P<comment>\#=|\#[^\n]*)
+        |(?P<string>\"\"\"|"|`)
+        |(?P<char>(?<![\w)\]}'.])'(?:\\[^'\n]*|[^'\\\n])')
+        |(?P<open>[(\[{])
+        |(?P<close>[)\]}])
+        |(?P<keyword>(?<![\w.])(?:
+            (?:abstract|primitive)\s+type|function|macro|module|baremodule|struct|
+            if|for|while|try|let|begin|quote|do|end)\b)
+        """, re.X)
+    STRING_ENDS = {
+        '"""': re.compile(r'(?:\\.|[^\\])*?"""', re.S),
+        '"': re.compile(r'(?:\\.|[^"\\])*"', re.S),
+        '`': re.compile(r'(?:\\.|[^`\\])*`', re.S)
+    }
+    NESTED_COMMENT = re.compile(r"#=|=#")
+
+    def build(self, view):
+        # row of an opening keyword -> last row of the blocks opened there,
+        # row of an `end` -> first row of the blocks it closes
+        self.last_rows = {}
+        self.first_rows = {}
+        # (first row, last row) of the blocks in order of their `end`
+        self.pairs = []
+        # rows starting outside any block or bracket and the number of pairs
+        # before them
+        self.checkpoints = array.array("l", [0])
+        self.checkpoint_pairs = array.array("l", [0])
+        self.dirty_row = 0
+        self.refresh(view)
+
+    def patch(self, a, b, text):
+        row = self.buffer.row(a)
+        if self.dirty_row is None or row < self.dirty_row:
+            self.dirty_row = row
+
+    def refresh(self, view):
+        if self.dirty_row is None:
+            return
+        self.buffer = BufferSnapshot.of(view)
+        # scan again from the last checkpoint before the change
+        i = bisect.bisect_right(self.checkpoints, self.dirty_row) - 1
+        n = self.checkpoint_pairs[i]
+        for a, b in self.pairs[n:]:
+            self.last_rows.pop(a, None)
+            self.first_rows.pop(b, None)
+        del self.pairs[n:]
+        del self.checkpoints[i + 1:]
+        del self.checkpoint_pairs[i + 1:]
+        self.scanner = self.scan(self.checkpoints[i])
+        self.dirty_row = None
+
+    def scan(self, row):
+        # find the blocks from row on, yield at every checkpoint
+        buffer = self.buffer
+        text = buffer.text
+        stack = []
+        pos = buffer.starts[row]
+        while True:
+            m = self.TOKENS.search(text, pos)
+            if m is None:
+                break
+            if not stack and m.start() > buffer.row_end(self.checkpoints[-1]):
+                row = buffer.row(m.start())
+                if buffer.starts[row] >= pos:
+                    self.checkpoints.append(row)
+                    self.checkpoint_pairs.append(len(self.pairs))
+                    yield
+            kind = m.lastgroup
+            pos = m.end()
+            if kind == "comment":
+                if m.group() == "#=":
+                    pos = self.skip_comment(text, pos)
+            elif kind == "string":
+                end = self.STRING_ENDS[m.group()].match(text, pos)
+                pos = end.end() if end else len(text)
+            elif kind == "open":
+                stack.append(None)
+            elif kind == "close":
+                # drop the blocks left open inside the brackets
+                while stack and stack.pop() is not None:
+                    pass
+            elif kind == "keyword":
+                word = m.group()
+                begin = m.start()
+                if begin > 0 and text[begin - 1] == ":" and \
+                        (begin < 2 or not re.match(r"[\w)\]]", text[begin - 2])):
+                    # a symbol, e.g. :end
+                    continue
+                in_brackets = bool(stack) and stack[-1] is None
+                if word == "end":
+                    if stack and not in_brackets:
+                        self.add(buffer.row(stack.pop()), buffer.row(begin))
+                elif not (in_brackets and word in ("for", "if")):
+                    stack.append(begin)
+
+    def add(self, a, b):
+        self.pairs.append((a, b))
+        self.last_rows[a] = max(self.last_rows.get(a, b), b)
+        self.first_rows[b] = min(self.first_rows.get(b, a), a)
+
+    def scan_to(self, row):
+        # scan until the blocks opened before row are closed
+        while self.scanner is not None and self.checkpoints[-1] <= row:
+            try:
+                next(self.scanner)
+            except StopIteration:
+                self.scanner = None
+
+    def skip_comment(self, text, pos):
+        depth = 1
+        for m in self.NESTED_COMMENT.finditer(text, pos):
+            depth += 1 if m.group() == "#=" else -1
+            if depth == 0:
+                return m.end()
+        return len(text)
+
+    def block_end(self, row):
+        # the last row of the blocks opened at row
+        self.scan_to(row)
+        return self.last_rows.get(row)
+
+    def block_begin(self, row):
+        # the first row of the blocks closed at row
+        self.scan_to(row)
+        return self.first_rows.get(row)
@@ -0,0 +1,67 @@
+import sublime
+import json
+import os
+import time
+
+
+def fixture_dir(settings):
+    directory = settings.get("slow_expansion_dir")
+    if directory:
+        return os.path.expanduser(directory)
+    return os.path.join(sublime.cache_path(), "SendCode", "slow_expansions")
+
+
+def timed_expand(getter, s):
+    """
+    `getter.expand_cursor(s)`, writing a replayable fixture when it takes
+    longer than the setting "slow_expansion_ms".
+    """
+    budget = getter.settings.get("slow_expansion_ms")
+    if not budget:
+        return getter.expand_cursor(s)
+
+    profiler = None
+    if getter.settings.get("slow_expansion_profile"):
+        import cProfile
+        profiler = cProfile.Profile()
+    start = time.perf_counter()
+    if profiler:
+        region = profiler.runcall(getter.expand_cursor, s)
+    else:
+        region = getter.expand_cursor(s)
+    elapsed = (time.perf_counter() - start) * 1000
+    if elapsed > budget:
+        try:
+            path = write_fixture(getter, s, region, elapsed, profiler)
+            print("SendCode: expansion took {:.0f}ms, saved {}".format(elapsed, path))
+        except OSError as e:
+            print("SendCode: cannot save slow expansion: {}".format(e))
+    return region
+
+
+def write_fixture(getter, s, region, elapsed, profiler=None):
+    view = getter.view
+    syntax = getter.settings.syntax()
+    directory = fixture_dir(getter.settings)
+    os.makedirs(directory, exist_ok=True)
+    name = "{}-{:03d}-{}".format(
+        time.strftime("%Y%m%d-%H%M%S"), int(time.time() * 1000) % 1000, syntax)
+    fixture = {
+        "syntax": syntax,
+        "getter": type(getter).__name__,
+        "file_name": view.file_name(),
+        "cell": getter.cell,
+        "setup": getter.setup,
+        "settings": dict(getter.settings.resolved()),
+        "cursors": [[r.a, r.b] for r in view.sel()],
+        "cursor": [s.a, s.b],
+        "region": [region.a, region.b],
+        "elapsed_ms": elapsed,
+        "text": getter.buffer.text
+    }
+    path = os.path.join(directory, name + ".json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(fixture, f)
+    if profiler:
+        profiler.dump_stats(os.path.join(directory, name + ".prof"))
+    return path
@@ -0,0 +1,97 @@
+import sublime
+import bisect
+import collections
+import hashlib
+
+from ..settings import Settings
+from .chunks import ChunkIndex
+from .index import BufferSnapshot, CellIndex
+
+CELL = '# %%'
+KEY = "sendcode_stale"
+
+# buffer id -> hashes of the cells sent since the program was chosen
+_sent = {}
+# buffer id -> number of the last scheduled update of the marks
+_scheduled = {}
+
+# begin: the point the cell is marked at, text: the code which is hashed
+Cell = collections.namedtuple("Cell", "begin end text")
+
+
+def only_comments(text):
+    return all(not line.strip() or line.lstrip().startswith("#") for line in text.split("\n"))
+
+
+def digest(text):
+    return hashlib.sha1(text.encode("utf-8")).digest()
+
+
+def cells(view):
+    # the R chunks of R Markdown, the `# %%` cells otherwise
+    if Settings(view).syntax() == "rmd":
+        table = ChunkIndex.of(view)
+        return [Cell(c.header, c.end, table.code(c)) for c in table.chunks]
+    buffer = BufferSnapshot.of(view)
+    return [Cell(r.begin(), r.end(), buffer.substr(r)) for r in CellIndex.of(view, CELL).cells()]
+
+
+def cell_at(table, pt):
+    i = bisect.bisect_right([c.begin for c in table], pt) - 1
+    if i >= 0 and pt <= table[i].end:
+        return table[i]
+    return None
+
+
+def record(view, regions):
+    # the cells at the beginnings of regions were sent
+    table = cells(view)
+    sent = _sent.setdefault(view.buffer_id(), set())
+    for region in regions:
+        cell = cell_at(table, region.begin())
+        if cell is not None:
+            sent.add(digest(cell.text))
+    update_marks(view)
+
+
+def stale_cells(view):
+    # the cells changed or never sent, in document order
+    sent = _sent.get(view.buffer_id(), ())
+    return [c for c in cells(view) if not only_comments(c.text) and digest(c.text) not in sent]
+
+
+def update_marks(view):
+    if view.buffer_id() not in _sent or not Settings(view).get("mark_stale_cells", False):
+        view.erase_regions(KEY)
+        return
+    regions = [sublime.Region(c.begin, c.begin) for c in stale_cells(view)]
+    view.add_regions(KEY, regions, "region.orangish", "dot", sublime.HIDDEN)
+
+
+def schedule_marks(view, delay=300):
+    # update the marks once the typing pauses
+    buffer_id = view.buffer_id()
+    if buffer_id not in _sent:
+        return
+    n = _scheduled[buffer_id] = _scheduled.get(buffer_id, 0) + 1
+
+    def update():
+        if _scheduled.get(buffer_id) == n:
+            del _scheduled[buffer_id]
+            if view.is_valid():
+                update_marks(view)
+
+    sublime.set_timeout(update, delay)
+
+
+def discard(buffer_id):
+    _sent.pop(buffer_id, None)
+    _scheduled.pop(buffer_id, None)
+
+
+def reset():
+    # forget every sent cell, e.g. when another program is chosen
+    _sent.clear()
+    for window in sublime.windows():
+        for view in window.views():
+            view.erase_regions(KEY)
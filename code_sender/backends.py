@@ -0,0 +1,49 @@
+import sublime
+import importlib
+
+
+# name -> (module, attribute, platforms), the module is imported on first use;
+# platforms is None when the backend works everywhere
+BACKENDS = {
+    "terminus": (".terminus", "send_to_terminus", None),
+    "tmux": (".tmux", "send_to_tmux", None),
+    "linux-terminal": (".linux", "send_to_linux_terminal", ("linux",)),
+    "jupyter": (".jupyter", "send_to_jupyter", None),
+    "bridge": (".bridge", "send_to_bridge", ("linux", "osx")),
+    "clipboard": (".clipboard", "clipboard", None),
+    "xdotool": (".xdotool", "xdotool", ("linux",)),
+    "applescript": (".applescript", "osascript", ("osx",)),
+    "winauto": (".winauto", None, ("windows",)),
+}
+
+_loaded = {}
+
+
+def register(name, module, attribute=None, platforms=None):
+    BACKENDS[name] = (module, attribute, platforms)
+    _loaded.pop(name, None)
+
+
+def available(name):
+    if name not in BACKENDS:
+        return False
+    platforms = BACKENDS[name][2]
+    return platforms is None or sublime.platform() in platforms
+
+
+def backend(name):
+    """
+    The function, or module, of the backend `name`, imported on first use.
+    """
+    try:
+        return _loaded[name]
+    except KeyError:
+        pass
+    if not available(name):
+        raise RuntimeError("SendCode: {} is not available on {}".format(name, sublime.platform()))
+    module, attribute, _ = BACKENDS[name]
+    obj = importlib.import_module(module, __package__)
+    if attribute:
+        obj = getattr(obj, attribute)
+    _loaded[name] = obj
+    return obj
@@ -0,0 +1,145 @@
+import sublime
+import collections
+import os
+import socket
+import struct
+import tempfile
+import threading
+import time
+
+
+class BridgeError(Exception):
+    pass
+
+
+def default_address(syntax):
+    # the addresses the helpers in support/bridge listen on by default
+    if syntax in ("r", "rmd", "rnw"):
+        return "fifo:" + os.path.join(os.environ.get("TMPDIR", "/tmp"), "sendcode-r")
+    return "unix:" + os.path.join(tempfile.gettempdir(), "sendcode-{}.sock".format(syntax))
+
+
+class Bridge:
+    """
+    A persistent connection to a REPL bridge, "unix:<path>" or "fifo:<path>".
+    Code is sent as length prefixed frames without waiting for the previous
+    ones; a reader thread collects the acknowledgements and their timings.
+    """
+
+    bridges = {}
+    lock = threading.Lock()
+
+    @classmethod
+    def get(cls, address):
+        with cls.lock:
+            bridge = cls.bridges.get(address)
+            if bridge is None:
+                bridge = cls.bridges[address] = cls(address)
+            return bridge
+
+    def __init__(self, address):
+        self.address = address
+        self.writer = None
+        self.mutex = threading.Lock()
+        # sending times of the frames not acknowledged yet
+        self.pending = collections.deque()
+        self.sent = 0
+        self.acked = 0
+        self.errors = 0
+        self.last_elapsed = None
+
+    def connect(self):
+        transport, _, path = self.address.partition(":")
+        try:
+            if transport == "unix":
+                sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                sock.connect(path)
+                writer = sock.makefile("wb")
+                reader = sock.makefile("rb")
+                sock.close()
+            elif transport == "fifo":
+                import fcntl
+                # fails with ENXIO if the bridge is not waiting for us
+                fd = os.open(path + ".in", os.O_WRONLY | os.O_NONBLOCK)
+                fcntl.fcntl(fd, fcntl.F_SETFL, fcntl.fcntl(fd, fcntl.F_GETFL) & ~os.O_NONBLOCK)
+                writer = os.fdopen(fd, "wb")
+                reader = open(path + ".out", "rb")
+            else:
+                raise BridgeError("unknown bridge address {}".format(self.address))
+        except OSError as e:
+            raise BridgeError("no bridge listening on {}: {}".format(self.address, e))
+
+        with self.mutex:
+            self.writer = writer
+            self.pending.clear()
+            self.acked = self.sent
+        thread = threading.Thread(
+            target=self.read, args=(reader, writer), name="SendCode bridge")
+        thread.daemon = True
+        thread.start()
+
+    def close(self, writer=None):
+        with self.mutex:
+            if writer is None or writer is self.writer:
+                writer, self.writer = self.writer, None
+        if writer is not None:
+            try:
+                writer.close()
+            except OSError:
+                pass
+
+    def send(self, code):
+        data = code.encode("utf-8")
+        frame = struct.pack(">I", len(data)) + data
+        for attempt in range(2):
+            if self.writer is None:
+                self.connect()
+            try:
+                with self.mutex:
+                    self.writer.write(frame)
+                    self.writer.flush()
+                    self.pending.append(time.time())
+                    self.sent += 1
+                    return self.sent
+            except (OSError, ValueError, AttributeError):
+                # the bridge was restarted, connect again
+                self.close()
+                if attempt:
+                    raise BridgeError("bridge {} went away".format(self.address))
+
+    def read(self, reader, writer):
+        def read_exactly(n):
+            data = reader.read(n)
+            if len(data) < n:
+                raise EOFError
+            return data
+
+        try:
+            while True:
+                n = struct.unpack(">I", read_exactly(4))[0]
+                ack = read_exactly(n).decode("utf-8", "replace").split("\t", 2)
+                self.acknowledge(ack)
+        except (OSError, EOFError, ValueError):
+            pass
+        finally:
+            reader.close()
+            self.close(writer)
+
+    def acknowledge(self, ack):
+        with self.mutex:
+            if self.pending:
+                self.pending.popleft()
+            self.acked += 1
+            self.last_elapsed = float(ack[1]) if len(ack) > 1 else None
+            if ack[0] != "ok":
+                self.errors += 1
+            depth = len(self.pending)
+        if ack[0] != "ok":
+            sublime.status_message("SendCode: {}".format(ack[2] if len(ack) > 2 else "error"))
+        elif self.last_elapsed is not None:
+            sublime.status_message("SendCode: evaluated in {:.3f}s{}".format(
+                self.last_elapsed, ", {} pending".format(depth) if depth else ""))
+
+
+def send_to_bridge(cmd, address):
+    return Bridge.get(address).send(cmd)
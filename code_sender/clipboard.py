@@ -1,29 +1,64 @@
 import sublime
 import threading
+import time
 
 plat = sublime.platform()
 
 
 class Clipboard:
-    thread = None
+    """
+    Saves the clipboard of the user on the first `set_clipboard` of a burst
+    of sends and restores it once, `delay` seconds after the last
+    `reset_clipboard`. A single scheduler thread does the restoring.
+    """
 
-    def set_clipboard(self, cmd):
-        if not self.thread:
-            self.cb = sublime.get_clipboard()
-        else:
-            self.thread.cancel()
-            self.thread = None
+    delay = 0.5
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.thread = None
+        self.cb = None
+        self.saved = False
+        # restore the clipboard at this time, None while a paste is pending
+        self.deadline = None
 
-        sublime.set_clipboard(cmd)
+    def set_clipboard(self, cmd):
+        with self.condition:
+            if not self.saved:
+                self.cb = sublime.get_clipboard()
+                self.saved = True
+            self.deadline = None
+            sublime.set_clipboard(cmd)
 
     def reset_clipboard(self):
-        def _reset_clipboard():
-            if self.cb is not None:
-                sublime.set_clipboard(self.cb)
-            self.cb = None
-            self.thread = None
-        self.thread = threading.Timer(0.5, _reset_clipboard)
-        self.thread.start()
+        with self.condition:
+            if not self.saved:
+                return
+            self.deadline = time.time() + self.delay
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.worker, name="SendCode clipboard")
+                self.thread.daemon = True
+                self.thread.start()
+            self.condition.notify()
+
+    def worker(self):
+        with self.condition:
+            while True:
+                if not self.saved:
+                    self.thread = None
+                    return
+                if self.deadline is None:
+                    self.condition.wait()
+                    continue
+                now = time.time()
+                if now < self.deadline:
+                    self.condition.wait(self.deadline - now)
+                    continue
+                if self.cb is not None:
+                    sublime.set_clipboard(self.cb)
+                self.cb = None
+                self.saved = False
+                self.deadline = None
 
 if 'clipboard' not in globals():
     clipboard = Clipboard()
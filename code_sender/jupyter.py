@@ -0,0 +1,241 @@
+import sublime
+import datetime
+import glob
+import hashlib
+import hmac
+import json
+import os
+import re
+import threading
+import time
+import uuid
+
+from .zmtp import ZMTPSocket, ZMTPError
+
+
+DELIMITER = b"<IDS|MSG>"
+ANSI = re.compile(r"\x1b\[[0-9;]*[A-Za-z]")
+PANEL = "sendcode_jupyter"
+
+
+class KernelError(Exception):
+    pass
+
+
+def runtime_dir():
+    if os.environ.get("JUPYTER_RUNTIME_DIR"):
+        return os.environ["JUPYTER_RUNTIME_DIR"]
+    plat = sublime.platform()
+    if plat == "osx":
+        return os.path.expanduser("~/Library/Jupyter/runtime")
+    elif plat == "windows":
+        return os.path.join(os.environ.get("APPDATA", ""), "jupyter", "runtime")
+    else:
+        data = os.environ.get("XDG_DATA_HOME") or os.path.expanduser("~/.local/share")
+        return os.path.join(data, "jupyter", "runtime")
+
+
+def find_connection_file(name=None):
+    # name is a path, a file name or a glob in the runtime dir; the most recent
+    # kernel is used by default
+    if name and os.path.isfile(os.path.expanduser(name)):
+        return os.path.expanduser(name)
+    pattern = name or "kernel-*.json"
+    if not os.path.isabs(pattern):
+        pattern = os.path.join(runtime_dir(), pattern)
+    files = glob.glob(pattern)
+    if not files:
+        raise KernelError("no Jupyter kernel found at {}".format(pattern))
+    return max(files, key=os.path.getmtime)
+
+
+class KernelClient:
+    """
+    Persistent shell (DEALER) and iopub (SUB) connections to a Jupyter kernel.
+    Outputs of the executed code are appended to an output panel.
+    """
+
+    clients = {}
+    lock = threading.Lock()
+
+    @classmethod
+    def get(cls, connection_file):
+        mtime = os.path.getmtime(connection_file)
+        with cls.lock:
+            client = cls.clients.get(connection_file)
+            if client is None or not client.alive or client.mtime != mtime:
+                if client is not None:
+                    client.close()
+                client = cls(connection_file)
+                client.mtime = mtime
+                client.connect()
+                cls.clients[connection_file] = client
+            return client
+
+    def __init__(self, connection_file):
+        self.connection_file = connection_file
+        with open(connection_file, encoding="utf-8") as f:
+            info = json.load(f)
+        self.info = info
+        self.key = info.get("key", "").encode("ascii")
+        scheme = info.get("signature_scheme", "hmac-sha256")
+        self.digestmod = getattr(hashlib, scheme.split("-", 1)[1])
+        self.session = uuid.uuid4().hex
+        self.shell = ZMTPSocket("DEALER", self.address(info["shell_port"]))
+        self.iopub = ZMTPSocket("SUB", self.address(info["iopub_port"]))
+        self.alive = False
+        self.window = None
+        # msg_id -> [time of sending, replies awaited], the execute_reply on
+        # the shell and the idle status on iopub arrive in either order
+        self.pending = {}
+        self.pending_lock = threading.Lock()
+
+    def address(self, port):
+        if self.info.get("transport", "tcp") == "ipc":
+            return ("ipc", "{}-{}".format(self.info["ip"], port))
+        return ("tcp", self.info["ip"], port)
+
+    def connect(self):
+        try:
+            self.iopub.connect()
+            self.iopub.subscribe()
+            self.shell.connect()
+        except (OSError, ZMTPError) as e:
+            self.close()
+            raise KernelError("cannot connect to kernel {}: {}".format(
+                os.path.basename(self.connection_file), e))
+        self.alive = True
+        for sock in (self.shell, self.iopub):
+            thread = threading.Thread(target=self.reader, args=(sock,), name="SendCode jupyter")
+            thread.daemon = True
+            thread.start()
+
+    def close(self):
+        self.alive = False
+        self.shell.close()
+        self.iopub.close()
+
+    def sign(self, parts):
+        if not self.key:
+            return b""
+        h = hmac.new(self.key, digestmod=self.digestmod)
+        for p in parts:
+            h.update(p)
+        return h.hexdigest().encode("ascii")
+
+    def execute(self, code, window=None):
+        msg_id = uuid.uuid4().hex
+        header = {
+            "msg_id": msg_id,
+            "msg_type": "execute_request",
+            "username": "sendcode",
+            "session": self.session,
+            "date": datetime.datetime.utcnow().isoformat() + "Z",
+            "version": "5.3"
+        }
+        content = {
+            "code": code,
+            "silent": False,
+            "store_history": True,
+            "user_expressions": {},
+            "allow_stdin": False,
+            "stop_on_error": True
+        }
+        parts = [json.dumps(p).encode("utf-8") for p in (header, {}, {}, content)]
+        self.window = window or sublime.active_window()
+        with self.pending_lock:
+            self.pending[msg_id] = [time.time(), {"execute_reply", "status"}]
+        try:
+            self.shell.send_multipart([DELIMITER, self.sign(parts)] + parts)
+        except (OSError, ZMTPError) as e:
+            with self.pending_lock:
+                self.pending.pop(msg_id, None)
+            self.close()
+            raise KernelError("kernel connection lost: {}".format(e))
+
+    def reader(self, sock):
+        try:
+            while self.alive:
+                msg = self.deserialize(sock.recv_multipart())
+                if msg:
+                    self.handle(msg)
+        except (OSError, ZMTPError):
+            if self.alive:
+                self.alive = False
+                self.output("[kernel connection lost]\n")
+
+    def deserialize(self, frames):
+        try:
+            i = frames.index(DELIMITER)
+        except ValueError:
+            return None
+        signature = frames[i + 1]
+        parts = frames[i + 2:i + 6]
+        if len(parts) < 4 or not hmac.compare_digest(signature, self.sign(parts)):
+            return None
+        header, parent, metadata, content = [json.loads(p.decode("utf-8")) for p in parts]
+        return {"header": header, "parent_header": parent, "content": content}
+
+    def handle(self, msg):
+        msg_type = msg["header"].get("msg_type")
+        parent_id = msg["parent_header"].get("msg_id")
+        with self.pending_lock:
+            request = self.pending.get(parent_id)
+        if request is None:
+            return
+        content = msg["content"]
+        if msg_type == "execute_input":
+            lines = content.get("code", "").split("\n")
+            if len(lines) > 10:
+                lines = lines[:9] + ["# {} more lines".format(len(lines) - 9)]
+            prompt = "In [{}]: ".format(content.get("execution_count", " "))
+            indent = "\n" + " " * (len(prompt) - 5) + "...: "
+            self.output("\n" + prompt + indent.join(lines) + "\n")
+        elif msg_type == "stream":
+            self.output(content.get("text", ""))
+        elif msg_type in ("execute_result", "display_data"):
+            data = content.get("data", {})
+            text = data.get("text/plain") or "<{}>".format(", ".join(sorted(data)))
+            if msg_type == "execute_result":
+                text = "Out[{}]: {}".format(content.get("execution_count", " "), text)
+            self.output(text + "\n")
+        elif msg_type == "error":
+            traceback = content.get("traceback") or [
+                "{}: {}".format(content.get("ename"), content.get("evalue"))]
+            self.output(ANSI.sub("", "\n".join(traceback)) + "\n")
+        elif msg_type == "execute_reply":
+            if content.get("status") == "aborted":
+                self.output("[aborted]\n")
+            self.replied(parent_id, msg_type)
+        elif msg_type == "status" and content.get("execution_state") == "idle":
+            self.output("({:.3f}s)\n".format(time.time() - request[0]))
+            self.replied(parent_id, msg_type)
+
+    def replied(self, msg_id, msg_type):
+        # forget the request once both its reply and its idle status arrived
+        with self.pending_lock:
+            request = self.pending.get(msg_id)
+            if request is not None:
+                request[1].discard(msg_type)
+                if not request[1]:
+                    del self.pending[msg_id]
+
+    def output(self, text):
+        window = self.window
+        if window is None or not text:
+            return
+
+        def append():
+            panel = window.find_output_panel(PANEL)
+            if panel is None:
+                panel = window.create_output_panel(PANEL)
+                panel.settings().set("word_wrap", False)
+            panel.run_command("append", {"characters": text, "force": True, "scroll_to_end": True})
+            if window.active_panel() != "output." + PANEL:
+                window.run_command("show_panel", {"panel": "output." + PANEL})
+
+        sublime.set_timeout(append, 0)
+
+
+def send_to_jupyter(cmd, connection_file=None):
+    KernelClient.get(find_connection_file(connection_file)).execute(cmd)
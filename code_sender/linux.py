@@ -0,0 +1,42 @@
+import subprocess
+from .xdotool import xdotool, xdotool_script
+
+
+# linux_terminal -> window id
+window_ids = {}
+
+
+def find_window(linux_terminal):
+    wid = window_ids.get(linux_terminal)
+    if wid is None:
+        try:
+            wid = xdotool("search", "--onlyvisible", "--class", linux_terminal)
+        except subprocess.CalledProcessError:
+            wid = None
+        if not wid:
+            raise Exception("{} not found.".format(linux_terminal))
+        wid = window_ids[linux_terminal] = wid.decode("utf-8").strip().split("\n")[-1]
+    return wid
+
+
+def send_to_linux_terminal(linux_terminal, cmd):
+    if isinstance(cmd, str):
+        cmd = [cmd]
+
+    for attempt in range(2):
+        wid = find_window(linux_terminal)
+        # remember the active window, type the lines into the terminal and
+        # bring the active window back
+        commands = ["getactivewindow", "windowactivate --sync {}".format(wid)]
+        for i, c in enumerate(cmd):
+            if c:
+                commands.append("type --delay 0 --clearmodifiers -- ${}".format(i + 1))
+            commands.append("key --clearmodifiers Return")
+        commands.append("windowactivate %1")
+        try:
+            return xdotool_script(commands, cmd)
+        except subprocess.CalledProcessError:
+            # the terminal window may have been closed, search it again
+            window_ids.pop(linux_terminal, None)
+            if attempt:
+                raise
@@ -0,0 +1,81 @@
+import re
+
+
+# the comments and the literals of each language, the text of a literal is
+# never changed
+TOKENS = {
+    "python": re.compile(r"""
+        (?P<comment>\#[^\n]*)
+        |(?P<literal>
+            \"\"\"(?:\\[\s\S]|[^\\])*?(?:\"\"\"|\Z)
+            |'''(?:\\[\s\S]|[^\\])*?(?:'''|\Z)
+            |"(?:\\[\s\S]|[^"\\\n])*"?
+            |'(?:\\[\s\S]|[^'\\\n])*'?)
+    """, re.VERBOSE),
+    "r": re.compile(r"""
+        (?P<comment>\#[^\n]*)
+        |(?P<literal>
+            "(?:\\[\s\S]|[^"\\])*"?
+            |'(?:\\[\s\S]|[^'\\])*'?
+            |`(?:\\[\s\S]|[^`\\])*`?)
+    """, re.VERBOSE),
+    "julia": re.compile(r"""
+        (?P<literal>
+            \#=[\s\S]*?(?:=\#|\Z)
+            |\"\"\"(?:\\[\s\S]|[^\\])*?(?:\"\"\"|\Z)
+            |"(?:\\[\s\S]|[^"\\])*"?
+            |`(?:\\[\s\S]|[^`\\])*`?
+            |(?<![\w)\]}'.])'(?:\\[^'\n]*|[^'\\\n])')
+        |(?P<comment>\#[^\n]*)
+    """, re.VERBOSE)
+}
+TOKENS["rmd"] = TOKENS["rnw"] = TOKENS["r"]
+
+
+def minify(cmd, syntax):
+    # drop the full line comments, strip the trailing whitespace and collapse
+    # the runs of blank lines of cmd, leaving the literals and the indentation
+    # alone
+    tokens = TOKENS.get(syntax)
+    if tokens is None:
+        return cmd
+    comments = set()
+    # begin and end of the literals spanning several lines
+    literals = []
+    for m in tokens.finditer(cmd):
+        if m.lastgroup == "comment":
+            comments.add(m.start())
+        elif "\n" in m.group():
+            literals.append((m.start(), m.end()))
+
+    lines = []
+    blank = False
+    pos = 0
+    i = 0
+    for line in cmd.split("\n"):
+        begin, end = pos, pos + len(line)
+        pos = end + 1
+        while i < len(literals) and literals[i][1] <= begin:
+            i += 1
+        starts_inside = i < len(literals) and literals[i][0] < begin
+        j = i + 1 if starts_inside and literals[i][1] <= end else i
+        if j < len(literals) and literals[j][0] < end:
+            # the line ends in a literal
+            lines.append(line)
+            blank = False
+            continue
+        if starts_inside:
+            lines.append(line.rstrip())
+            blank = False
+            continue
+        content = line.lstrip()
+        if begin + len(line) - len(content) in comments:
+            continue
+        if not content:
+            blank = True
+            continue
+        if blank and lines:
+            lines.append("")
+        blank = False
+        lines.append(line.rstrip())
+    return "\n".join(lines)
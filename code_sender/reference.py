@@ -0,0 +1,65 @@
+import collections
+import os
+import tempfile
+import threading
+import time
+
+
+def quote(path, dollar=False):
+    # a double quoted string literal of R, Python or Julia
+    path = path.replace("\\", "\\\\").replace('"', '\\"')
+    if dollar:
+        path = path.replace("$", "\\$")
+    return '"' + path + '"'
+
+
+class ReferenceFiles:
+    """
+    Temp files, in tmpfs when available, that large payloads are written to so
+    that only a short line sourcing them is sent. Every payload gets a file of
+    its own since the REPL may read it long after it was queued. The files are
+    removed once older than `ttl` seconds and by `cleanup`.
+    """
+
+    ttl = 3600
+    lock = threading.Lock()
+    # path -> time of writing, oldest first
+    paths = collections.OrderedDict()
+
+    @classmethod
+    def directory(cls):
+        if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK):
+            return "/dev/shm"
+        return tempfile.gettempdir()
+
+    @classmethod
+    def write(cls, code, ext, row=None):
+        # pad with empty lines so that line numbers match the buffer
+        if row:
+            code = "\n" * row + code
+        fd, path = tempfile.mkstemp(prefix="sendcode-", suffix=ext, dir=cls.directory())
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(code)
+        now = time.time()
+        with cls.lock:
+            cls.paths[path] = now
+            cls.expire(now - cls.ttl)
+        return path.replace("\\", "/")
+
+    @classmethod
+    def expire(cls, before):
+        # remove the files written before `before`, with the lock held
+        while cls.paths:
+            path, written = next(iter(cls.paths.items()))
+            if written >= before:
+                break
+            del cls.paths[path]
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    @classmethod
+    def cleanup(cls):
+        with cls.lock:
+            cls.expire(float("inf"))
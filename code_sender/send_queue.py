@@ -0,0 +1,139 @@
+import sublime
+import collections
+import threading
+import time
+import traceback
+
+from ..utils.instrument import api_calls, start_counting, stop_counting
+
+
+class SendQueue:
+    """
+    A FIFO of payloads for one target, drained in order by its own worker
+    thread. A payload queued while the target is idle is sent at once; while
+    a send is in progress or payloads are waiting, those queued within
+    `window` seconds of the first waiting one are merged and sent as one
+    transmission, provided their senders allow it.
+    """
+
+    # target -> queue
+    queues = {}
+    lock = threading.Lock()
+    # the worker exits after idling for this many seconds
+    idle_timeout = 30
+
+    @classmethod
+    def of(cls, target):
+        with cls.lock:
+            queue = cls.queues.get(target)
+            if queue is None:
+                queue = cls.queues[target] = cls(target)
+            return queue
+
+    def __init__(self, target):
+        self.target = target
+        self.items = collections.deque()
+        self.condition = threading.Condition()
+        self.thread = None
+        self.busy = False
+        self.drain_started = None
+        # statistics
+        self.sent = 0
+        self.transmissions = 0
+        self.last_drain_time = 0.0
+
+    def put(self, sender, cmd, window=0.0, trace=None):
+        if trace is not None:
+            trace.queued = time.perf_counter()
+        with self.condition:
+            if not self.items and not self.busy:
+                window = 0.0
+            self.items.append((sender, cmd, time.time() + window, trace))
+            if self.drain_started is None:
+                self.drain_started = time.time()
+            if self.thread is None:
+                self.thread = threading.Thread(
+                    target=self.worker, name="SendCode {}".format(self.target))
+                self.thread.daemon = True
+                self.thread.start()
+            self.condition.notify()
+            depth = len(self.items) + self.busy
+        if depth > 1:
+            sublime.status_message("SendCode: {} sends queued".format(depth))
+
+    def depth(self):
+        with self.condition:
+            return len(self.items) + self.busy
+
+    def stats(self):
+        with self.condition:
+            return {
+                "target": self.target,
+                "depth": len(self.items) + self.busy,
+                "sent": self.sent,
+                "transmissions": self.transmissions,
+                "last_drain_time": self.last_drain_time
+            }
+
+    def next_batch(self):
+        with self.condition:
+            while not self.items:
+                if not self.condition.wait(self.idle_timeout) and not self.items:
+                    self.thread = None
+                    return None
+            # wait for the coalescing window of the first payload
+            while True:
+                deadline = self.items[0][2]
+                now = time.time()
+                if now >= deadline:
+                    break
+                self.condition.wait(deadline - now)
+
+            sender, cmd, _, trace = self.items.popleft()
+            batch = [(cmd, trace)]
+            if sender.can_coalesce() and sender.can_join(cmd):
+                while self.items and self.items[0][0].can_coalesce_with(sender) and \
+                        sender.can_join(self.items[0][1]):
+                    _, cmd, _, trace = self.items.popleft()
+                    batch.append((cmd, trace))
+            self.busy = True
+            return sender, batch
+
+    def worker(self):
+        while True:
+            batch = self.next_batch()
+            if batch is None:
+                return
+            sender, batch = batch
+            cmds = [cmd for cmd, _ in batch]
+            counting = any(trace is not None and trace.enabled for _, trace in batch)
+            if counting:
+                start_counting()
+            start = time.perf_counter()
+            calls = api_calls()
+            try:
+                sender.send_text("\n".join(cmds))
+            except Exception:
+                traceback.print_exc()
+            end = time.perf_counter()
+            sent_calls = api_calls() - calls
+            if counting:
+                stop_counting()
+            for cmd, trace in batch:
+                if trace is not None:
+                    trace.add("wait", start - trace.queued)
+                    trace.add("send", end - start, sent_calls)
+                    trace.finish(len(cmd))
+            with self.condition:
+                self.busy = False
+                self.sent += len(cmds)
+                self.transmissions += 1
+                if not self.items:
+                    self.last_drain_time = time.time() - self.drain_started
+                    self.drain_started = None
+
+
+def queue_stats():
+    with SendQueue.lock:
+        queues = list(SendQueue.queues.values())
+    return [queue.stats() for queue in queues]
@@ -1,22 +1,14 @@
 import sublime
+import ast
 import re
 import time
 
 from ..settings import Settings
-# from .terminal import send_to_terminal
-# from .iterm import send_to_iterm
-# from .r import send_to_r
-# from .rstudio import send_to_rstudio
-# from .conemu import send_to_conemu, send_to_cmder
-# from .linux import send_to_linux_terminal
-# from .tmux import send_to_tmux
-# from .screen import send_to_screen
-# from .chrome import send_to_chrome_jupyter, send_to_chrome_rstudio
-# from .safari import send_to_safari_jupyter, send_to_safari_rstudio
-# from .sublimerepl import send_to_sublimerepl
-# from .terminalview import send_to_terminalview
-from .terminus import send_to_terminus
-from .clipboard import clipboard
+from .backends import backend, available
+from .minify import minify
+from .send_queue import SendQueue
+from .reference import ReferenceFiles, quote
+
 
 class CodeSender:
 
@@ -50,17 +42,93 @@ class CodeSender:
     #     self.view.window().run_command("term_send_text",
     #         {"text": cmd, "end": "" if postfix else "\n"})
 
+    def terminus(self, cmd, bracketed=False, commit=True):
+        backend("terminus")(
+            cmd, bracketed=bracketed, commit=commit,
+            chunk_size=self.settings.get("terminus_chunk_size", 0),
+            chunk_delay=self.settings.get("terminus_chunk_delay", 0.01))
+
     def send_to_terminus(self, cmd):
-        send_to_terminus(cmd, bracketed=self.bracketed_paste_mode)
-        
+        self.terminus(cmd, bracketed=self.bracketed_paste_mode)
+
+    def tmux(self, cmd, bracketed=False, commit=True):
+        backend("tmux")(
+            cmd, self.settings.get("tmux", "tmux"), bracketed=bracketed, commit=commit,
+            socket=self.settings.get("tmux_socket"), target=self.settings.get("tmux_target"))
+
+    def send_to_tmux(self, cmd):
+        self.tmux(cmd, bracketed=self.bracketed_paste_mode)
+
+    def send_to_linux_terminal(self, cmd):
+        backend("linux-terminal")(self.settings.get("linux_terminal"), cmd)
+
+    def send_to_jupyter(self, cmd):
+        backend("jupyter")(cmd, self.settings.get("jupyter_connection_file"))
+
+    def send_to_bridge(self, cmd):
+        from .bridge import default_address
+        address = self.settings.get("bridge_address") or default_address(self.settings.syntax())
+        backend("bridge")(cmd, address)
+
     def send_text(self, cmd, prefix="", postfix=""):
         cmd = cmd.rstrip()
         cmd = cmd.expandtabs(self.view.settings().get("tab_size", 4))
-        self.send_to_terminus(cmd)
+        method = "send_to_" + (self.prog or "").replace("-", "_")
+        if not available(self.prog) or not hasattr(self, method):
+            method = "send_to_terminus"
+        getattr(self, method)(cmd)
+
+    def target(self):
+        window = self.view.window() or sublime.active_window()
+        return (window.id() if window else None, self.prog)
+
+    def queue_text(self, cmd, origin=None, trace=None):
+        # send_text in order on the worker thread of the target
+        threshold = self.settings.get("send_by_reference_threshold", 0)
+        reference = None
+        if threshold and self.from_view and len(cmd) > threshold:
+            # the temp file keeps the rows of the buffer, not minified since
+            # only the short line sourcing it is echoed
+            reference = self.reference(cmd, *(origin or (None, None)))
+        if reference:
+            cmd = reference
+        elif self.settings.get("minify" if self.from_view else "minify_commands", False):
+            cmd = self.minify(cmd, trace)
+        window = self.settings.get("send_coalesce_window", 0.05)
+        SendQueue.of(self.target()).put(self, cmd, window=window, trace=trace)
+
+    def minify(self, cmd, trace=None):
+        minified = minify(cmd, self.settings.syntax())
+        saved = len(cmd.encode("utf-8")) - len(minified.encode("utf-8"))
+        if trace is not None:
+            trace.saved = saved
+        if saved > 0:
+            sublime.status_message("SendCode: minified, {} bytes saved".format(saved))
+        return minified
+
+    def reference(self, cmd, file_name=None, row=None):
+        # a short line which runs cmd from a temp file, None if not supported
+        return None
+
+    def can_coalesce(self):
+        # whether sending several payloads joined by newlines is the same as
+        # sending them one by one
+        return True
+
+    def can_coalesce_with(self, sender):
+        return type(self) is type(sender) and \
+            self.bracketed_paste_mode == sender.bracketed_paste_mode
+
+    def can_join(self, cmd):
+        # whether cmd may be joined with the payloads around it
+        return True
 
 
 class RCodeSender(CodeSender):
-    pass
+
+    def reference(self, cmd, file_name=None, row=None):
+        path = ReferenceFiles.write(cmd, ".R", row)
+        return "source({}, echo = TRUE, max.deparse.length = Inf)".format(quote(path))
 
 #     def send_text(self, cmd):
 #         cmd = cmd.rstrip()
@@ -87,6 +155,38 @@ class RCodeSender(CodeSender):
 
 class PythonCodeSender(CodeSender):
 
+    def reference(self, cmd, file_name=None, row=None):
+        if re.search(r"^\s*[%!]", cmd, re.MULTILINE):
+            # IPython magics and shell escapes
+            return None
+        try:
+            body = ast.parse(cmd).body
+        except SyntaxError:
+            # pasted, the REPL reports the error
+            return None
+        run = 'exec(compile(open({}, encoding="utf-8").read(), {}, "{}"))'
+        if not body or not isinstance(body[-1], ast.Expr):
+            path = ReferenceFiles.write(cmd, ".py", row)
+            return run.format(quote(path), quote(file_name or path), "exec")
+        # the REPL displays the value of a trailing expression, run its line
+        # in "single" mode like the REPL does
+        lines = cmd.split("\n")
+        n = body[-1].lineno - 1
+        path = ReferenceFiles.write("\n".join(lines[n:]), ".py", (row or 0) + n)
+        last = run.format(quote(path), quote(file_name or path), "single")
+        if n == 0:
+            return last
+        path = ReferenceFiles.write("\n".join(lines[:n]), ".py", row)
+        return run.format(quote(path), quote(file_name or path), "exec") + "; " + last
+
+    def can_coalesce(self):
+        # without bracketed paste, multiline code is wrapped in %cpaste
+        return self.bracketed_paste_mode and sublime.platform() != "windows"
+
+    def can_join(self, cmd):
+        # a cell magic applies to the whole input
+        return not cmd.startswith("%%")
+
     # def send_to_terminal(self, cmd):
     #     if len(re.findall("\n", cmd)) > 0:
     #         if self.bracketed_paste_mode:
@@ -151,31 +251,29 @@ class PythonCodeSender(CodeSender):
     #     else:
     #         send_to_cmder(cmd, conemuc)
 
-    # def send_to_linux_terminal(self, cmd):
-    #     linux_terminal = self.settings.get("linux_terminal")
+    def send_to_linux_terminal(self, cmd):
+        linux_terminal = self.settings.get("linux_terminal")
 
-    #     if len(re.findall("\n", cmd)) > 0:
-    #         if self.bracketed_paste_mode:
-    #             send_to_linux_terminal(linux_terminal, [cmd, ""])
-    #         else:
-    #             send_to_linux_terminal(linux_terminal, [r"%cpaste -q", cmd, "--"])
-    #     else:
-    #         send_to_linux_terminal(linux_terminal, cmd)
+        if len(re.findall("\n", cmd)) > 0:
+            if self.bracketed_paste_mode:
+                backend("linux-terminal")(linux_terminal, [cmd, ""])
+            else:
+                backend("linux-terminal")(linux_terminal, [r"%cpaste -q", cmd, "--"])
+        else:
+            backend("linux-terminal")(linux_terminal, cmd)
 
-    # def send_to_tmux(self, cmd):
-    #     tmux = self.settings.get("tmux", "tmux")
-    #     if len(re.findall("\n", cmd)) > 0:
-    #         if self.bracketed_paste_mode:
-    #             send_to_tmux(cmd, tmux, bracketed=True, commit=False)
-    #             time.sleep(0.01)
-    #             send_to_tmux("\x1B", tmux, bracketed=False)
-    #         else:
-    #             send_to_tmux(r"%cpaste -q", tmux)
-    #             send_to_tmux(cmd, tmux)
-    #             # send ctrl-D instead of "--" since `set-buffer` does not work properly
-    #             send_to_tmux("\x04", tmux)
-    #     else:
-    #         send_to_tmux(cmd, tmux)
+    def send_to_tmux(self, cmd):
+        if len(re.findall("\n", cmd)) > 0:
+            if self.bracketed_paste_mode:
+                self.tmux(cmd, bracketed=True, commit=False)
+                self.tmux("\x1b")
+            else:
+                self.tmux(r"%cpaste -q")
+                self.tmux(cmd)
+                # send ctrl-D instead of "--" since `set-buffer` does not work properly
+                self.tmux("\x04")
+        else:
+            self.tmux(cmd)
 
     # def send_to_screen(self, cmd):
     #     screen = self.settings.get("screen", "screen")
@@ -235,27 +333,32 @@ class PythonCodeSender(CodeSender):
 
     def send_to_terminus(self, cmd):
         if sublime.platform() == "windows": # and self.paste_to_console:
-            clipboard.set_clipboard(cmd)
+            backend("clipboard").set_clipboard(cmd)
             # send ctrl+v
-            send_to_terminus("\x16", bracketed=False, commit=False)
+            self.terminus("\x16", bracketed=False, commit=False)
             time.sleep(0.05)
-            send_to_terminus("\x1b", bracketed=False, commit=False)
+            self.terminus("\x1b", bracketed=False, commit=False)
             time.sleep(0.05)
-            send_to_terminus("\r", bracketed=False, commit=False)
-            clipboard.reset_clipboard()
+            self.terminus("\r", bracketed=False, commit=False)
+            backend("clipboard").reset_clipboard()
         else:
             if len(re.findall("\n", cmd)) > 0:
                 if self.bracketed_paste_mode:
-                    send_to_terminus(cmd, bracketed=True, commit=False)
-                    send_to_terminus("\x1b", bracketed=False)
+                    self.terminus(cmd, bracketed=True, commit=False)
+                    self.terminus("\x1b", bracketed=False)
                 else:
-                    send_to_terminus(r"%cpaste -q")
-                    send_to_terminus(cmd)
-                    send_to_terminus("--")
+                    self.terminus(r"%cpaste -q")
+                    self.terminus(cmd)
+                    self.terminus("--")
             else:
-                send_to_terminus(cmd, bracketed=False)
+                self.terminus(cmd, bracketed=False)
 
 
 class JuliaCodeSender(CodeSender):
 
-    pass
+    def reference(self, cmd, file_name=None, row=None):
+        if re.match(r"[\]\;?$]", cmd):
+            # REPL modes
+            return None
+        path = ReferenceFiles.write(cmd, ".jl", row)
+        return "include({})".format(quote(path, dollar=True))
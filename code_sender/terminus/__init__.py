@@ -1,8 +1,15 @@
 import sublime
+import time
 
+from ...utils.progress_bar import ProgressBar
 
-def send_to_terminus(cmd, bracketed=False, commit=True):
+
+def send_to_terminus(cmd, bracketed=False, commit=True, chunk_size=0, chunk_delay=0):
     window = sublime.active_window()
+    if chunk_size and len(cmd) > chunk_size:
+        stream_to_terminus(window, cmd, bracketed, commit, chunk_size, chunk_delay)
+        return
+
     if bracketed:
         cmd = "\x1b[200~" + cmd + "\x1b[201~"
 
@@ -10,3 +17,51 @@ def send_to_terminus(cmd, bracketed=False, commit=True):
         cmd = cmd + "\r"
 
     window.run_command("terminus_send_string", args={"string": cmd})
+
+
+def split_chunks(cmd, chunk_size):
+    # split cmd into chunks of at most chunk_size characters, preferably
+    # after a newline
+    i = 0
+    while i < len(cmd):
+        j = i + chunk_size
+        if j < len(cmd):
+            k = cmd.rfind("\n", i, j)
+            if k > i:
+                j = k + 1
+        yield cmd[i:j]
+        i = j
+
+
+def stream_to_terminus(window, cmd, bracketed, commit, chunk_size, chunk_delay):
+    """
+    Send a large payload in chunks, pausing `chunk_delay` seconds between
+    them so that the REPL keeps up. The chunks form a single bracketed paste.
+    """
+    total = len(cmd)
+    sent = 0
+    progress = ProgressBar("SendCode")
+    progress.start()
+    start = time.time()
+    try:
+        if bracketed:
+            window.run_command("terminus_send_string", args={"string": "\x1b[200~"})
+        for chunk in split_chunks(cmd, chunk_size):
+            if sent:
+                time.sleep(chunk_delay)
+            window.run_command("terminus_send_string", args={"string": chunk})
+            sent += len(chunk)
+            rate = sent / max(time.time() - start, 1e-3)
+            progress.set_progress(
+                sent / total,
+                "SendCode {:.0f}% of {:.1f} KB, {:.0f} KB/s".format(
+                    100 * sent / total, total / 1024, rate / 1024))
+        end = ""
+        if bracketed:
+            end += "\x1b[201~"
+        if commit:
+            end += "\r"
+        if end:
+            window.run_command("terminus_send_string", args={"string": end})
+    finally:
+        progress.stop()
@@ -0,0 +1,198 @@
+import subprocess
+import threading
+import queue
+
+
+class TmuxError(Exception):
+    pass
+
+
+def escape(cmd):
+    # quote cmd as a double quoted argument of a tmux command
+    result = []
+    for c in cmd:
+        if c in '\\"$':
+            result.append("\\" + c)
+        elif c == "\n":
+            result.append("\\n")
+        elif c == "\r":
+            result.append("\\r")
+        elif c == "\t":
+            result.append("\\t")
+        elif c == "\x1b":
+            result.append("\\e")
+        elif c < " " or c == "\x7f":
+            result.append("\\u{:04x}".format(ord(c)))
+        else:
+            result.append(c)
+    return '"' + "".join(result) + '"'
+
+
+class TmuxControl:
+    """
+    A long-lived `tmux -C` control mode client. Commands are written to its
+    stdin; their replies, framed by %begin and %end/%error, are collected by a
+    reader thread. The client reconnects when the server goes away.
+    """
+
+    clients = {}
+    lock = threading.Lock()
+    chunk_size = 16384
+    timeout = 5
+
+    @classmethod
+    def get(cls, tmux="tmux", socket=None, target=None):
+        key = (tmux, socket, target)
+        with cls.lock:
+            client = cls.clients.get(key)
+            if client is None:
+                client = cls.clients[key] = cls(tmux, socket, target)
+            return client
+
+    def __init__(self, tmux="tmux", socket=None, target=None):
+        self.tmux = tmux
+        self.socket = socket
+        self.target = target
+        self.process = None
+        self.pane = None
+        self.replies = queue.Queue()
+        self.command_lock = threading.Lock()
+
+    def args(self):
+        args = [self.tmux]
+        if self.socket:
+            args += ["-L", self.socket]
+        args += ["-C", "attach-session"]
+        if self.target:
+            args += ["-t", self.target.split(":")[0]]
+        return args
+
+    def connected(self):
+        return self.process is not None and self.process.poll() is None
+
+    def connect(self):
+        self.close()
+        try:
+            self.process = subprocess.Popen(
+                self.args(), stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT)
+        except OSError as e:
+            raise TmuxError("cannot run {}: {}".format(self.tmux, e))
+        self.replies = queue.Queue()
+        reader = threading.Thread(
+            target=self.read, args=(self.process, self.replies), name="SendCode tmux")
+        reader.daemon = True
+        reader.start()
+        # the reply to attach-session
+        ok, lines = self.reply()
+        if not ok:
+            self.close()
+            raise TmuxError("\n".join(lines))
+        # do not stream the output of the panes to us (tmux 3.2+)
+        self.write("refresh-client -f no-output")
+        self.reply()
+        self.pane = None
+
+    def close(self):
+        if self.process is not None:
+            try:
+                self.process.stdin.close()
+            except Exception:
+                pass
+            try:
+                self.process.terminate()
+            except Exception:
+                pass
+        self.process = None
+
+    @staticmethod
+    def read(process, replies):
+        block = None
+        for line in process.stdout:
+            line = line.decode("utf-8", "replace").rstrip("\n")
+            if block is None:
+                if line.startswith("%begin "):
+                    block = []
+                elif line.startswith("%exit"):
+                    replies.put((False, [line[6:] or "tmux exited"]))
+                elif not line.startswith("%"):
+                    # e.g. "no sessions" before control mode starts
+                    replies.put((False, [line]))
+                # other lines are notifications
+            elif line.startswith("%end ") or line.startswith("%error "):
+                replies.put((line.startswith("%end "), block))
+                block = None
+            else:
+                block.append(line)
+        replies.put((False, ["tmux exited"]))
+
+    def write(self, command):
+        try:
+            self.process.stdin.write(command.encode("utf-8") + b"\n")
+            self.process.stdin.flush()
+        except (OSError, ValueError, AttributeError) as e:
+            raise TmuxError("tmux is not connected: {}".format(e))
+
+    def reply(self):
+        try:
+            return self.replies.get(timeout=self.timeout)
+        except queue.Empty:
+            raise TmuxError("tmux did not reply")
+
+    def run(self, *commands):
+        # run commands on one round trip, reconnecting once if the server is gone
+        with self.command_lock:
+            for attempt in range(2):
+                if not self.connected():
+                    self.connect()
+                try:
+                    self.write("\n".join(commands))
+                    replies = []
+                    for _ in commands:
+                        replies.append(self.reply())
+                        if not replies[-1][0] and not self.connected():
+                            break
+                except TmuxError:
+                    if attempt:
+                        raise
+                    self.close()
+                    continue
+                errors = [lines for ok, lines in replies if not ok]
+                if not errors:
+                    return [lines for ok, lines in replies]
+                if attempt or self.connected():
+                    raise TmuxError("\n".join(errors[0]))
+                self.pane = None
+
+    def resolve_pane(self):
+        if self.pane is None:
+            command = 'display-message -p "#{pane_id}"'
+            if self.target:
+                command = 'display-message -p -t {} "#{{pane_id}}"'.format(escape(self.target))
+            self.pane = self.run(command)[0][0].strip()
+        return self.pane
+
+    def send(self, cmd, bracketed=False, commit=True):
+        for attempt in range(2):
+            pane = self.resolve_pane()
+            commands = []
+            for i in range(0, len(cmd), self.chunk_size):
+                commands.append("set-buffer {}-b sendcode {}".format(
+                    "-a " if i else "", escape(cmd[i:i + self.chunk_size])))
+            if commands:
+                commands.append("paste-buffer -d {}-b sendcode -t {}".format(
+                    "-p " if bracketed else "", pane))
+            if commit:
+                commands.append("send-keys -t {} Enter".format(pane))
+            try:
+                self.run(*commands)
+                return
+            except TmuxError:
+                # the pane may have been closed, resolve it again
+                if attempt:
+                    raise
+                self.pane = None
+
+
+def send_to_tmux(cmd, tmux="tmux", bracketed=False, commit=True, socket=None, target=None):
+    TmuxControl.get(tmux, socket, target).send(cmd, bracketed=bracketed, commit=commit)
@@ -5,9 +5,14 @@ import shutil
 
 
 prompt_installing_xdotool = False
+xdotool_path = None
 
 
-def xdotool(*args):
+def find_xdotool():
+    global xdotool_path
+    if xdotool_path and os.path.isfile(xdotool_path):
+        return xdotool_path
+
     xdotool_path = shutil.which("xdotool")
     if not xdotool_path:
         xdotool_install_path = os.path.join(sublime.packages_path(), "User", "SendCode", "xdotool")
@@ -23,4 +28,25 @@ def xdotool(*args):
     if not xdotool_path:
         raise FileNotFoundError("xdotool cannot be found")
 
-    return subprocess.check_output([xdotool_path] + list(args))
+    return xdotool_path
+
+
+def xdotool(*args):
+    return subprocess.check_output([find_xdotool()] + list(args))
+
+
+def xdotool_script(commands, args=()):
+    """
+    Run `commands`, a list of lines such as "key Return", with a single
+    `xdotool -` process reading them from stdin. xdotool splits the lines on
+    whitespace, so text containing spaces is passed in `args` and referred to
+    as $1, $2, ...
+    """
+    script = "\n".join(commands) + "\n"
+    process = subprocess.Popen(
+        [find_xdotool(), "-"] + list(args),
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    out, err = process.communicate(script.encode("utf-8"))
+    if process.returncode:
+        raise subprocess.CalledProcessError(process.returncode, "xdotool -", err)
+    return out
@@ -0,0 +1,123 @@
+import socket
+import struct
+import threading
+
+
+class ZMTPError(Exception):
+    pass
+
+
+MORE = 0x01
+LONG = 0x02
+COMMAND = 0x04
+
+
+def command_body(name, properties):
+    body = bytes([len(name)]) + name
+    for key, value in properties:
+        body += bytes([len(key)]) + key + struct.pack(">I", len(value)) + value
+    return body
+
+
+class ZMTPSocket:
+    """
+    A minimal ZMTP 3.0 peer with the NULL security mechanism, enough to talk
+    to the ROUTER and PUB sockets of a Jupyter kernel as a DEALER or a SUB.
+    `address` is ("tcp", host, port) or ("ipc", path).
+    """
+
+    def __init__(self, socket_type, address, timeout=5):
+        self.socket_type = socket_type
+        self.address = address
+        self.timeout = timeout
+        self.sock = None
+        self.send_lock = threading.Lock()
+
+    def connect(self):
+        transport = self.address[0]
+        try:
+            if transport == "tcp":
+                self.sock = socket.create_connection(self.address[1:], self.timeout)
+                self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            elif transport == "ipc":
+                self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                self.sock.settimeout(self.timeout)
+                self.sock.connect(self.address[1])
+            else:
+                raise ZMTPError("unsupported transport {}".format(transport))
+
+            greeting = b"\xff" + b"\x00" * 8 + b"\x7f" + b"\x03\x00" + \
+                b"NULL".ljust(20, b"\x00") + b"\x00" + b"\x00" * 31
+            self.sock.sendall(greeting)
+            peer = self.recv_exactly(64)
+            if peer[0] != 0xff or peer[9] & 0x01 != 0x01 or peer[10] < 3:
+                raise ZMTPError("peer does not speak ZMTP 3")
+            if peer[12:32].rstrip(b"\x00") != b"NULL":
+                raise ZMTPError("peer requires a security mechanism")
+
+            self.send_frame(command_body(b"READY", [
+                (b"Socket-Type", self.socket_type.encode("ascii")),
+                (b"Identity", b"")]), command=True)
+            flags, body = self.recv_frame()
+            if not flags & COMMAND or not body[1:].startswith(b"READY"):
+                raise ZMTPError("unexpected handshake {!r}".format(body[:32]))
+            self.sock.settimeout(None)
+        except (OSError, ZMTPError):
+            self.close()
+            raise
+
+    def close(self):
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+        self.sock = None
+
+    def recv_exactly(self, n):
+        data = b""
+        while len(data) < n:
+            chunk = self.sock.recv(n - len(data))
+            if not chunk:
+                raise ZMTPError("connection closed")
+            data += chunk
+        return data
+
+    def recv_frame(self):
+        flags = self.recv_exactly(1)[0]
+        if flags & LONG:
+            size = struct.unpack(">Q", self.recv_exactly(8))[0]
+        else:
+            size = self.recv_exactly(1)[0]
+        return flags, self.recv_exactly(size)
+
+    def frame(self, body, more=False, command=False):
+        flags = (MORE if more else 0) | (COMMAND if command else 0)
+        if len(body) > 255:
+            return bytes([flags | LONG]) + struct.pack(">Q", len(body)) + body
+        return bytes([flags, len(body)]) + body
+
+    def send_frame(self, body, more=False, command=False):
+        self.sock.sendall(self.frame(body, more, command))
+
+    def send_multipart(self, frames):
+        data = b"".join(
+            self.frame(f, more=i < len(frames) - 1) for i, f in enumerate(frames))
+        with self.send_lock:
+            if self.sock is None:
+                raise ZMTPError("not connected")
+            self.sock.sendall(data)
+
+    def recv_multipart(self):
+        frames = []
+        while True:
+            flags, body = self.recv_frame()
+            if flags & COMMAND:
+                continue
+            frames.append(body)
+            if not flags & MORE:
+                return frames
+
+    def subscribe(self, topic=b""):
+        # ZMTP 3.0 subscriptions are messages starting with \x01
+        self.send_multipart([b"\x01" + topic])
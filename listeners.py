@@ -0,0 +1,37 @@
+import sublime
+import sublime_plugin
+
+from .code_getter.index import patch_buffer, has_indexes, discard_buffer
+from .code_getter import stale
+
+
+class SendCodeTextChangeListener(sublime_plugin.TextChangeListener):
+
+    @classmethod
+    def is_applicable(cls, buffer):
+        return True
+
+    def on_text_changed(self, changes):
+        buffer_id = self.buffer.id()
+        if not has_indexes(buffer_id):
+            return
+        view = self.buffer.primary_view()
+        patch_buffer(buffer_id, changes, view.change_count())
+
+
+class SendCodeIndexEventListener(sublime_plugin.EventListener):
+
+    def on_close(self, view):
+        buffer_id = view.buffer_id()
+        for window in sublime.windows():
+            for v in window.views():
+                if v.buffer_id() == buffer_id:
+                    return
+        discard_buffer(buffer_id)
+        stale.discard(buffer_id)
+
+
+class SendCodeStaleCellsListener(sublime_plugin.EventListener):
+
+    def on_modified(self, view):
+        stale.schedule_marks(view)
@@ -4,8 +4,18 @@ import os
 import re
 
 from .code_getter import CodeGetter
+from .code_getter.chunks import ChunkIndex, fig_call
+from .code_getter.definitions import record_sourced, source_changes, was_sourced
+from .code_getter.stale import record, stale_cells
 from .code_sender import CodeSender
+from .code_sender.reference import ReferenceFiles
 from .settings import Settings
+from .utils.instrument import Trace, restore_api
+
+
+def plugin_unloaded():
+    ReferenceFiles.cleanup()
+    restore_api()
 
 
 def escape_dquote(cmd):
@@ -31,20 +41,6 @@ PATTERN = re.compile(r"""
     )
 """, re.VERBOSE)
 
-def maybe_match(regex, string, default):
-    match = re.search(regex, string)
-    if match is not None:
-        return match.group(1)
-    else:
-        return default
-
-def parse_chunk_header(cmd):
-    return (
-        maybe_match(r'```{r (\S+)[,}]', cmd, 'tmp'),
-        maybe_match(r'fig\.width *= *([^,}]+)', cmd, 4.5),
-        maybe_match(r'fig\.height *= *([^,}]+)', cmd, 3),
-    )
-
 class SendCodeCommand(sublime_plugin.TextCommand):
 
     def resolve(self, cmd):
@@ -86,10 +82,14 @@ class SendCodeCommand(sublime_plugin.TextCommand):
     def run(self, edit, advance=None, cell=False, cmd=None, prog=None, confirmation=None,
             prefix="", postfix="", setup=False):
         print('SendCode.run', prefix, postfix)
-        is_rcall = self.view.score_selector(self.view.sel()[0].begin(), "rcall.julia")
-        
-        if advance is None:
-            advance = Settings(self.view).get("auto_advance", True)
+        trace = Trace()
+        with trace.stage("settings"):
+            is_rcall = self.view.score_selector(self.view.sel()[0].begin(), "rcall.julia")
+            settings = Settings(self.view)
+            trace.configure(settings, prog)
+
+            if advance is None:
+                advance = settings.get("auto_advance", True)
 
         # set CodeGetter before get_text() because get_text may change cursor locations.
 
@@ -100,40 +100,14 @@ class SendCodeCommand(sublime_plugin.TextCommand):
 
         sender = CodeSender.initialize(self.view, prog=prog, from_view=cmd is None)
 
-        sender.bracketed_paste_mode = Settings(self.view).syntax() != 'sql'  # Fred hack
+        sender.bracketed_paste_mode = settings.syntax() != 'sql'  # Fred hack
+        getter = None
         if cmd:
-            cmd = self.resolve(cmd)
+            with trace.stage("resolve"):
+                cmd = self.resolve(cmd)
         else:
-            if Settings(self.view).syntax() == 'rmd':
-                cell_cmd = CodeGetter.initialize(self.view, advance=False, cell=True, setup=setup).get_text()
-                if cell or setup:
-                    cmd = cell_cmd
-                else:
-                    cmd = CodeGetter.initialize(self.view, advance=False, cell=False).get_text()
-
-                if cell_cmd.startswith('```{r'):
-                    should_plot = '#noplot' not in cmd and (
-                        (re.search(r'```{r,.*fig\.width', cmd) is not None) or 
-                        (('plot' in cmd) and (re.search(r'^\s*fig\(', cmd, re.MULTILINE) is None))
-                    )
-                    if should_plot:
-                        # save the figure using praams pulled from cell header
-                        title, w, h = parse_chunk_header(cell_cmd)
-                        cmd += 'fig("{}", {}, {})'.format(title, w, h)
-
-                    if cmd.startswith('```{r'):  # remove header
-                        cmd = cmd[re.search('}\n', cmd).end():]
-
-                if advance:
-                    if cell or setup:
-                        self.view.window().run_command("jump_cell")
-                    else:
-                        CodeGetter.initialize(self.view, advance=True, cell=False).get_text()
-
-
-            else:
-                getter = CodeGetter.initialize(self.view, advance=advance, cell=cell, setup=setup)
-                cmd = getter.get_text()
+            with trace.stage("get_text"):
+                cmd, getter = self.get_text(settings, advance, cell, setup)
 
         cmd = cmd.strip()
 
@@ -150,7 +124,151 @@ class SendCodeCommand(sublime_plugin.TextCommand):
         # if prefix in ['?', ';']:
         #     sender.bracketed_paste_mode = False
 
-        sublime.set_timeout_async(lambda: sender.send_text(cmd))
+        sender.queue_text(cmd, origin=getter.origin(cmd) if getter else None, trace=trace)
+        if getter and (cell or setup):
+            record(self.view, getter.regions)
+
+    def get_text(self, settings, advance, cell, setup):
+        getter = None
+        if settings.syntax() == 'rmd':
+            chunks = ChunkIndex.of(self.view)
+            # the setup chunk is sent without its header and plots
+            chunk = None if setup else chunks.chunk_at(self.view.sel()[0].begin())
+
+            if cell or setup:
+                getter = CodeGetter.initialize(self.view, advance=False, cell=True, setup=setup)
+            else:
+                getter = CodeGetter.initialize(self.view, advance=advance, cell=False)
+            cmd = getter.get_text()
+
+            if chunk:
+                cmd += fig_call(chunk, cmd)
+                if cmd.startswith('```{r'):  # remove header
+                    cmd = cmd[re.search('}\n', cmd).end():]
+
+            if advance and (cell or setup):
+                self.view.window().run_command("jump_cell")
+
+        else:
+            getter = CodeGetter.initialize(self.view, advance=advance, cell=cell, setup=setup)
+            cmd = getter.get_text()
+
+        return cmd, getter
+
+
+class SendCodeRunChunksCommand(sublime_plugin.TextCommand):
+    """
+    Run the R Markdown chunks "above" or "below" the cursor, "all" of them or
+    those with a "label", in a single transmission.
+    """
+
+    def is_enabled(self, **kwargs):
+        return Settings(self.view).syntax() == 'rmd'
+
+    def run(self, edit, chunks="all", label=None, prog=None):
+        view = self.view
+        table = ChunkIndex.of(view)
+        if chunks == "label" and label is None:
+            labels = sorted({c.label for c in table.chunks})
+
+            def on_done(i):
+                if i >= 0:
+                    view.run_command(
+                        "send_code_run_chunks", {"chunks": "label", "label": labels[i], "prog": prog})
+
+            view.window().show_quick_panel(labels, on_done)
+            return
+
+        trace = Trace()
+        with trace.stage("settings"):
+            settings = Settings(view)
+            trace.configure(settings, prog)
+        with trace.stage("get_text"):
+            selected = table.select(chunks, view.sel()[0].begin(), label)
+            cmd = "".join(table.code(c) for c in selected).strip()
+        if not cmd:
+            sublime.status_message("SendCode: no chunks to run")
+            return
+
+        sender = CodeSender.initialize(view, prog=prog)
+        sender.bracketed_paste_mode = True
+        row = view.rowcol(selected[0].begin)[0] if len(selected) == 1 else None
+        sender.queue_text(cmd, origin=(view.file_name(), row), trace=trace)
+        record(view, [sublime.Region(c.header, c.header) for c in selected])
+        sublime.status_message("SendCode: running {} chunk{}".format(
+            len(selected), "s" if len(selected) > 1 else ""))
+
+
+class SendCodeRunCellsCommand(sublime_plugin.TextCommand):
+    """
+    Run the `# %%` cells "above" or "below" the cursor or "all" of them in a
+    single transmission.
+    """
+
+    def is_enabled(self, **kwargs):
+        return Settings(self.view).syntax() not in ('r', 'rmd', 'md')
+
+    def run(self, edit, cells="all", prog=None):
+        view = self.view
+        trace = Trace()
+        with trace.stage("settings"):
+            settings = Settings(view)
+            trace.configure(settings, prog)
+        with trace.stage("get_text"):
+            getter = CodeGetter.initialize(view, advance=False, cell=True)
+            payloads = getter.get_cells(cells)
+        if not payloads:
+            sublime.status_message("SendCode: no cells to run")
+            return
+
+        sender = CodeSender.initialize(view, prog=prog)
+        sender.bracketed_paste_mode = settings.syntax() != 'sql'
+        for cmd in payloads:
+            sender.queue_text(cmd, origin=getter.origin(cmd), trace=trace)
+            trace = None
+        record(view, getter.regions)
+        n = len(getter.regions)
+        sublime.status_message("SendCode: running {} cell{}".format(n, "s" if n > 1 else ""))
+
+
+class SendCodeRunStaleCommand(sublime_plugin.TextCommand):
+    """
+    Run the `# %%` cells or R Markdown chunks changed or never sent since the
+    program was chosen, in document order.
+    """
+
+    def is_enabled(self, **kwargs):
+        return Settings(self.view).syntax() not in ('r', 'md')
+
+    def run(self, edit, prog=None):
+        view = self.view
+        trace = Trace()
+        with trace.stage("settings"):
+            settings = Settings(view)
+            trace.configure(settings, prog)
+        with trace.stage("get_text"):
+            cells = stale_cells(view)
+            regions = [sublime.Region(c.begin, c.end) for c in cells]
+            getter = None
+            if settings.syntax() == 'rmd':
+                cmd = "".join(c.text for c in cells).strip()
+                payloads = [cmd] if cmd else []
+            else:
+                getter = CodeGetter.initialize(view, advance=False, cell=True)
+                payloads = getter.cell_payloads(regions)
+        if not payloads:
+            sublime.status_message("SendCode: no stale cells")
+            return
+
+        sender = CodeSender.initialize(view, prog=prog)
+        sender.bracketed_paste_mode = settings.syntax() != 'sql'
+        for cmd in payloads:
+            origin = getter.origin(cmd) if getter else (view.file_name(), None)
+            sender.queue_text(cmd, origin=origin, trace=trace)
+            trace = None
+        record(view, regions)
+        sublime.status_message("SendCode: running {} stale cell{}".format(
+            len(cells), "s" if len(cells) > 1 else ""))
 
 
 # historial reason
@@ -159,10 +277,48 @@ class SendReplCommand(SendCodeCommand):
         super(SendReplCommand, self).run(*args, **kargs)
 
 
+class SendCodeSourceChangesCommand(sublime_plugin.TextCommand):
+    """
+    Send the top level statements added or changed since the file was last
+    sourced by a build.
+    """
+
+    def is_enabled(self, **kwargs):
+        return Settings(self.view).syntax() in ('r', 'python', 'julia')
+
+    def run(self, edit, prog=None):
+        view = self.view
+        trace = Trace()
+        with trace.stage("settings"):
+            settings = Settings(view)
+            trace.configure(settings, prog)
+        with trace.stage("get_text"):
+            payloads, n = source_changes(view)
+        if not payloads:
+            sublime.status_message("SendCode: no changes to source")
+            return
+
+        sender = CodeSender.initialize(view, prog=prog)
+        sender.bracketed_paste_mode = True
+        for cmd in payloads:
+            sender.queue_text(cmd, origin=(view.file_name(), None), trace=trace)
+            trace = None
+        sublime.status_message("SendCode: sourcing {} changed statement{}".format(
+            n, "s" if n > 1 else ""))
+
+
 class SendCodeBuildCommand(sublime_plugin.WindowCommand):
 
-    def run(self, cmd=None, prog=None):
-        self.window.active_view().run_command(
+    def run(self, cmd=None, prog=None, incremental=None):
+        # incremental is set by the source file builds, once the file is
+        # sourced in full, the incremental variants send the changes only
+        view = self.window.active_view()
+        if incremental and was_sourced(view):
+            view.run_command("send_code_source_changes", {"prog": prog})
+            return
+        view.run_command(
             "send_code",
             {"cmd": cmd, "prog": prog}
         )
+        if incremental is not None:
+            record_sourced(view)
@@ -1,4 +1,22 @@
 import sublime
+from types import MappingProxyType
+
+
+# line scope -> syntax
+_syntaxes = {}
+# syntax -> merged, read-only settings
+_resolved = {}
+
+
+def _invalidate():
+    _resolved.clear()
+
+
+def load_settings():
+    s = sublime.load_settings("SendCode.sublime-settings")
+    s.clear_on_change("SendCode")
+    s.add_on_change("SendCode", _invalidate)
+    return s
 
 
 class Settings:
@@ -12,41 +30,58 @@ class Settings:
         "source.julia": "julia"
     }
 
+    s = None
+
     def __init__(self, view):
-        self.s = sublime.load_settings("SendCode.sublime-settings")
+        if Settings.s is None:
+            Settings.s = load_settings()
         self.view = view
+        self._syntax = False
 
     def syntax(self):
         """
         SendCode.settings.Settings(view).syntax()
         """
+        if self._syntax is not False:
+            return self._syntax
         pt = self.view.sel()[0].begin() if len(self.view.sel()) > 0 else 0
         # to go beginning of the line
         pt = self.view.line(pt).begin()
-        scores = [self.view.score_selector(pt, s) for s, lang in self.scope_mapping.items()]
+        scope = self.view.scope_name(pt)
+        if scope not in _syntaxes:
+            _syntaxes[scope] = self.scope_syntax(scope)
+        self._syntax = _syntaxes[scope]
+        return self._syntax
+
+    def scope_syntax(self, scope):
+        scores = [sublime.score_selector(scope, s) for s, lang in self.scope_mapping.items()]
         max_score = max(scores)
-        if self.view.score_selector(pt, "text.html.markdown.rmarkdown") > 0:
+        if sublime.score_selector(scope, "text.html.markdown.rmarkdown") > 0:
             return 'rmd'
         if max_score > 0:
             return list(self.scope_mapping.values())[scores.index(max_score)]
         else:
             return None
 
-    def get(self, key, default=None):
+    def resolved(self):
+        """
+        The global settings overridden by the settings of the current syntax,
+        cached until the settings file changes.
+        """
         syntax = self.syntax()
+        settings = _resolved.get(syntax)
+        if settings is None:
+            s = self.s.to_dict()
+            # global settings
+            settings = {k: v for k, v in s.items() if v is not None}
+            #  syntax settings
+            if syntax:
+                settings.update(s.get(syntax, {}))
+            settings = _resolved[syntax] = MappingProxyType(settings)
+        return settings
 
-        #  check syntax settings
-        if syntax:
-            syntax_settings = self.s.get(syntax, {})
-            if key in syntax_settings:
-                return syntax_settings[key]
-
-        # check global settings
-        if self.s.has(key) and self.s.get(key) is not None:
-            return self.s.get(key)
-
-        # fallback
-        return default
+    def get(self, key, default=None):
+        return self.resolved().get(key, default)
 
     def set(self, key, value):
         syntax = self.syntax()
@@ -0,0 +1,19 @@
+import sublime_plugin
+
+from .code_sender.send_queue import queue_stats
+from .utils.instrument import report
+
+
+class SendCodeShowStatsCommand(sublime_plugin.WindowCommand):
+
+    def run(self):
+        text = report()
+        queues = queue_stats()
+        if queues:
+            text += "\nqueues\n"
+            for q in queues:
+                text += "{}: depth {}, {} sent in {} transmissions, last drain {:.3f}s\n".format(
+                    q["target"], q["depth"], q["sent"], q["transmissions"], q["last_drain_time"])
+        panel = self.window.create_output_panel("sendcode_stats")
+        panel.run_command("append", {"characters": text})
+        self.window.run_command("show_panel", {"panel": "output.sendcode_stats"})
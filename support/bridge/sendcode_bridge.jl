@@ -0,0 +1,62 @@
+# SendCode bridge for the Julia REPL, load it with
+#
+#     include("<Packages>/SendCode/support/bridge/sendcode_bridge.jl")
+#
+# It listens on a Unix domain socket and evaluates the code sent with prog
+# "bridge" in Main while the REPL stays usable. Each frame is a 4 byte big
+# endian length followed by UTF-8 code, and is acknowledged by a frame
+# "ok\t<elapsed>" or "error\t<elapsed>\t<message>".
+
+module SendCodeBridge
+
+using Sockets
+
+const ADDRESS = get(ENV, "SENDCODE_BRIDGE", joinpath(tempdir(), "sendcode-julia.sock"))
+
+function evaluate(code)
+    value = Base.invokelatest(include_string, Main, code, "sendcode")
+    if value !== nothing && !endswith(rstrip(code), ";")
+        Base.invokelatest(display, value)
+    end
+end
+
+function serve(conn)
+    while !eof(conn)
+        n = ntoh(read(conn, UInt32))
+        code = String(read(conn, n))
+        start = time()
+        ack = try
+            evaluate(code)
+            "ok\t$(time() - start)"
+        catch e
+            Base.invokelatest(showerror, stderr, e, catch_backtrace())
+            println(stderr)
+            "error\t$(time() - start)\t$(sprint(showerror, e))"
+        end
+        data = Vector{UInt8}(codeunits(ack))
+        write(conn, hton(UInt32(length(data))), data)
+        flush(conn)
+    end
+end
+
+function start(address = ADDRESS)
+    ispath(address) && rm(address)
+    server = listen(address)
+    chmod(address, 0o600)
+    @async while isopen(server)
+        conn = accept(server)
+        try
+            serve(conn)
+        catch e
+            e isa Base.IOError || rethrow()
+        finally
+            close(conn)
+        end
+    end
+    println("SendCode bridge listening on ", address)
+    server
+end
+
+end
+
+SendCodeBridge.start()
@@ -0,0 +1,154 @@
+"""
+SendCode bridge for the Python REPL, load it with
+
+    >>> import sys; sys.path.append("<Packages>/SendCode/support/bridge")
+    >>> import sendcode_bridge
+
+It listens on a Unix domain socket and runs the code sent with prog "bridge"
+in __main__, on the main thread while the REPL, or IPython, waits for input.
+Programs with a main loop of their own call `sendcode_bridge.run_pending()`
+from it. Each frame is a 4 byte big endian length followed by UTF-8 code, and
+is acknowledged by a frame "ok\t<elapsed>" or "error\t<elapsed>\t<message>".
+The helper must be imported, not run in __main__, so that the code sent
+cannot replace its globals.
+"""
+import __main__
+import ast
+import builtins
+import os
+import queue
+import socket
+import struct
+import sys
+import tempfile
+import threading
+import time
+import traceback
+
+
+ADDRESS = os.environ.get(
+    "SENDCODE_BRIDGE", os.path.join(tempfile.gettempdir(), "sendcode-python.sock"))
+
+
+def recv_exactly(conn, n):
+    data = b""
+    while len(data) < n:
+        chunk = conn.recv(n - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return data
+
+
+def evaluate(code):
+    # run code like the REPL does, printing the value of a trailing expression
+    tree = ast.parse(code, "<sendcode>", "exec")
+    last = None
+    if tree.body and isinstance(tree.body[-1], ast.Expr):
+        last = ast.Interactive(body=[tree.body.pop()])
+    exec(compile(tree, "<sendcode>", "exec"), __main__.__dict__)
+    if last is not None:
+        exec(compile(last, "<sendcode>", "single"), __main__.__dict__)
+
+
+# (code, queue of the acknowledgement) of the frames received, run on the
+# main thread
+frames = queue.Queue()
+
+
+def run(code):
+    try:
+        start = time.time()
+        evaluate(code.decode("utf-8"))
+        ack = "ok\t{:.6f}".format(time.time() - start)
+    except BaseException as e:
+        traceback.print_exc()
+        ack = "error\t{:.6f}\t{}: {}".format(time.time() - start, type(e).__name__, e)
+    sys.stdout.flush()
+    return ack.encode("utf-8")
+
+
+def run_pending():
+    # run the frames received so far, called on the main thread
+    while True:
+        try:
+            code, done = frames.get_nowait()
+        except queue.Empty:
+            return 0
+        done.put(run(code))
+
+
+def serve(conn):
+    while True:
+        header = recv_exactly(conn, 4)
+        if header is None:
+            return
+        code = recv_exactly(conn, struct.unpack(">I", header)[0])
+        if code is None:
+            return
+        done = queue.Queue(1)
+        frames.put((code, done))
+        ack = done.get()
+        conn.sendall(struct.pack(">I", len(ack)) + ack)
+
+
+def listen(server):
+    while True:
+        conn, _ = server.accept()
+        try:
+            serve(conn)
+        except OSError:
+            pass
+        finally:
+            conn.close()
+
+
+def ipython_hook(context):
+    while not context.input_is_ready():
+        run_pending()
+        time.sleep(0.05)
+
+
+def install_hook():
+    # run the frames while the REPL waits for input, readline and the REPL of
+    # Python 3.13 call PyOS_InputHook about ten times a second
+    global input_hook
+    shell = getattr(builtins, "get_ipython", lambda: None)()
+    if shell is not None:
+        from IPython.terminal.pt_inputhooks import register
+        register("sendcode", ipython_hook)
+        shell.enable_gui("sendcode")
+        return
+    import ctypes
+    pointer = ctypes.c_void_p.in_dll(ctypes.pythonapi, "PyOS_InputHook")
+    hook = ctypes.CFUNCTYPE(ctypes.c_int)
+    previous = hook(pointer.value) if pointer.value else None
+
+    def chained():
+        run_pending()
+        return previous() if previous else 0
+
+    input_hook = hook(chained)
+    pointer.value = ctypes.cast(input_hook, ctypes.c_void_p).value
+
+
+def start(address=ADDRESS):
+    if os.path.exists(address):
+        os.remove(address)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(address)
+    os.chmod(address, 0o600)
+    server.listen(1)
+    thread = threading.Thread(target=listen, args=(server,), name="sendcode bridge")
+    thread.daemon = True
+    thread.start()
+    install_hook()
+    print("SendCode bridge listening on " + address)
+    return server
+
+
+if __name__ == "__main__":
+    raise RuntimeError(
+        "import sendcode_bridge instead of running it in __main__, "
+        "the code sent would replace its globals")
+start()
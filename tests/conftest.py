@@ -0,0 +1,34 @@
+"""
+The tests run headless on the stand-in `sublime` modules of the benchmarks,
+from the package folder with `python -m pytest tests`.
+"""
+import importlib
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import benchmarks  # noqa: E402
+
+benchmarks.install()
+
+
+def package_module(name):
+    return importlib.import_module("SendCode." + name)
+
+
+@pytest.fixture
+def make_view():
+    # views whose edits are reported to the indexes, like in the plugin host
+    from benchmarks.view import View
+    index = package_module("code_getter.index")
+
+    def make(text, syntax, file_name=None):
+        view = View(text, syntax, file_name=file_name)
+        view.listener = lambda view, changes: \
+            index.patch_buffer(view.buffer_id(), changes, view.change_count())
+        return view
+
+    return make
@@ -0,0 +1,163 @@
+import os
+import socket
+import struct
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from conftest import package_module
+
+bridge = package_module("code_sender.bridge")
+
+HELPER = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "support", "bridge",
+    "sendcode_bridge.py")
+
+
+def recv_frame(conn):
+    header = conn.recv(4, socket.MSG_WAITALL)
+    if len(header) < 4:
+        return None
+    return conn.recv(struct.unpack(">I", header)[0], socket.MSG_WAITALL)
+
+
+def send_frame(conn, data):
+    conn.sendall(struct.pack(">I", len(data)) + data)
+
+
+class StubBridge:
+    # acknowledges every frame, as an error if it contains "stop"
+    def __init__(self, path):
+        self.frames = []
+        self.conn = None
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(path)
+        self.server.listen(1)
+        thread = threading.Thread(target=self.serve)
+        thread.daemon = True
+        thread.start()
+
+    def serve(self):
+        try:
+            conn = self.conn = self.server.accept()[0]
+        except OSError:
+            return
+        with conn:
+            while True:
+                code = recv_frame(conn)
+                if code is None:
+                    return
+                self.frames.append(code.decode())
+                send_frame(conn, b"error\t0.5\tstopped" if b"stop" in code else b"ok\t0.25")
+
+    def close(self):
+        # like a REPL exiting
+        try:
+            self.conn.shutdown(socket.SHUT_RDWR)
+        except (AttributeError, OSError):
+            pass
+        self.server.close()
+
+
+def wait_for(condition, timeout=3):
+    end = time.time() + timeout
+    while time.time() < end and not condition():
+        time.sleep(0.01)
+    return condition()
+
+
+@pytest.fixture
+def address(tmp_path):
+    return "unix:" + str(tmp_path / "bridge.sock")
+
+
+def test_frames_acknowledged(address):
+    stub = StubBridge(address[5:])
+    client = bridge.Bridge(address)
+    try:
+        assert client.send("x <- 1") == 1
+        assert client.send("stop()") == 2
+        assert wait_for(lambda: client.acked == 2)
+        assert stub.frames == ["x <- 1", "stop()"]
+        assert client.errors == 1
+        assert not client.pending
+    finally:
+        client.close()
+        stub.close()
+
+
+def test_reconnects_to_restarted_bridge(address):
+    stub = StubBridge(address[5:])
+    client = bridge.Bridge(address)
+    try:
+        client.send("a")
+        assert wait_for(lambda: client.acked == 1)
+        stub.close()
+        os.remove(address[5:])
+        stub = StubBridge(address[5:])
+        # the first write may still succeed on the old connection
+        for code in ("b", "c"):
+            try:
+                client.send(code)
+            except bridge.BridgeError:
+                pass
+        assert wait_for(lambda: stub.frames[-1:] == ["c"])
+    finally:
+        client.close()
+        stub.close()
+
+
+def test_no_bridge_listening(address):
+    with pytest.raises(bridge.BridgeError):
+        bridge.Bridge(address).send("x")
+
+
+def drain(fd):
+    # the output of the REPL
+    try:
+        while os.read(fd, 4096):
+            pass
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="needs a pty")
+def test_python_helper_runs_frames_on_main_thread(tmp_path):
+    import pty
+    path = str(tmp_path / "python.sock")
+    master, slave = pty.openpty()
+    process = subprocess.Popen(
+        [sys.executable, "-i", "-q", "-c",
+         "import sys; sys.path.append({!r}); import sendcode_bridge".format(
+             os.path.dirname(HELPER))],
+        stdin=slave, stdout=slave, stderr=slave,
+        env=dict(os.environ, SENDCODE_BRIDGE=path, PYTHONSTARTUP=""))
+    reader = threading.Thread(target=drain, args=(master,))
+    reader.daemon = True
+    reader.start()
+    try:
+        assert wait_for(lambda: os.path.exists(path), timeout=10)
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        conn.connect(path)
+        send_frame(conn, b"import threading\nname = threading.current_thread().name")
+        assert recv_frame(conn).startswith(b"ok\t")
+        send_frame(conn, b"assert name == 'MainThread', name")
+        assert recv_frame(conn).startswith(b"ok\t")
+        send_frame(conn, b"1/0")
+        ack = recv_frame(conn).split(b"\t")
+        assert ack[0] == b"error" and ack[2] == b"ZeroDivisionError: division by zero"
+        # the globals of the helper are not the ones of the code sent
+        send_frame(conn, b"time = run = frames = evaluate = 42")
+        assert recv_frame(conn).startswith(b"ok\t")
+        send_frame(conn, b"assert time == 42")
+        assert recv_frame(conn).startswith(b"ok\t")
+        conn.close()
+    finally:
+        process.kill()
+        process.wait()
+        os.close(slave)
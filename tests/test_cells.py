@@ -0,0 +1,51 @@
+import pytest
+
+from conftest import package_module
+
+getter = package_module("code_getter.getter")
+
+PYTHON = "import x\n# %%\na = 1\n# %%\n# only comments\n# %%\n%%R\ny <- 1\n# %%\nb = 2\n"
+JULIA = "x = 1\n# %%\ny = 2;\n# %%\nz = 3\n"
+
+
+def cells_getter(make_view, text, syntax, at):
+    view = make_view(text, syntax, file_name="cells")
+    view.set_cursors([text.index(at)])
+    return getter.CodeGetter.initialize(view, False, True)
+
+
+@pytest.mark.parametrize("which, expected", [
+    ("above", ["import x"]),
+    ("below", ["%%R\ny <- 1", "# %%\nb = 2"]),
+    ("all", ["import x\n\n# %%\na = 1", "%%R\ny <- 1", "# %%\nb = 2"]),
+])
+def test_python_cells_joined_around_cell_magics(make_view, which, expected):
+    assert cells_getter(make_view, PYTHON, "python", "a = 1").get_cells(which) == expected
+
+
+def test_comment_only_cells_skipped(make_view):
+    cells = cells_getter(make_view, PYTHON, "python", "a = 1")
+    cells.get_cells("all")
+    assert [cells.substr(r).strip().split("\n")[-1] for r in cells.regions] == \
+        ["import x", "a = 1", "y <- 1", "b = 2"]
+
+
+def test_julia_cells_wrapped_in_blocks(make_view):
+    cells = cells_getter(make_view, JULIA, "julia", "y = 2")
+    assert cells.get_cells("all") == [
+        "begin\nx = 1\nend\nbegin\n# %%\ny = 2;\nend;\nbegin\n# %%\nz = 3\nend"]
+
+
+def test_join_cells():
+    python = getter.PythonCodeGetter.join_cells
+    assert python(None, []) == []
+    assert python(None, ["a", "%%R\nb", "c", "d"]) == ["a", "%%R\nb", "c\n\nd"]
+    assert getter.CodeGetter.join_cells(None, ["a", "b"]) == ["a\n\nb"]
+    assert getter.JuliaCodeGetter.join_cells(None, ["a", "b"]) == ["a\nb"]
+
+
+def test_origin_of_a_single_cell(make_view):
+    cells = cells_getter(make_view, PYTHON, "python", "a = 1")
+    payload, = cells.cell_payloads([cells.view.line(PYTHON.index("b = 2")).cover(
+        cells.view.line(PYTHON.index("b = 2") - 1))])
+    assert cells.origin(payload) == ("cells", 8)
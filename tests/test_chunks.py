@@ -0,0 +1,86 @@
+import pytest
+
+from conftest import package_module
+
+chunks = package_module("code_getter.chunks")
+
+TEXT = """---
+title: x
+---
+
+```{r setup}
+library(x)
+```
+
+Text between.
+
+```{r plots, fig.width=6}
+plot(1)
+```
+
+```python
+print(1)
+```
+
+```{r}
+y <- 2
+#noplot
+plot(y)
+```
+
+```{r plots}
+z <- 3
+```
+"""
+
+
+@pytest.fixture
+def table(make_view):
+    return chunks.ChunkIndex.of(make_view(TEXT, "rmd"))
+
+
+def labels(selected):
+    return [c.label for c in selected]
+
+
+def test_chunks_and_labels(table):
+    assert labels(table.chunks) == ["setup", "plots", "tmp", "plots"]
+    assert table.setup_chunk().label == "setup"
+
+
+@pytest.mark.parametrize("which, at, expected", [
+    ("above", "plot(1)", ["setup"]),
+    ("below", "plot(1)", ["tmp", "plots"]),
+    ("above", "Text between", ["setup"]),
+    ("below", "Text between", ["plots", "tmp", "plots"]),
+    ("above", "print(1)", ["setup", "plots"]),
+    ("below", "z <- 3", []),
+    ("all", "z <- 3", ["setup", "plots", "tmp", "plots"]),
+])
+def test_select(table, which, at, expected):
+    assert labels(table.select(which, TEXT.index(at))) == expected
+
+
+def test_select_label(table):
+    selected = table.select("label", 0, "plots")
+    assert [table.code(c).split("\n")[0] for c in selected] == ["plot(1)", "z <- 3"]
+
+
+def test_code_with_fig_call(table):
+    setup, plots, unlabelled, _ = table.chunks
+    assert table.code(setup) == "library(x)\n"
+    assert table.code(plots) == 'plot(1)\nfig("plots", 6, 3)\n'
+    assert table.code(unlabelled) == "y <- 2\n#noplot\nplot(y)\n"
+
+
+def test_setup_chunk_expanded_from_anywhere(make_view):
+    getter = package_module("code_getter.getter")
+    view = make_view(TEXT, "rmd")
+    view.set_cursors([TEXT.index("z <- 3")])
+    code_getter = getter.CodeGetter.initialize(view, False, True, setup=True)
+    region = code_getter.expand_cell(view.sel()[0])
+    assert view.substr(region) == "library(x)"
+    text = TEXT.replace("{r setup}", "{r setup, include=FALSE}")
+    view = make_view(text, "rmd")
+    code_getter = getter.CodeGetter.initialize(view, False, True, setup=True)
+    assert view.substr(code_getter.expand_cell(view.sel()[0])) == "library(x)"
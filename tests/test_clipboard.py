@@ -0,0 +1,68 @@
+import time
+
+import pytest
+import sublime
+
+from conftest import package_module
+
+clipboard = package_module("code_sender.clipboard")
+
+
+@pytest.fixture
+def clip(monkeypatch):
+    monkeypatch.setattr(sublime, "_clipboard", "original")
+    clip = clipboard.Clipboard()
+    clip.delay = 0.2
+    yield clip
+    with clip.condition:
+        clip.saved = False
+        clip.condition.notify()
+
+
+def restored(clip, timeout=2):
+    end = time.time() + timeout
+    while time.time() < end:
+        with clip.condition:
+            if not clip.saved:
+                return True
+        time.sleep(0.01)
+    return False
+
+
+def test_restores_original_after_delay(clip):
+    clip.set_clipboard("x <- 1")
+    assert sublime.get_clipboard() == "x <- 1"
+    clip.reset_clipboard()
+    assert sublime.get_clipboard() == "x <- 1"
+    assert restored(clip)
+    assert sublime.get_clipboard() == "original"
+
+
+def test_burst_restores_once_after_last_send(clip):
+    clip.set_clipboard("a")
+    clip.reset_clipboard()
+    time.sleep(0.1)
+    # a second send while the restore is pending saves nothing new
+    clip.set_clipboard("b")
+    time.sleep(0.2)
+    assert sublime.get_clipboard() == "b"
+    clip.reset_clipboard()
+    time.sleep(0.1)
+    assert sublime.get_clipboard() == "b"
+    assert restored(clip)
+    assert sublime.get_clipboard() == "original"
+
+
+def test_no_restore_while_paste_pending(clip):
+    clip.set_clipboard("a")
+    clip.reset_clipboard()
+    clip.set_clipboard("b")
+    time.sleep(0.4)
+    assert clip.saved
+    assert sublime.get_clipboard() == "b"
+
+
+def test_reset_without_set_does_nothing(clip):
+    clip.reset_clipboard()
+    assert clip.thread is None
+    assert sublime.get_clipboard() == "original"
@@ -0,0 +1,51 @@
+import pytest
+
+from conftest import package_module
+
+definitions = package_module("code_getter.definitions")
+
+SOURCES = {
+    "r": (
+        "library(x)\n\nf <- function(a) {\n  a + 1\n}\n\ng <- function(b) {\n  b * 2\n}\n\n"
+        "x <- f(1) %>%\n  g()\n",
+        "f <- function(a) {\n  a + 10\n}"),
+    "python": (
+        "import os\n\n\ndef f(a):\n    return a + 1\n\n\n@d\ndef g(b):\n    return b * 2\n\n\n"
+        "x = g(f(1))\n",
+        "def f(a):\n    return a + 10"),
+    "julia": (
+        "using X\n\n\"\"\"doc\"\"\"\nfunction f(a)\n    a + 1\nend\n\nfunction g(b)\n    b * 2\nend\n\n"
+        "x = g(f(1))\n",
+        "\"\"\"doc\"\"\"\nfunction f(a)\n    a + 10\nend"),
+}
+
+
+@pytest.fixture(autouse=True)
+def reset():
+    yield
+    definitions.reset()
+
+
+@pytest.mark.parametrize("syntax", sorted(SOURCES))
+def test_only_edited_definition_sourced(make_view, syntax):
+    text, changed = SOURCES[syntax]
+    view = make_view(text, syntax, file_name="source")
+    regions, _ = definitions.top_level(view)
+    assert len(regions) == 4
+    assert not definitions.was_sourced(view)
+    definitions.record_sourced(view)
+    assert definitions.was_sourced(view)
+    assert definitions.source_changes(view) == ([], 0)
+
+    view.insert(text.index("a + 1") + 5, "0")
+    assert definitions.source_changes(view) == ([changed], 1)
+    # sourced now
+    assert definitions.source_changes(view) == ([], 0)
+
+
+def test_added_statements_sourced_together(make_view):
+    text = SOURCES["python"][0]
+    view = make_view(text, "python", file_name="source")
+    definitions.record_sourced(view)
+    view.insert(text.index("x = g"), "y = 1\nz = 2\n")
+    assert definitions.source_changes(view) == (["y = 1\n\nz = 2"], 2)
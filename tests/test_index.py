@@ -0,0 +1,144 @@
+import random
+
+import pytest
+
+from benchmarks import corpora
+from benchmarks.sublime import Region
+from conftest import package_module
+
+index = package_module("code_getter.index")
+
+EDITS = [" ", "\n", "(", ")", "{\n", "}", " %>%\n", " +", "# c\n", '"', "\n\n", "  3)"]
+
+
+def fresh(cls, view):
+    built = cls()
+    built.build(view)
+    return built
+
+
+def test_r_end_after_closing_brackets(make_view):
+    view = make_view("y <- 1\nx <- c(1,\n  2,\n\n\nz <- 3\n", "r")
+    statements = index.RStatementIndex.of(view)
+    assert statements.statement_rows(1) == (1, 1)
+    view.insert(view.text_point(3, 0), "  3)")
+    statements = index.RStatementIndex.of(view)
+    assert statements.statement_rows(1) == (1, 3)
+
+
+def test_rmd_text_lines_do_not_continue(make_view):
+    view = make_view(
+        "---\ntitle: x\n---\n\nSome text ending in -\nmore text +\n\n"
+        "```{r}\nx <- 1 +\n  2\ny <- 3\n```\n", "rmd")
+    statements = index.RStatementIndex.of(view)
+    assert [statements.statement_rows(r) for r in (0, 2, 4, 5)] == [(0, 0), (2, 2), (4, 4), (5, 5)]
+    assert statements.statement_rows(8) == (8, 9)
+    assert statements.statement_rows(10) == (10, 10)
+
+
+@pytest.mark.parametrize("syntax", ["r", "rmd"])
+def test_r_statements_match_fresh_build(make_view, syntax):
+    view = make_view(corpora.generate(syntax, 120, seed=3), syntax)
+    rng = random.Random(7)
+    index.RStatementIndex.of(view).statement_rows(10)
+    for _ in range(300):
+        pt = rng.randint(0, view.size())
+        if rng.random() < 0.2:
+            view.replace(Region(pt, min(pt + rng.randint(1, 20), view.size())), "")
+        else:
+            view.insert(pt, rng.choice(EDITS))
+        lastrow = view.rowcol(view.size())[0]
+        rows = [rng.randint(0, lastrow) for _ in range(20)]
+        statements = index.RStatementIndex.of(view)
+        expected = fresh(index.RStatementIndex, view)
+        assert [statements.statement_rows(r) for r in rows] == \
+            [expected.statement_rows(r) for r in rows]
+
+
+def test_python_clause_added_after_query(make_view):
+    view = make_view("if a:\n    b = 1\nx = 2\ny = 3\n", "python")
+    assert index.PythonStatementIndex.of(view).statement_rows(0) == (0, 1)
+    view.replace(view.line(view.text_point(2, 0)), "else:")
+    view.insert(view.text_point(3, 0), "    ")
+    assert index.PythonStatementIndex.of(view).statement_rows(0) == (0, 3)
+
+
+PYTHON_EDITS = [
+    " ", "\n", "    ", "(", ")", "else:\n", "elif x:\n    ", "except E:\n",
+    "@d\n", "def f():\n", "# c\n", '"""', "\\\n", "\n\n"]
+
+
+@pytest.mark.parametrize("seed", range(8))
+def test_python_statements_match_fresh_build(make_view, seed):
+    view = make_view(corpora.generate("python", 60, seed=seed), "python")
+    rng = random.Random(seed)
+    index.PythonStatementIndex.of(view).statement_rows(10)
+    for _ in range(150):
+        pt = rng.randint(0, view.size())
+        r = rng.random()
+        if r < 0.2:
+            view.replace(Region(pt, min(pt + rng.randint(1, 20), view.size())), "")
+        elif r < 0.6:
+            # at a line start, where the kinds of the lines change
+            view.insert(view.line(pt).begin(), rng.choice(PYTHON_EDITS))
+        else:
+            view.insert(pt, rng.choice(PYTHON_EDITS))
+        rows = range(view.rowcol(view.size())[0] + 1)
+        statements = index.PythonStatementIndex.of(view)
+        expected = fresh(index.PythonStatementIndex, view)
+        assert [statements.statement_rows(r) for r in rows] == \
+            [expected.statement_rows(r) for r in rows]
+
+
+BRACKET_EDITS = EDITS + ["x", "ab", "  ", "\t", "r", "'", "`", "\\", "-", "#", "[1]"]
+
+
+def brackets_state(brackets, view):
+    lastrow = view.rowcol(view.size())[0]
+    return (
+        list(brackets.depth), brackets.opened, list(brackets.tail),
+        [brackets.masked(pt) for pt in range(view.size() + 1)],
+        [brackets.close_row(r, brackets.depth[r] - d) for r in range(lastrow + 1) for d in (0, 1)])
+
+
+@pytest.mark.parametrize("syntax", ["r", "rmd", "python", "julia"])
+def test_brackets_match_fresh_build(make_view, syntax):
+    view = make_view(corpora.generate(syntax, 150, seed=5), syntax)
+    rng = random.Random(11)
+    index.BracketIndex.of(view)
+    for _ in range(200):
+        pt = rng.randint(0, view.size())
+        if rng.random() < 0.2:
+            view.replace(Region(pt, min(pt + rng.randint(1, 3), view.size())), "")
+        else:
+            view.insert(pt, rng.choice(BRACKET_EDITS))
+        brackets = index.BracketIndex.of(view)
+        assert brackets_state(brackets, view) == \
+            brackets_state(fresh(index.BracketIndex, view), view)
+
+
+JULIA_EDITS = [
+    " ", "\n", "(", ")", "[", "]", "function f()\n", "end\n", " end", "begin\n",
+    "for i in x\n", "[x for x in y]", ":end", "# c\n", "#=", "=#", '"', '"""', "do x\n"]
+
+
+@pytest.mark.parametrize("seed", range(8))
+def test_julia_blocks_match_fresh_build(make_view, seed):
+    view = make_view(corpora.generate("julia", 80, seed=seed), "julia")
+    rng = random.Random(seed)
+    for _ in range(150):
+        pt = rng.randint(0, view.size())
+        r = rng.random()
+        if r < 0.2:
+            view.replace(Region(pt, min(pt + rng.randint(1, 20), view.size())), "")
+        elif r < 0.5:
+            view.insert(view.line(pt).begin(), rng.choice(JULIA_EDITS))
+        else:
+            view.insert(pt, rng.choice(JULIA_EDITS))
+        rows = range(view.rowcol(view.size())[0] + 1)
+        # query in a random order, the buffer is scanned lazily
+        queried = rng.sample(rows, min(len(rows), 10))
+        blocks = index.JuliaBlockIndex.of(view)
+        expected = fresh(index.JuliaBlockIndex, view)
+        assert [(blocks.block_end(r), blocks.block_begin(r)) for r in queried] == \
+            [(expected.block_end(r), expected.block_begin(r)) for r in queried]
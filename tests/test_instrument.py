@@ -0,0 +1,73 @@
+import types
+
+import pytest
+
+from conftest import package_module
+
+instrument = package_module("utils.instrument")
+
+
+class Settings:
+    def __init__(self, **settings):
+        self.settings = settings
+
+    def get(self, key, default=None):
+        return self.settings.get(key, default)
+
+    def syntax(self):
+        return "r"
+
+
+def view_size(view_id):
+    return 10
+
+
+@pytest.fixture
+def api(monkeypatch):
+    module = types.ModuleType("sublime_api")
+    module.view_size = view_size
+    monkeypatch.setattr(instrument, "sublime_api", module)
+    yield module
+    instrument.restore_api()
+
+
+def test_calls_counted_only_during_stages(api):
+    trace = instrument.Trace()
+    with trace.stage("settings"):
+        trace.configure(Settings(instrument=True))
+        assert api.view_size is not view_size
+        api.view_size(1)
+    assert api.view_size is view_size
+
+    with trace.stage("get_text"):
+        api.view_size(1)
+        api.view_size(1)
+    assert api.view_size is view_size
+    assert trace.calls == {"settings": 1, "get_text": 2}
+
+
+def test_disabled_trace_leaves_api_alone(api):
+    trace = instrument.Trace()
+    with trace.stage("settings"):
+        trace.configure(Settings())
+        assert api.view_size is view_size
+    with trace.stage("get_text"):
+        assert api.view_size is view_size
+
+
+def test_nested_counting_restores_once(api):
+    instrument.start_counting()
+    instrument.start_counting()
+    instrument.stop_counting()
+    assert api.view_size is not view_size
+    instrument.stop_counting()
+    assert api.view_size is view_size
+
+
+def test_restore_api_on_unload(api):
+    trace = instrument.Trace()
+    trace.enabled = True
+    with trace.stage("get_text"):
+        instrument.restore_api()
+        assert api.view_size is view_size
+    assert api.view_size is view_size
@@ -0,0 +1,126 @@
+import json
+import socket
+import threading
+import time
+
+import pytest
+
+from conftest import package_module
+
+jupyter = package_module("code_sender.jupyter")
+zmtp = package_module("code_sender.zmtp")
+
+
+class StubKernel:
+    """
+    The shell and iopub sockets of a kernel, speaking ZMTP 3.0 through
+    ZMTPSocket on the accepted connections.
+    """
+
+    def __init__(self, path):
+        self.servers = {}
+        self.socks = {}
+        for name in ("shell", "iopub"):
+            server = socket.socket()
+            server.bind(("127.0.0.1", 0))
+            server.listen(1)
+            self.servers[name] = server
+        self.info = {
+            "ip": "127.0.0.1", "transport": "tcp", "key": "secret",
+            "signature_scheme": "hmac-sha256",
+            "shell_port": self.servers["shell"].getsockname()[1],
+            "iopub_port": self.servers["iopub"].getsockname()[1]
+        }
+        path.write_text(json.dumps(self.info))
+        self.threads = [
+            threading.Thread(target=self.accept, args=(name, socket_type))
+            for name, socket_type in (("shell", "ROUTER"), ("iopub", "PUB"))]
+        for thread in self.threads:
+            thread.start()
+
+    def accept(self, name, socket_type):
+        conn, _ = self.servers[name].accept()
+        sock = zmtp.ZMTPSocket(socket_type, None)
+        sock.sock = conn
+        conn.sendall(b"\xff" + b"\x00" * 8 + b"\x7f" + b"\x03\x00" +
+                     b"NULL".ljust(20, b"\x00") + b"\x00" + b"\x00" * 31)
+        sock.recv_exactly(64)
+        sock.recv_frame()
+        sock.send_frame(zmtp.command_body(b"READY", [(b"Socket-Type", socket_type.encode())]),
+                        command=True)
+        self.socks[name] = sock
+
+    def join(self):
+        for thread in self.threads:
+            thread.join(5)
+
+    def request(self):
+        frames = self.socks["shell"].recv_multipart()
+        return json.loads(frames[frames.index(jupyter.DELIMITER) + 2].decode())
+
+    def send(self, client, name, msg_type, parent, content):
+        parts = [json.dumps(p).encode() for p in (
+            {"msg_id": msg_type, "msg_type": msg_type}, parent, {}, content)]
+        self.socks[name].send_multipart([jupyter.DELIMITER, client.sign(parts)] + parts)
+
+    def close(self):
+        for sock in self.socks.values():
+            sock.close()
+        for server in self.servers.values():
+            server.close()
+
+
+@pytest.fixture
+def kernel(tmp_path):
+    kernel = StubKernel(tmp_path / "kernel-1.json")
+    client = jupyter.KernelClient(str(tmp_path / "kernel-1.json"))
+    client.outputs = []
+    client.output = client.outputs.append
+    client.connect()
+    kernel.join()
+    yield kernel, client
+    client.close()
+    kernel.close()
+
+
+def wait_for(condition, timeout=2):
+    end = time.time() + timeout
+    while time.time() < end and not condition():
+        time.sleep(0.005)
+    return condition()
+
+
+def test_execute_request_is_signed(kernel):
+    kernel, client = kernel
+    client.execute("x = 1", window="window")
+    frames = kernel.socks["shell"].recv_multipart()
+    i = frames.index(jupyter.DELIMITER)
+    assert frames[i + 1] == client.sign(frames[i + 2:i + 6])
+    header, content = json.loads(frames[i + 2]), json.loads(frames[i + 5])
+    assert header["msg_type"] == "execute_request"
+    assert content["code"] == "x = 1"
+
+
+def test_reply_after_idle_status(kernel):
+    kernel, client = kernel
+    client.execute("1/0", window="window")
+    client.execute("y", window="window")
+    first, second = kernel.request(), kernel.request()
+
+    # the second request is aborted, its idle status overtakes its reply
+    kernel.send(client, "shell", "execute_reply", first, {"status": "error"})
+    kernel.send(client, "iopub", "status", first, {"execution_state": "idle"})
+    kernel.send(client, "iopub", "status", second, {"execution_state": "idle"})
+    assert wait_for(lambda: len(client.outputs) == 2)
+    kernel.send(client, "shell", "execute_reply", second, {"status": "aborted"})
+    assert wait_for(lambda: "[aborted]\n" in client.outputs)
+    assert wait_for(lambda: not client.pending)
+
+
+def test_messages_of_other_sessions_ignored(kernel):
+    kernel, client = kernel
+    kernel.send(client, "iopub", "stream", {"msg_id": "other"}, {"text": "hello"})
+    client.execute("print('hi')", window="window")
+    request = kernel.request()
+    kernel.send(client, "iopub", "stream", request, {"text": "hi\n"})
+    assert wait_for(lambda: client.outputs == ["hi\n"])
@@ -0,0 +1,23 @@
+from conftest import package_module
+
+linux = package_module("code_sender.linux")
+
+
+def test_script_types_lines_as_arguments(monkeypatch):
+    scripts = []
+    monkeypatch.setattr(linux, "window_ids", {"xterm": "42"})
+    monkeypatch.setattr(linux, "xdotool_script", lambda commands, args: scripts.append((commands, args)))
+
+    linux.send_to_linux_terminal("xterm", ["-x <- 1", "", "--help"])
+    commands, args = scripts[0]
+    assert commands == [
+        "getactivewindow",
+        "windowactivate --sync 42",
+        "type --delay 0 --clearmodifiers -- $1",
+        "key --clearmodifiers Return",
+        "key --clearmodifiers Return",
+        "type --delay 0 --clearmodifiers -- $3",
+        "key --clearmodifiers Return",
+        "windowactivate %1"
+    ]
+    assert args == ["-x <- 1", "", "--help"]
@@ -0,0 +1,54 @@
+import ast
+import glob
+import os
+
+import pytest
+
+from conftest import package_module
+
+minify = package_module("code_sender.minify").minify
+
+STDLIB = sorted(glob.glob(os.path.join(os.path.dirname(ast.__file__), "*.py")))
+
+
+def parse(source):
+    try:
+        return ast.dump(ast.parse(source))
+    except (SyntaxError, ValueError):
+        return None
+
+
+@pytest.mark.parametrize("path", STDLIB[::5], ids=os.path.basename)
+def test_python_ast_unchanged(path):
+    with open(path, encoding="utf-8", errors="surrogateescape") as f:
+        source = f.read()
+    tree = parse(source)
+    if tree is None:
+        pytest.skip("not parsed by this Python")
+    minified = minify(source, "python")
+    assert parse(minified) == tree
+    assert len(minified) <= len(source)
+
+
+def test_python_literals_kept():
+    source = 'x = """\n# not a comment\n\n\n  y  \n"""\n# comment\n\n\n\nz = 1  \n'
+    assert minify(source, "python") == 'x = """\n# not a comment\n\n\n  y  \n"""\n\nz = 1'
+
+
+def test_python_continued_string_kept():
+    source = "x = 'a\\\n# b\\\n'\n# c\ny = 1\n"
+    assert minify(source, "python") == "x = 'a\\\n# b\\\n'\ny = 1"
+
+
+def test_r_comments_and_blank_lines():
+    source = "# setup\nx <- \"a\n# kept\n\"\n\n\n  y <- 1 # trailing  \n"
+    assert minify(source, "r") == "x <- \"a\n# kept\n\"\n\n  y <- 1 # trailing"
+
+
+def test_julia_block_comments_kept():
+    source = "#= block\ncomment =#\nx = 1\n# c\ny = \"#\"\n"
+    assert minify(source, "julia") == "#= block\ncomment =#\nx = 1\ny = \"#\""
+
+
+def test_unknown_syntax_untouched():
+    assert minify("# c\n\n\nx", "sql") == "# c\n\n\nx"
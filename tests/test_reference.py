@@ -0,0 +1,113 @@
+import os
+import traceback
+
+import pytest
+
+from conftest import package_module
+
+reference = package_module("code_sender.reference")
+ReferenceFiles = reference.ReferenceFiles
+
+
+@pytest.fixture
+def files(tmp_path, monkeypatch):
+    monkeypatch.setattr(ReferenceFiles, "directory", classmethod(lambda cls: str(tmp_path)))
+    monkeypatch.setattr(ReferenceFiles, "paths", ReferenceFiles.paths.__class__())
+    yield ReferenceFiles
+    ReferenceFiles.cleanup()
+
+
+def read(path):
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+def test_queued_payloads_keep_their_files(files):
+    # more payloads than the REPL has read yet must not overwrite each other
+    paths = [files.write("x <- {}\n".format(i), ".R") for i in range(10)]
+    assert len(set(paths)) == 10
+    assert [read(p) for p in paths] == ["x <- {}\n".format(i) for i in range(10)]
+
+
+def test_rows_are_padded(files):
+    assert read(files.write("f()", ".R", row=3)) == "\n\n\nf()"
+
+
+def test_old_files_expire(files):
+    old = files.write("old", ".py")
+    files.paths[old] -= files.ttl + 1
+    new = files.write("new", ".py")
+    assert not os.path.exists(old)
+    assert read(new) == "new"
+    files.cleanup()
+    assert not os.path.exists(new) and not files.paths
+
+
+def test_quote():
+    assert reference.quote('C:\\a "b"$') == '"C:\\\\a \\"b\\"$"'
+    assert reference.quote("a$b", dollar=True) == '"a\\$b"'
+
+
+class Queue:
+    # the payloads put in the send queue
+    def __init__(self):
+        self.sent = []
+
+    def put(self, sender, cmd, window=0, trace=None):
+        self.sent.append(cmd)
+
+
+def sender_of(make_view, monkeypatch, text, syntax, **settings):
+    sender = package_module("code_sender.sender")
+    queue = Queue()
+    monkeypatch.setattr(sender.SendQueue, "of", classmethod(lambda cls, target: queue))
+    code_sender = sender.CodeSender.initialize(make_view(text, syntax, file_name="/a/b.R"))
+    monkeypatch.setattr(code_sender.settings, "get", lambda key, default=None:
+                        settings.get(key, default))
+    return code_sender, queue
+
+
+def test_reference_keeps_buffer_rows(files, make_view, monkeypatch):
+    # minifying would drop the comment lines and shift the rows below them
+    code = "f <- function() {\n  # why\n\n  g()\n}\n"
+    code_sender, queue = sender_of(
+        make_view, monkeypatch, code, "r", minify=True, send_by_reference_threshold=10)
+    code_sender.queue_text(code, origin=("/a/b.R", 5))
+    path = next(iter(files.paths))
+    assert queue.sent == ['source("{}", echo = TRUE, max.deparse.length = Inf)'.format(path)]
+    assert read(path).splitlines()[8] == "  g()"
+
+
+def test_short_payloads_are_minified(files, make_view, monkeypatch):
+    code_sender, queue = sender_of(
+        make_view, monkeypatch, "", "r", minify=True, send_by_reference_threshold=100)
+    code_sender.queue_text("# why\ng()\n")
+    assert queue.sent == ["g()"] and not files.paths
+
+
+def python_reference(make_view, monkeypatch, code, row=None):
+    code_sender, queue = sender_of(make_view, monkeypatch, code, "python")
+    return code_sender.reference(code, "/a/b.py", row)
+
+
+def test_python_reference_displays_trailing_expression(files, make_view, monkeypatch, capsys):
+    # like the REPL the code is pasted to
+    namespace = {}
+    line = python_reference(make_view, monkeypatch, "x = 6\ny = 7\n(x *\n y)  # answer\n")
+    exec(line, namespace)
+    assert capsys.readouterr().out == "42\n"
+    exec(python_reference(make_view, monkeypatch, "x"), namespace)
+    assert capsys.readouterr().out == "6\n"
+    exec(python_reference(make_view, monkeypatch, "x = 1; x\n"), namespace)
+    assert capsys.readouterr().out == "1\n"
+    exec(python_reference(make_view, monkeypatch, "def f():\n    return x\n"), namespace)
+    assert capsys.readouterr().out == "" and namespace["f"]() == 1
+
+
+def test_python_reference_keeps_buffer_rows(files, make_view, monkeypatch):
+    line = python_reference(make_view, monkeypatch, "x = 1\n\n1 / 0\n", row=4)
+    with pytest.raises(ZeroDivisionError) as e:
+        exec(line, {})
+    frame = traceback.extract_tb(e.value.__traceback__)[-1]
+    assert (frame.filename, frame.lineno) == ("/a/b.py", 7)
+    assert python_reference(make_view, monkeypatch, "x = (\n") is None
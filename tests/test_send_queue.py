@@ -0,0 +1,57 @@
+import threading
+import time
+
+from conftest import package_module
+
+send_queue = package_module("code_sender.send_queue")
+
+
+class Sender:
+    def __init__(self):
+        self.sent = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def can_coalesce(self):
+        return True
+
+    def can_coalesce_with(self, sender):
+        return sender is self
+
+    def can_join(self, cmd):
+        return True
+
+    def send_text(self, cmd):
+        self.sent.append((time.time(), cmd))
+        self.release.wait(2)
+
+
+def wait_for(condition, timeout=2):
+    end = time.time() + timeout
+    while time.time() < end and not condition():
+        time.sleep(0.005)
+    return condition()
+
+
+def test_idle_send_is_not_delayed():
+    queue = send_queue.SendQueue("idle")
+    sender = Sender()
+    start = time.time()
+    queue.put(sender, "x <- 1", window=1.0)
+    assert wait_for(lambda: sender.sent)
+    assert sender.sent[0][0] - start < 0.5
+
+
+def test_sends_merged_while_busy():
+    queue = send_queue.SendQueue("busy")
+    sender = Sender()
+    sender.release.clear()
+    queue.put(sender, "a", window=0.1)
+    assert wait_for(lambda: sender.sent)
+    queue.put(sender, "b", window=0.1)
+    queue.put(sender, "c", window=0.1)
+    sender.release.set()
+    assert wait_for(lambda: len(sender.sent) == 2)
+    assert [cmd for _, cmd in sender.sent] == ["a", "b\nc"]
+    assert wait_for(lambda: queue.stats()["depth"] == 0)
+    assert queue.stats()["transmissions"] == 2
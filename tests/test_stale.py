@@ -0,0 +1,66 @@
+import pytest
+import sublime
+
+from benchmarks.sublime import Region
+from conftest import package_module
+
+stale = package_module("code_getter.stale")
+
+PYTHON = "# %%\na = 1\n# %%\nb = 2\n# %%\n# comment\n# %%\nc = 3\n"
+RMD = "```{r one}\nx <- 1\n```\n\ntext\n\n```{r two}\ny <- 2\n```\n"
+
+
+@pytest.fixture
+def make_stale_view(make_view, monkeypatch):
+    monkeypatch.setattr(sublime, "HIDDEN", 128, raising=False)
+
+    def make(text, syntax):
+        view = make_view(text, syntax)
+        view.marks = {}
+        view.add_regions = lambda key, regions, *args: view.marks.__setitem__(key, regions)
+        view.erase_regions = lambda key: view.marks.pop(key, None)
+        return view
+
+    yield make
+    stale.reset()
+
+
+def texts(view):
+    return [c.text.strip() for c in stale.stale_cells(view)]
+
+
+def test_never_sent_cells_are_stale(make_stale_view):
+    view = make_stale_view(PYTHON, "python")
+    assert texts(view) == ["# %%\na = 1", "# %%\nb = 2", "# %%\nc = 3"]
+
+
+def test_edited_cell_becomes_stale(make_stale_view):
+    view = make_stale_view(PYTHON, "python")
+    stale.record(view, [Region(p) for p in range(view.size()) if PYTHON.startswith("# %%", p)])
+    assert texts(view) == []
+
+    pt = PYTHON.index("b = 2") + 5
+    view.insert(pt, "0")
+    assert texts(view) == ["# %%\nb = 20"]
+    # back to the text sent
+    view.replace(Region(pt, pt + 1), "")
+    assert texts(view) == []
+
+    view.insert(view.size(), "# %%\nd = 4\n")
+    assert texts(view) == ["# %%\nd = 4"]
+
+
+def test_edited_chunk_becomes_stale(make_stale_view):
+    view = make_stale_view(RMD, "rmd")
+    stale.record(view, [Region(0, 0), Region(RMD.index("```{r two}"))])
+    assert texts(view) == []
+    view.insert(RMD.index("y <- 2") + 6, " + 1")
+    assert texts(view) == ["y <- 2 + 1"]
+
+
+def test_reset_forgets_sent_cells(make_stale_view):
+    view = make_stale_view(PYTHON, "python")
+    stale.record(view, [Region(PYTHON.index("a = 1"))])
+    assert texts(view) == ["# %%\nb = 2", "# %%\nc = 3"]
+    stale.reset()
+    assert len(texts(view)) == 3
@@ -0,0 +1,77 @@
+import io
+import shutil
+import subprocess
+import time
+import uuid
+
+import pytest
+
+from conftest import package_module
+
+tmux = package_module("code_sender.tmux")
+
+
+def test_escape():
+    assert tmux.escape('a "$x" \\ b\n\t\x1b\x01') == '"a \\"\\$x\\" \\\\ b\\n\\t\\e\\u0001"'
+
+
+class Process:
+    def __init__(self, output):
+        self.stdout = io.BytesIO(output.encode())
+
+
+def test_read_replies_and_notifications():
+    replies = tmux.queue.Queue()
+    tmux.TmuxControl.read(Process(
+        "%begin 1 1 0\n%end 1 1 0\n%output %1 x\n%session-changed $1 s\n"
+        "%begin 2 2 1\n%1\n%end 2 2 1\n%begin 3 3 1\nno pane\n%error 3 3 1\n%exit\n"), replies)
+    assert [replies.get_nowait() for _ in range(5)] == [
+        (True, []), (True, ["%1"]), (False, ["no pane"]), (False, ["tmux exited"]),
+        (False, ["tmux exited"])]
+
+
+def start_server(socket):
+    # a previous server on the socket may still be exiting
+    for attempt in range(20):
+        if not subprocess.call(
+                ["tmux", "-L", socket, "-f", "/dev/null", "new-session", "-d", "-s", "t",
+                 "-x", "80", "-y", "24", "cat"], stderr=subprocess.DEVNULL):
+            return
+        time.sleep(0.05)
+    raise RuntimeError("cannot start tmux")
+
+
+@pytest.fixture
+def session():
+    if shutil.which("tmux") is None:
+        pytest.skip("tmux is not installed")
+    socket = "sendcode-test-" + uuid.uuid4().hex[:8]
+    start_server(socket)
+    yield socket
+    subprocess.call(["tmux", "-L", socket, "kill-server"], stderr=subprocess.DEVNULL)
+
+
+def captured(socket, text, timeout=3):
+    end = time.time() + timeout
+    while time.time() < end:
+        screen = subprocess.check_output(
+            ["tmux", "-L", socket, "capture-pane", "-p", "-t", "t"]).decode()
+        if text in screen:
+            return screen
+        time.sleep(0.05)
+    return screen
+
+
+def test_send_to_pane(session):
+    client = tmux.TmuxControl(socket=session, target="t")
+    client.chunk_size = 8
+    try:
+        client.send('print("$x;\\ 1")')
+        assert 'print("$x;\\ 1")' in captured(session, "1\")")
+        # the server restarted, the client reconnects
+        subprocess.call(["tmux", "-L", session, "kill-server"])
+        start_server(session)
+        client.send("again")
+        assert "again" in captured(session, "again")
+    finally:
+        client.close()
@@ -0,0 +1,215 @@
+"""
+Opt-in timing of the stages of send_code, enabled by the setting
+"instrument". Each run is a Trace; finished traces feed rolling per syntax
+histories, shown by send_code_show_stats, and are optionally appended to the
+JSONL file of the setting "instrument_log".
+"""
+import collections
+import contextlib
+import json
+import os
+import threading
+import time
+
+try:
+    import sublime_api
+except ImportError:
+    sublime_api = None
+
+
+_local = threading.local()
+# the functions of sublime_api replaced while the calls are counted
+_originals = {}
+# number of stages counting the calls
+_counting = 0
+_counting_lock = threading.Lock()
+
+# (syntax, stage) -> recent (milliseconds, api calls)
+_histories = {}
+_lock = threading.Lock()
+HISTORY = 500
+BUCKETS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000]
+
+
+def _counted(f):
+    def wrapper(*args, **kwargs):
+        _local.calls = getattr(_local, "calls", 0) + 1
+        return f(*args, **kwargs)
+    return wrapper
+
+
+def start_counting():
+    # wrap the functions of sublime_api to count the calls of every thread,
+    # only while instrumented stages run since the module is shared by all
+    # plugins
+    global _counting
+    if sublime_api is None:
+        return
+    with _counting_lock:
+        if _counting == 0:
+            for name in dir(sublime_api):
+                f = getattr(sublime_api, name)
+                if not name.startswith("_") and callable(f):
+                    _originals[name] = f
+                    setattr(sublime_api, name, _counted(f))
+        _counting += 1
+
+
+def stop_counting():
+    global _counting
+    with _counting_lock:
+        _counting = max(_counting - 1, 0)
+        if _counting == 0:
+            _restore()
+
+
+def _restore():
+    for name, f in _originals.items():
+        setattr(sublime_api, name, f)
+    _originals.clear()
+
+
+def restore_api():
+    # put the functions of sublime_api back, e.g. when the plugin unloads
+    global _counting
+    with _counting_lock:
+        _counting = 0
+        _restore()
+
+
+def api_calls():
+    return getattr(_local, "calls", 0)
+
+
+def package_version():
+    try:
+        path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "package-metadata.json")
+        with open(path) as f:
+            return json.load(f).get("version")
+    except (OSError, ValueError):
+        return None
+
+
+class Trace:
+    """
+    The durations, in milliseconds, and the sublime API calls of the stages
+    of one send.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.staged = False
+        self.counting = False
+        self.start = time.perf_counter()
+        self.queued = None
+        # bytes removed by minification
+        self.saved = None
+        self.stages = collections.OrderedDict()
+        self.calls = collections.OrderedDict()
+
+    def configure(self, settings, prog=None):
+        self.enabled = settings.get("instrument", False)
+        if self.enabled:
+            if self.staged:
+                # count the rest of the current stage
+                self.count(True)
+            self.syntax = settings.syntax()
+            self.prog = prog or settings.get("prog")
+            self.log = settings.get("instrument_log")
+
+    def count(self, counting):
+        if counting and not self.counting:
+            start_counting()
+        elif self.counting and not counting:
+            stop_counting()
+        self.counting = counting
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        self.count(self.enabled)
+        self.staged = True
+        start = time.perf_counter()
+        calls = api_calls()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start, api_calls() - calls)
+            self.staged = False
+            self.count(False)
+
+    def add(self, name, seconds, calls=0):
+        self.stages[name] = self.stages.get(name, 0) + 1000 * seconds
+        self.calls[name] = self.calls.get(name, 0) + calls
+
+    def finish(self, size=None):
+        if not self.enabled:
+            return
+        self.add("total", time.perf_counter() - self.start, sum(self.calls.values()))
+        record(self, size)
+
+
+def record(trace, size=None):
+    with _lock:
+        for name, ms in trace.stages.items():
+            key = (trace.syntax, name)
+            history = _histories.get(key)
+            if history is None:
+                history = _histories[key] = collections.deque(maxlen=HISTORY)
+            history.append((ms, trace.calls[name]))
+
+        if trace.log:
+            entry = {
+                "time": time.time(),
+                "version": package_version(),
+                "syntax": trace.syntax,
+                "prog": trace.prog,
+                "size": size,
+                "saved": trace.saved,
+                "stages": trace.stages,
+                "calls": trace.calls
+            }
+            try:
+                with open(os.path.expanduser(trace.log), "a") as f:
+                    f.write(json.dumps(entry) + "\n")
+            except OSError as e:
+                print("SendCode: cannot write {}: {}".format(trace.log, e))
+
+
+def percentile(values, q):
+    return values[min(int(q * len(values)), len(values) - 1)]
+
+
+def report():
+    with _lock:
+        histories = {key: list(h) for key, h in _histories.items()}
+    if not histories:
+        return "no sends recorded, set \"instrument\": true to enable\n"
+
+    lines = []
+    for syntax in sorted({s for s, _ in histories}, key=str):
+        lines.append("[{}]".format(syntax))
+        lines.append("{:<10} {:>6} {:>9} {:>9} {:>9} {:>9} {:>7}".format(
+            "stage", "n", "p50 ms", "p90 ms", "p99 ms", "max ms", "calls"))
+        stages = [stage for s, stage in histories if s == syntax]
+        stages.sort(key=lambda stage: stage == "total")
+        for stage in stages:
+            history = histories[(syntax, stage)]
+            ms = sorted(h[0] for h in history)
+            calls = sum(h[1] for h in history) / len(history)
+            lines.append("{:<10} {:>6} {:>9.2f} {:>9.2f} {:>9.2f} {:>9.2f} {:>7.1f}".format(
+                stage, len(ms), percentile(ms, 0.5), percentile(ms, 0.9),
+                percentile(ms, 0.99), ms[-1], calls))
+
+        total = [h[0] for h in histories.get((syntax, "total"), [])]
+        if total:
+            lines.append("")
+            counts = [0] * (len(BUCKETS) + 1)
+            for ms in total:
+                counts[sum(ms >= b for b in BUCKETS)] += 1
+            labels = ["< {} ms".format(b) for b in BUCKETS] + [">= {} ms".format(BUCKETS[-1])]
+            for label, count in zip(labels, counts):
+                if count:
+                    lines.append("{:>11} {:>6} {}".format(
+                        label, count, "#" * max(1, 40 * count // len(total))))
+        lines.append("")
+    return "\n".join(lines)
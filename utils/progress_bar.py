@@ -5,6 +5,7 @@ class ProgressBar:
     def __init__(self, label, width=10):
         self.label = label
         self.width = width
+        self.fraction = None
 
     def start(self):
         self.done = False
@@ -14,11 +15,22 @@ class ProgressBar:
         sublime.status_message("")
         self.done = True
 
+    def set_progress(self, fraction, label=None):
+        # switch to a bar filled to fraction
+        self.fraction = fraction
+        if label is not None:
+            self.label = label
+
     def update(self, status=0):
         if self.done:
             return
-        status = status % (2 * self.width)
-        before = min(status, (2 * self.width) - status)
-        after = self.width - before
-        sublime.status_message("%s [%s=%s]" % (self.label, " " * before, " " * after))
+        if self.fraction is not None:
+            filled = int(round(min(self.fraction, 1) * self.width))
+            sublime.status_message(
+                "%s [%s%s]" % (self.label, "=" * filled, " " * (self.width - filled)))
+        else:
+            status = status % (2 * self.width)
+            before = min(status, (2 * self.width) - status)
+            after = self.width - before
+            sublime.status_message("%s [%s=%s]" % (self.label, " " * before, " " * after))
         sublime.set_timeout(lambda: self.update(status + 1), 100)